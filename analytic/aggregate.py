@@ -0,0 +1,302 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config.config import Settings
+from analytic import chart_spec
+from analytic.chart_spec import apply_filters, time_bucket
+from analytic.chunked import QuantileSketch, DistinctSketch, is_large, iter_frames, sample_frame
+from analytic.dataset_store import ensure_dataset
+from analytic.llm_cache import LRUCache
+from schemas.analytic import AggregateModel
+
+settings = Settings()
+
+aggregate_cache = LRUCache(settings.AGGREGATE_CACHE_SIZE)
+
+# partial results merged across chunks for each measure, the others need a sketch
+PARTIALS = {"sum": ["sum"], "mean": ["sum", "count"], "count": ["count"], "min": ["min"], "max": ["max"]}
+SKETCHES = {"quantile": QuantileSketch, "median": QuantileSketch, "nunique": DistinctSketch}
+# measures that only make sense on numbers, min, max and counts also order text and dates
+NUMERIC_OPS = ("sum", "mean", "quantile", "median")
+
+
+def measure_name(measure):
+    if measure.alias:
+        return measure.alias
+    if measure.op == "count" and not measure.column:
+        return "count"
+    if measure.op == "quantile":
+        return f"p{round(measure.q * 100):g}_{measure.column}"
+    return f"{measure.op}_{measure.column}"
+
+
+def query_columns(query):
+    columns = list(query.group_by)
+    columns += [measure.column for measure in query.measures if measure.column]
+    columns += [chart_filter.column for chart_filter in query.filters]
+    if query.time_bucket:
+        columns.append(query.time_bucket.column)
+    return list(dict.fromkeys(columns))
+
+
+def numeric_columns(profile):
+    return [column["name"] for column in profile["columns"] if pd.api.types.is_numeric_dtype(column["dtype"])]
+
+
+def validate_query(query, columns, numeric=None):
+    """
+    Checks an aggregation query against the dataset columns.
+
+    Args:
+        query (AggregateModel): Aggregation query.
+        columns (list): Column names of the dataset.
+        numeric (list): Numeric columns, see `numeric_columns`; measure dtypes are not checked when None.
+
+    Raises:
+        ValueError: When the query cannot run.
+    """
+    missing = [column for column in query_columns(query) if column not in columns]
+    if missing:
+        raise ValueError(f"unknown columns: {', '.join(missing)}")
+    for measure in query.measures:
+        if measure.op != "count" and not measure.column:
+            raise ValueError(f"{measure.op} needs a column")
+        if measure.op == "quantile" and measure.q is None:
+            raise ValueError("quantile needs q")
+        if numeric is not None and measure.op in NUMERIC_OPS and measure.column not in numeric:
+            raise ValueError(f"{measure.op} needs a numeric column, {measure.column} is not")
+    names = [measure_name(measure) for measure in query.measures]
+    if len(set(names)) != len(names):
+        raise ValueError("measure names must be unique")
+    if query.sort and query.sort.by not in names + query_keys(query):
+        raise ValueError(f"cannot sort by {query.sort.by}")
+
+
+def query_keys(query):
+    keys = list(query.group_by)
+    if query.time_bucket and query.time_bucket.column not in keys:
+        keys.insert(0, query.time_bucket.column)
+    return keys
+
+
+def query_key(version, query):
+    """
+    Cache key of a query on one version of a dataset, a re-cleaned dataset gets a new version.
+    """
+    payload = json.dumps([version, query.model_dump(mode="json")], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _measure(source, measure):
+    if measure.op == "count":
+        return source.size() if measure.column is None else source[measure.column].count()
+    if measure.op == "quantile":
+        return source[measure.column].quantile(measure.q)
+    return source[measure.column].agg(measure.op)
+
+
+def run_aggregate(df, query, max_rows=None):
+    """
+    Runs an aggregation query with one vectorized groupby reduction per measure.
+
+    Args:
+        df (DataFrame): Dataset, at least the columns of `query_columns`.
+        query (AggregateModel): Aggregation query.
+        max_rows (int): Hard cap on returned rows, `AGGREGATE_MAX_ROWS` when None.
+
+    Returns:
+        dict: `columns`, `rows` as value lists and whether rows were `truncated`.
+    """
+    df = apply_filters(df, query.filters)
+    names = [measure_name(measure) for measure in query.measures]
+
+    if query_keys(query):
+        grouped = df.groupby(_group_keys(df, query), observed=True, sort=True)
+        # size() needs the grouped frame, column reductions work on the grouped columns
+        table = pd.concat([_measure(grouped, measure).rename(name) for measure, name in zip(query.measures, names)], axis=1)
+        table = table.reset_index()
+    else:
+        table = pd.DataFrame([{
+            name: (len(df) if measure.op == "count" and not measure.column else _measure(df, measure))
+            for measure, name in zip(query.measures, names)
+        }])
+
+    return _finish(table, query, max_rows)
+
+
+def _group_keys(df, query):
+    return [
+        time_bucket(df[key], query.time_bucket.unit).rename(key)
+        if query.time_bucket and key == query.time_bucket.column else df[key]
+        for key in query_keys(query)
+    ]
+
+
+def _finish(table, query, max_rows):
+    if query.sort:
+        table = table.sort_values(query.sort.by, ascending=query.sort.order == "asc", kind="stable")
+    limit = min(query.limit or max_rows or settings.AGGREGATE_MAX_ROWS, max_rows or settings.AGGREGATE_MAX_ROWS)
+    truncated = len(table) > limit
+    table = table.iloc[:limit]
+    return {
+        "columns": [str(column) for column in table.columns],
+        "rows": json.loads(table.to_json(orient="values", date_format="iso")),
+        "truncated": truncated,
+    }
+
+
+def _sketch_value(sketch, measure):
+    if sketch is None:
+        return None
+    if measure.op == "nunique":
+        return sketch.estimate()
+    return sketch.quantile(0.5 if measure.op == "median" else measure.q)
+
+
+def chunked_table(path, query, batch_size=None):
+    """
+    Runs an aggregation query over a Parquet file one batch at a time. Sums,
+    counts, minimums and maximums merge exactly between batches, means come from
+    sums and counts, quantiles and distinct counts from per-group sketches.
+
+    Args:
+        path (str): Local Parquet copy of the dataset.
+        query (AggregateModel): Aggregation query.
+        batch_size (int): Rows read at once, `CHUNK_ROWS` when None.
+
+    Returns:
+        DataFrame: Group keys and one column per measure, sorted by the keys.
+    """
+    keys = query_keys(query)
+    names = [measure_name(measure) for measure in query.measures]
+    totals = None
+    sketches = [{} for _ in query.measures]
+    for df in iter_frames(path, query_columns(query), batch_size):
+        df = apply_filters(df, query.filters)
+        if not len(df):
+            continue
+        # a constant key stands in for queries without group by
+        grouped = df.groupby(_group_keys(df, query) or [np.zeros(len(df), dtype=np.int8)], observed=True, sort=False)
+        partial = {"rows": grouped.size()}
+        for position, measure in enumerate(query.measures):
+            if measure.op in SKETCHES:
+                for key, values in grouped[measure.column]:
+                    key = key[0] if len(key) == 1 else key
+                    sketches[position].setdefault(key, SKETCHES[measure.op]()).update(values)
+                continue
+            for reduction in PARTIALS[measure.op]:
+                if reduction == "count":
+                    value = grouped.size() if measure.column is None else grouped[measure.column].count()
+                else:
+                    value = grouped[measure.column].agg(reduction)
+                partial[f"{position}:{reduction}"] = value
+        partial = pd.DataFrame(partial)
+        if totals is not None:
+            partial = pd.concat([totals, partial]).groupby(level=list(range(partial.index.nlevels)), sort=False).agg({
+                column: "sum" if column == "rows" or column.endswith((":sum", ":count")) else column.split(":")[1]
+                for column in partial.columns
+            })
+        totals = partial
+
+    if totals is None:
+        return pd.DataFrame(columns=keys + names)
+    table = pd.DataFrame(index=totals.index)
+    for position, (measure, name) in enumerate(zip(query.measures, names)):
+        if measure.op in SKETCHES:
+            table[name] = [_sketch_value(sketches[position].get(key), measure) for key in totals.index]
+        elif measure.op == "mean":
+            table[name] = totals[f"{position}:sum"] / totals[f"{position}:count"]
+        else:
+            table[name] = totals[f"{position}:{PARTIALS[measure.op][0]}"]
+    if not keys:
+        return table.reset_index(drop=True)
+    return table.sort_index().reset_index()
+
+
+def aggregate_file(path, query, max_rows=None):
+    """
+    Runs an aggregation query on a Parquet file, in chunks above `CHUNKED_THRESHOLD_BYTES`.
+    """
+    if is_large(path):
+        return _finish(chunked_table(path, query), query, max_rows)
+    return run_aggregate(pq.read_table(path, columns=query_columns(query), memory_map=True).to_pandas(), query, max_rows)
+
+
+def spec_query(spec):
+    return AggregateModel(
+        group_by=[spec.x] + ([spec.group] if spec.group else []),
+        measures=[{"op": spec.agg, "column": None if spec.agg == "count" else spec.y}],
+        filters=spec.filters,
+        time_bucket={"column": spec.x, "unit": spec.time_unit} if spec.time_unit else None,
+    )
+
+
+def spec_data(path, spec):
+    """
+    Computes the data a chart spec draws from a Parquet file. Above
+    `CHUNKED_THRESHOLD_BYTES` aggregated charts run as a chunked query and the
+    others draw from a uniform sample of `CHUNKED_SAMPLE_ROWS`.
+
+    Returns:
+        DataFrame: Chart data, see `chart_spec.aggregate`.
+    """
+    columns = chart_spec.spec_columns(spec)
+    if not is_large(path):
+        return chart_spec.aggregate(pq.read_table(path, columns=columns, memory_map=True).to_pandas(), spec)
+    if spec.type in ("scatter", "hist", "box"):
+        return chart_spec.aggregate(sample_frame(path, columns, settings.CHUNKED_SAMPLE_ROWS), spec)
+    query = spec_query(spec)
+    table = chunked_table(path, query)
+    values = table.set_index(query_keys(query))[measure_name(query.measures[0])]
+    return chart_spec.chart_table(values, spec)
+
+
+def default_rollups(profile, max_groups=50, max_measures=5, max_rollups=10):
+    """
+    Picks the rollups a dashboard shows first: counts and sums per low-cardinality
+    column and per month of every date column.
+
+    Returns:
+        list: AggregateModel queries.
+    """
+    numeric = [column["name"] for column in profile["columns"]
+               if "dates" not in column and "min" in column and "quantiles" in column][:max_measures]
+    measures = [{"op": "count"}] + [{"op": "sum", "column": name} for name in numeric]
+    queries = []
+    for column in profile["columns"]:
+        if "dates" in column:
+            queries.append(AggregateModel(
+                group_by=[column["name"]],
+                measures=measures,
+                time_bucket={"column": column["name"], "unit": "month"},
+            ))
+        elif "top" in column and column["distinct_exact"] and column["distinct"] <= max_groups:
+            queries.append(AggregateModel(group_by=[column["name"]], measures=measures))
+    return queries[:max_rollups]
+
+
+def build_rollups(s3_client, bucket, cleaned_file, profile):
+    """
+    Precomputes the default rollups of a cleaned dataset.
+
+    Returns:
+        list: Rollups with their cache `key`, `query` and `result`.
+    """
+    queries = default_rollups(profile)
+    if not queries:
+        return []
+    path = ensure_dataset(s3_client, bucket, cleaned_file)
+    if is_large(path):
+        results = [_finish(chunked_table(path, query), query, None) for query in queries]
+    else:
+        columns = list(dict.fromkeys(column for query in queries for column in query_columns(query)))
+        df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+        results = [run_aggregate(df, query) for query in queries]
+    return [
+        {"key": query_key(cleaned_file, query), "query": query.model_dump(mode="json"), "result": result}
+        for query, result in zip(queries, results)
+    ]
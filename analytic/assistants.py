@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+
+from config.config import Settings
+from database.database import *
+from analytic.clients import client
+
+settings = Settings()
+
+ANALYST_ASSISTANT = {
+    "model": "gpt-4o",
+    "temperature": 0.7,
+    "instructions": "You're an AI assistant who has access to tools to complete the task."
+                    "You should apply ReAct and Tree-of-thoughts approach to complete the given task.",
+    "tools": [{"type": "code_interpreter"}],
+}
+
+# assistant ids already resolved by this process, keyed by config hash
+_assistant_ids = {}
+_refill_needed = asyncio.Event()
+
+
+def config_hash(config):
+    """
+    Hashes an assistant configuration independently of key order.
+
+    Args:
+        config (dict): Keyword arguments for `assistants.create`.
+
+    Returns:
+        str: SHA-256 hex digest of the configuration.
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+async def get_assistant_id(config=ANALYST_ASSISTANT):
+    """
+    Returns the id of the assistant for a configuration, creating and
+    registering it in Mongo the first time the configuration is seen.
+
+    Args:
+        config (dict): Keyword arguments for `assistants.create`.
+
+    Returns:
+        str: Assistant id.
+    """
+    key = config_hash(config)
+    if key in _assistant_ids:
+        return _assistant_ids[key]
+
+    assistant = await retrieve_assistant(key)
+    if not assistant:
+        created = await client.beta.assistants.create(**config)
+        assistant = await add_assistant(Assistant(config_hash=key, assistantId=created.id, config=config))
+        if assistant.assistantId != created.id:
+            # lost the registration race, drop the duplicate
+            await client.beta.assistants.delete(created.id)
+
+    _assistant_ids[key] = assistant.assistantId
+    return assistant.assistantId
+
+
+async def claim_thread(file_ids):
+    """
+    Claims a pre-warmed thread from the pool and attaches files to it.
+    Falls back to creating a thread when the pool is empty.
+
+    Args:
+        file_ids (list): OpenAI file ids made available to the code interpreter.
+
+    Returns:
+        str: Thread id.
+    """
+    tool_resources = {"code_interpreter": {"file_ids": file_ids}}
+    _refill_needed.set()
+
+    thread_id = await claim_pooled_thread()
+    if not thread_id:
+        return (await client.beta.threads.create(tool_resources=tool_resources)).id
+
+    await client.beta.threads.update(thread_id, tool_resources=tool_resources)
+    return thread_id
+
+
+async def refill_thread_pool():
+    """
+    Creates threads until the pool holds `THREAD_POOL_SIZE` of them.
+
+    Returns:
+        int: Number of threads created.
+    """
+    missing = settings.THREAD_POOL_SIZE - await count_pooled_threads()
+    for _ in range(missing):
+        thread = await client.beta.threads.create()
+        await add_pooled_thread(PooledThread(threadId=thread.id))
+    return max(missing, 0)
+
+
+async def maintain_thread_pool():
+    """
+    Keeps the thread pool topped up, refilling periodically and whenever a thread is claimed.
+    """
+    while True:
+        _refill_needed.clear()
+        try:
+            await refill_thread_pool()
+        except Exception as e:
+            print("==== thread pool refill failed: ", e)
+        try:
+            await asyncio.wait_for(_refill_needed.wait(), timeout=settings.THREAD_POOL_REFILL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
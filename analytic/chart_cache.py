@@ -0,0 +1,140 @@
+import ast
+import hashlib
+import json
+import re
+
+from config.config import Settings
+from database.database import *
+from analytic.utils import create_chart
+from analytic.sandbox import chart_pool
+
+settings = Settings()
+
+
+def _dtype_family(dtype):
+    # compact_frame picks the narrowest dtype per dataset, charts only care about the kind
+    if dtype in ("bool", "boolean"):
+        return "bool"
+    if re.match(r"u?int", dtype, re.IGNORECASE):
+        return "int"
+    if dtype.startswith("float"):
+        return "float"
+    if dtype.startswith("datetime"):
+        return "datetime"
+    return "text"
+
+
+def schema_fingerprint(profile):
+    """
+    Hashes the column names and dtype kinds of a profiled dataset, so datasets
+    with the same shape of columns share chart code.
+
+    Args:
+        profile (dict): Result of `profile_dataset`.
+
+    Returns:
+        str: Hex SHA-256 of the normalized schema.
+    """
+    schema = sorted(
+        (stats["name"].strip().lower(), "datetime" if "dates" in stats else _dtype_family(stats["dtype"]))
+        for stats in profile["columns"]
+    )
+    return hashlib.sha256(json.dumps(schema).encode()).hexdigest()
+
+
+def _normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def chart_code_key(fingerprint, question):
+    return f"{fingerprint}:{hashlib.sha256(_normalize_text(question).encode()).hexdigest()}"
+
+
+def code_hash(code):
+    lines = [line.rstrip() for line in code.strip().splitlines() if line.strip()]
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def validate_chart_code(code, name):
+    """
+    Checks that generated code compiles and defines `name` taking the DataFrame.
+
+    Returns:
+        str: Why the code is invalid, None when it is valid.
+    """
+    try:
+        tree = ast.parse(code)
+        compile(tree, "<generated chart>", "exec")
+    except SyntaxError as e:
+        return f"SyntaxError: {e}"
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            if not node.args.args:
+                return f"{name} must accept the DataFrame"
+            return None
+    return f"{name} is not defined"
+
+
+def failure_hints(failures, limit=3):
+    if not failures:
+        return ""
+    errors = [failure["error"].strip().splitlines()[-1][:300] for failure in failures[-limit:] if failure.get("error")]
+    return "\n        Earlier versions of this method failed with these errors, avoid them:\n" + "\n".join(
+        f"        - {error}" for error in errors
+    )
+
+
+async def chart_for_question(prompt, question, fingerprint, dataset_path, refresh=False, attempts=5, name="generate_method"):
+    """
+    Renders the chart answering `question`, reusing code that already worked on a
+    dataset with the same schema before asking the LLM for new code.
+
+    Args:
+        prompt (str): Prompt asking for the chart method.
+        question (str): Question the chart answers.
+        fingerprint (str): Schema fingerprint of the dataset.
+        dataset_path (str): Local Parquet copy of the dataset.
+        refresh (bool): Skip the stored code and cached LLM responses.
+        attempts (int): Maximum number of generated variants to try.
+        name (str): Method the code defines.
+
+    Returns:
+        dict: Result of `ChartPool.render` with the `code` that produced it.
+    """
+    key = chart_code_key(fingerprint, question)
+    entry = await retrieve_chart_code(key)
+    failures = list(entry.failures) if entry else []
+
+    if entry and entry.code and not refresh:
+        chart = await chart_pool.render(entry.code, name, dataset_path)
+        if not chart["error"]:
+            await hit_chart_code(key)
+            return {**chart, "code": entry.code}
+        await add_chart_failure(key, fingerprint, question, entry.codeHash, chart["error"], settings.CHART_CODE_FAILURES)
+        failures.append({"codeHash": entry.codeHash, "error": chart["error"]})
+
+    chart = {"png": None, "error": "no chart code generated", "output": ""}
+    for attempt in range(attempts):
+        # a retry must not get the cached response that just failed
+        try:
+            code = await create_chart(prompt + failure_hints(failures), refresh=refresh or attempt > 0)
+        except Exception as e:
+            # the response held no code block
+            chart = {"png": None, "error": str(e), "output": ""}
+            continue
+        digest = code_hash(code)
+        if any(failure["codeHash"] == digest for failure in failures):
+            continue
+        error = validate_chart_code(code, name)
+        if not error:
+            chart = await chart_pool.render(code, name, dataset_path)
+            error = chart["error"]
+        else:
+            chart = {"png": None, "error": error, "output": ""}
+        if not error:
+            await save_chart_code(key, fingerprint, question, code, digest)
+            return {**chart, "code": code}
+        print("==== chart code failed: ", error)
+        await add_chart_failure(key, fingerprint, question, digest, error, settings.CHART_CODE_FAILURES)
+        failures.append({"codeHash": digest, "error": error})
+    return {**chart, "code": None}
@@ -0,0 +1,300 @@
+import io
+import json
+import operator
+import re
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from config.config import Settings
+from schemas.chart_spec import ChartSpec
+
+settings = Settings()
+
+# rcParams are process wide, themed renders from different threads must not interleave
+_style_lock = threading.Lock()
+
+TIME_UNITS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+# charts drawing every row are sampled down to this many points
+MAX_POINTS = 5000
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def parse_spec(text):
+    """
+    Parses a chart spec from an LLM response, with or without a code fence.
+
+    Returns:
+        ChartSpec: The spec.
+    """
+    match = re.search(r"```(?:json)?(.*?)```", text, re.DOTALL)
+    return ChartSpec.model_validate_json(match.group(1) if match else text)
+
+
+def spec_columns(spec):
+    columns = [spec.x, spec.y, spec.group] + [chart_filter.column for chart_filter in spec.filters]
+    return list(dict.fromkeys(column for column in columns if column))
+
+
+def validate_spec(spec, columns):
+    """
+    Checks a spec against the dataset columns and the needs of its chart type.
+
+    Raises:
+        ValueError: When the spec cannot be drawn.
+    """
+    missing = [column for column in spec_columns(spec) if column not in columns]
+    if missing:
+        raise ValueError(f"unknown columns: {', '.join(missing)}")
+    if spec.type in ("hist", "box"):
+        if not (spec.y or spec.x):
+            raise ValueError(f"{spec.type} charts need a column")
+    elif not spec.x:
+        raise ValueError(f"{spec.type} charts need x")
+    if spec.type == "scatter" and not spec.y:
+        raise ValueError("scatter charts need y")
+    if spec.type == "heatmap" and not spec.group:
+        raise ValueError("heatmap charts need group")
+    if spec.agg != "count" and spec.type not in ("scatter", "hist", "box") and not spec.y:
+        raise ValueError(f"{spec.agg} needs y")
+    if spec.style.theme not in matplotlib.style.available + ["default"]:
+        raise ValueError(f"unknown theme: {spec.style.theme}")
+    if spec.style.palette and spec.style.palette not in matplotlib.colormaps:
+        raise ValueError(f"unknown palette: {spec.style.palette}")
+
+
+def _filter_value(series, value):
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.to_datetime(value)
+    if pd.api.types.is_numeric_dtype(series.dtype) and isinstance(value, str):
+        return pd.to_numeric(value)
+    return value
+
+
+def apply_filters(df, filters):
+    """
+    Applies all filters as one combined boolean mask.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for chart_filter in filters:
+        series = df[chart_filter.column]
+        value = chart_filter.value
+        if chart_filter.op in ("in", "not in"):
+            matched = series.isin(value if isinstance(value, list) else [value])
+            matched = ~matched if chart_filter.op == "not in" else matched
+        elif chart_filter.op == "between":
+            matched = series.between(_filter_value(series, value[0]), _filter_value(series, value[1]))
+        elif chart_filter.op == "contains":
+            matched = series.astype(str).str.contains(str(value), case=False, regex=False)
+        else:
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(series.cat.categories.dtype)
+            matched = COMPARISONS[chart_filter.op](series, _filter_value(series, value))
+        mask &= np.asarray(matched.fillna(False), dtype=bool)
+    return df[mask]
+
+
+def time_bucket(series, unit):
+    dates = pd.to_datetime(series.astype(str) if isinstance(series.dtype, pd.CategoricalDtype) else series, errors="coerce", format="mixed")
+    return dates.dt.to_period(TIME_UNITS[unit]).dt.start_time
+
+
+def aggregate(df, spec):
+    """
+    Reduces the dataset to what the chart draws: a table indexed by x with one
+    column per group for aggregated charts, the filtered rows for the others.
+
+    Args:
+        df (DataFrame): Dataset, at least the columns of `spec_columns`.
+        spec (ChartSpec): Chart spec.
+
+    Returns:
+        DataFrame: Chart data.
+    """
+    df = apply_filters(df, spec.filters)
+    if spec.type in ("scatter", "hist", "box"):
+        data = df[spec_columns(spec)]
+        if spec.type == "scatter" and len(data) > MAX_POINTS:
+            data = data.sample(MAX_POINTS, random_state=0)
+        return data
+
+    x = time_bucket(df[spec.x], spec.time_unit) if spec.time_unit else df[spec.x]
+    keys = [x.rename(spec.x)] + ([df[spec.group]] if spec.group else [])
+    grouped = df.groupby(keys, observed=True, sort=True)
+    if spec.agg == "count":
+        values = grouped.size()
+    else:
+        values = grouped[spec.y].agg(spec.agg)
+    return chart_table(values, spec)
+
+
+def chart_table(values, spec):
+    """
+    Lays aggregated values indexed by x, and group when the spec has one, out as
+    the table aggregated charts draw.
+    """
+    value_name = "count" if spec.agg == "count" else spec.y
+    table = values.unstack(spec.group) if spec.group else values.to_frame(value_name)
+    table = table.fillna(0)
+    if spec.sort or spec.limit:
+        totals = table.sum(axis=1)
+        order = totals.sort_values(ascending=spec.sort == "asc").index
+        table = table.loc[order]
+        if spec.limit:
+            table = table.iloc[:spec.limit]
+    return table
+
+
+def _colors(spec, count):
+    if not spec.style.palette:
+        return None
+    return matplotlib.colormaps[spec.style.palette](np.linspace(0.15, 0.85, max(count, 1)))
+
+
+def _label(value):
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def _draw(ax, data, spec):
+    if spec.type == "scatter":
+        groups = data.groupby(spec.group, observed=True) if spec.group else [(None, data)]
+        colors = _colors(spec, len(groups))
+        for position, (name, rows) in enumerate(groups):
+            ax.scatter(rows[spec.x], rows[spec.y], s=12, alpha=0.7, label=name,
+                       color=None if colors is None else colors[position])
+        return spec.group is not None
+    if spec.type in ("hist", "box"):
+        column = spec.y or spec.x
+        by = spec.x if spec.type == "box" and spec.y and spec.x else spec.group
+        groups = list(data.groupby(by, observed=True)[column]) if by else [(column, data[column])]
+        values = [series.dropna().to_numpy() for _, series in groups]
+        labels = [_label(name) for name, _ in groups]
+        if spec.type == "hist":
+            ax.hist(values, bins=spec.bins, label=labels, color=_colors(spec, len(values)), stacked=spec.style.stacked)
+            return len(values) > 1
+        ax.boxplot(values)
+        ax.set_xticks(range(1, len(labels) + 1), labels)
+        return False
+
+    labels = [_label(value) for value in data.index]
+    colors = _colors(spec, len(data.columns))
+    if spec.type == "pie":
+        series = data.iloc[:, 0]
+        ax.pie(series.to_numpy(), labels=labels, autopct="%1.1f%%", colors=_colors(spec, len(series)))
+        ax.axis("equal")
+        return False
+    if spec.type == "heatmap":
+        image = ax.imshow(data.to_numpy(dtype=float), aspect="auto", cmap=spec.style.palette or "viridis")
+        ax.set_yticks(range(len(data.index)), labels)
+        ax.set_xticks(range(len(data.columns)), [_label(column) for column in data.columns], rotation=45, ha="right")
+        ax.figure.colorbar(image, ax=ax)
+        return False
+    if spec.type == "bar":
+        positions = np.arange(len(data.index))
+        stacked = spec.style.stacked or len(data.columns) == 1
+        width = 0.8 if stacked else 0.8 / len(data.columns)
+        bottom = np.zeros(len(data.index))
+        bar = ax.barh if spec.style.horizontal else ax.bar
+        for position, column in enumerate(data.columns):
+            values = data[column].to_numpy(dtype=float)
+            offset = positions if stacked else positions - 0.4 + width * (position + 0.5)
+            color = None if colors is None else colors[position]
+            if spec.style.horizontal:
+                bar(offset, values, width, left=bottom if stacked else None, label=_label(column), color=color)
+            else:
+                bar(offset, values, width, bottom=bottom if stacked else None, label=_label(column), color=color)
+            if stacked:
+                bottom += values
+        if spec.style.horizontal:
+            ax.set_yticks(positions, labels)
+        else:
+            ax.set_xticks(positions, labels, rotation=45 if len(labels) > 6 else 0, ha="right" if len(labels) > 6 else "center")
+        return len(data.columns) > 1
+    # line and area charts keep a real x axis for dates and numbers
+    index = data.index if not isinstance(data.index.dtype, pd.CategoricalDtype) else labels
+    if spec.type == "area" and spec.style.stacked:
+        ax.stackplot(index, *[data[column].to_numpy(dtype=float) for column in data.columns],
+                     labels=[_label(column) for column in data.columns], colors=colors, alpha=0.8)
+    else:
+        for position, column in enumerate(data.columns):
+            color = None if colors is None else colors[position]
+            ax.plot(index, data[column].to_numpy(dtype=float), marker="o" if len(data.index) <= 30 else None,
+                    label=_label(column), color=color)
+            if spec.type == "area":
+                ax.fill_between(index, data[column].to_numpy(dtype=float), alpha=0.3, color=color)
+    return len(data.columns) > 1
+
+
+def render_spec(df, spec, width=None, height=None, theme=None, dpi=None):
+    """
+    Renders a chart spec to PNG from the dataset, see `render_data`.
+    """
+    return render_data(aggregate(df, spec), spec, width, height, theme, dpi)
+
+
+def render_data(data, spec, width=None, height=None, theme=None, dpi=None):
+    """
+    Renders chart data to PNG. Size, theme and resolution can be overridden
+    without touching the spec.
+
+    Args:
+        data (DataFrame): Chart data, see `aggregate`.
+        spec (ChartSpec): Chart spec.
+        width (float): Figure width in inches.
+        height (float): Figure height in inches.
+        theme (str): Matplotlib style name.
+        dpi (int): Resolution.
+
+    Returns:
+        dict: `png` bytes with `width` and `height` in pixels.
+
+    Raises:
+        ValueError: When there is nothing to draw or the size is out of bounds.
+    """
+    if data.empty:
+        raise ValueError("no data left to draw")
+    width, height = width or spec.style.width, height or spec.style.height
+    dpi = dpi or spec.style.dpi
+    theme = theme or spec.style.theme
+    # the canvas is allocated up front, its size must stay bounded
+    if not (0 < width <= settings.CHART_MAX_INCHES and 0 < height <= settings.CHART_MAX_INCHES):
+        raise ValueError("width and height must be between 0 and {} inches".format(settings.CHART_MAX_INCHES))
+    if not 0 < dpi <= settings.CHART_MAX_DPI:
+        raise ValueError("dpi must be between 1 and {}".format(settings.CHART_MAX_DPI))
+    with _style_lock, matplotlib.style.context(theme):
+        # figures are built without pyplot, so nothing global outlives the render
+        figure = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        legend = _draw(ax, data, spec)
+        ax.set_title(spec.title or "")
+        if spec.type not in ("pie",):
+            x_label, y_label = spec.x_label or spec.x or "", spec.y_label or spec.y or ("count" if spec.agg == "count" else "")
+            ax.set_xlabel(y_label if spec.style.horizontal and spec.type == "bar" else x_label)
+            ax.set_ylabel(x_label if spec.style.horizontal and spec.type == "bar" else y_label)
+        if legend:
+            ax.legend(title=spec.group)
+        png = io.BytesIO()
+        figure.savefig(png, format="png", dpi=dpi, bbox_inches="tight")
+    width, height = struct.unpack(">II", png.getbuffer()[16:24])
+    return {"png": png.getvalue(), "width": width, "height": height, "error": None}
+
+
+def spec_prompt_schema():
+    return json.dumps(ChartSpec.model_json_schema())
@@ -0,0 +1,234 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config.config import Settings
+
+settings = Settings()
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch in the style of KLL: values are kept in levels
+    weighted 2**level, a full level is sorted and every other value moves up.
+    Exact while fewer than `k` values were seen.
+    """
+
+    def __init__(self, k=None):
+        self.k = k or settings.SKETCH_K
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._rng = np.random.default_rng(0)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(math.ceil(self.k * (2 / 3) ** depth), 2)
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                values = np.sort(values)
+                # an odd value out stays behind, the pairs halve into the next level
+                kept, paired = values[:len(values) % 2], values[len(values) % 2:]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+        return self
+
+    def merge(self, other):
+        self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self._compact()
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1])
+        return float(values[order][min(position, len(values) - 1)])
+
+
+class DistinctSketch:
+    """
+    HyperLogLog distinct count: 2**precision registers holding the longest run
+    of leading zeros seen among the hashes routed to them.
+    """
+
+    def __init__(self, precision=None):
+        self.precision = precision or settings.SKETCH_PRECISION
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if not len(values):
+            return self
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        hashes = pd.util.hash_array(values.to_numpy())
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # rest < 2**bits converts to float exactly, log2 finds its highest set bit
+        highest = np.floor(np.log2(np.maximum(rest, 1).astype(np.float64)))
+        rank = np.where(rest == 0, bits + 1, bits - highest).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * size and zeros:
+            # linear counting is more accurate for small cardinalities
+            return round(size * math.log(size / zeros))
+        return round(raw)
+
+
+def dataset_size(path):
+    """
+    Uncompressed size of a Parquet file, roughly what loading it all would take.
+    """
+    metadata = pq.read_metadata(path)
+    return sum(metadata.row_group(index).total_byte_size for index in range(metadata.num_row_groups))
+
+
+def is_large(path):
+    return dataset_size(path) > settings.CHUNKED_THRESHOLD_BYTES
+
+
+def iter_frames(path, columns=None, batch_size=None):
+    """
+    Yields a Parquet file as DataFrames of at most `batch_size` rows.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size or settings.CHUNK_ROWS, columns=columns):
+        yield batch.to_pandas()
+
+
+def sample_frame(path, columns, rows, batch_size=None):
+    """
+    Draws a uniform sample of about `rows` rows, one batch at a time.
+    """
+    total = pq.read_metadata(path).num_rows
+    fraction = min(1.0, rows / total) if total else 1.0
+    samples = [
+        df if fraction >= 1 else df.sample(frac=fraction, random_state=0)
+        for df in iter_frames(path, columns, batch_size)
+    ]
+    if not samples:
+        return pq.read_schema(path).empty_table().select(columns).to_pandas()
+    return pd.concat(samples, ignore_index=True)
+
+
+def _chunk_kind(series):
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(series.dtype):
+        return "float"
+    return "text"
+
+
+def infer_csv_schema(csv_path, chunk_rows=None, category_ratio=0.5):
+    """
+    Decides the compact dtype of every column of a CSV from streaming reductions
+    over its chunks, the chunked counterpart of `compact_frame`.
+
+    Args:
+        csv_path (str): Local CSV file.
+        chunk_rows (int): Rows read at once, `CHUNK_ROWS` when None.
+        category_ratio (float): Maximum share of distinct values for a text column to become categorical.
+
+    Returns:
+        Schema: Arrow schema of the Parquet copy.
+    """
+    rows = 0
+    kinds, low, high, float32, distinct = {}, {}, {}, {}, {}
+    nullable = set()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows or settings.CHUNK_ROWS):
+        rows += len(chunk)
+        for column in chunk.columns:
+            series = chunk[column]
+            kinds.setdefault(column, set())
+            if series.isna().any():
+                nullable.add(column)
+            if series.isna().all():
+                continue
+            kind = _chunk_kind(series)
+            kinds[column].add(kind)
+            if kind in ("int", "float"):
+                low[column] = min(low.get(column, np.inf), series.min())
+                high[column] = max(high.get(column, -np.inf), series.max())
+            if kind == "float":
+                values = series.to_numpy()
+                exact = np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True)
+                float32[column] = float32.get(column, True) and exact
+            if kind == "text":
+                distinct.setdefault(column, DistinctSketch()).update(series)
+
+    fields = []
+    for column, seen in kinds.items():
+        # a chunk of nulls only reads as floats, integer and bool columns must have no nulls at all
+        if seen == {"bool"} and column not in nullable:
+            field_type = pa.bool_()
+        elif seen == {"int"} and column not in nullable:
+            # same rule as compact_frame: signed, and int32 only when every value fits
+            int32 = np.iinfo(np.int32)
+            field_type = pa.int32() if int32.min <= low[column] and high[column] <= int32.max else pa.int64()
+        elif seen and seen <= {"int", "float"}:
+            field_type = pa.float32() if seen == {"float"} and float32[column] else pa.float64()
+        elif column in distinct and distinct[column].estimate() <= category_ratio * rows:
+            field_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            field_type = pa.string()
+        fields.append(pa.field(str(column), field_type))
+    return pa.schema(fields)
+
+
+def csv_to_parquet(csv_path, parquet_path, chunk_rows=None):
+    """
+    Converts a CSV of any size to a compact Parquet file in two streaming
+    passes, the first deciding the dtypes, the second writing one row group per chunk.
+
+    Returns:
+        dict: Rows and columns written.
+    """
+    schema = infer_csv_schema(csv_path, chunk_rows)
+    text = {field.name: "string" for field in schema if not pa.types.is_integer(field.type)
+            and not pa.types.is_floating(field.type) and not pa.types.is_boolean(field.type)}
+    rows = 0
+    with pq.ParquetWriter(parquet_path, schema, compression="zstd") as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows or settings.CHUNK_ROWS, dtype=text):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return {"rows": rows, "columns": len(schema), "size": os.path.getsize(parquet_path)}
@@ -0,0 +1,62 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from openai import AsyncOpenAI
+
+from config.config import Settings
+
+settings = Settings()
+
+
+class AsyncS3:
+    """
+    Awaitable facade over a boto3 S3 client.
+
+    Every client method is exposed as a coroutine that runs the blocking boto3
+    call on a dedicated thread pool sized to the client's connection pool, so
+    S3 traffic never blocks the event loop nor starves other threads.
+    """
+
+    def __init__(self, client, max_workers):
+        self.sync = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3")
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking callable (e.g. a streaming helper taking the sync client) on the S3 thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+
+client = AsyncOpenAI(
+    api_key=settings.APIKEY,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    timeout=settings.OPENAI_TIMEOUT,
+)
+
+S3_CLIENT = AsyncS3(
+    boto3.client(
+        's3',
+        aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        region_name=settings.S3_REGION,
+        config=Config(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+            tcp_keepalive=True,
+        ),
+    ),
+    max_workers=settings.S3_MAX_POOL_CONNECTIONS,
+)
@@ -0,0 +1,144 @@
+import io
+import shutil
+import zlib
+
+from config.config import Settings
+
+try:
+    import zstandard
+except ImportError:
+    # gzip is always available, zstd objects are written as gzip without the package
+    zstandard = None
+
+settings = Settings()
+
+# objects are read back in chunks of this size while decompressing
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def object_encoding(object_class):
+    """
+    Content-Encoding objects of a class are stored with.
+
+    Args:
+        object_class (str): `original`, `cleaned` or `image`.
+
+    Returns:
+        str: `zstd`, `gzip` or None for uncompressed objects.
+    """
+    encoding = {
+        "original": settings.S3_COMPRESS_ORIGINAL,
+        "cleaned": settings.S3_COMPRESS_CLEANED,
+        "image": settings.S3_COMPRESS_IMAGE,
+    }[object_class].lower()
+    if encoding in ("", "none", "identity"):
+        return None
+    if encoding not in ("zstd", "gzip"):
+        raise ValueError(f"unsupported encoding: {encoding}")
+    if encoding == "zstd" and zstandard is None:
+        return "gzip"
+    return encoding
+
+
+class _Identity:
+    def compress(self, data):
+        return data
+
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+def compressor(encoding, level=None):
+    level = level or settings.S3_COMPRESSION_LEVEL
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    if encoding == "gzip":
+        return zlib.compressobj(min(level, 9), zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return _Identity()
+
+
+def decompressor(encoding):
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("reading zstd objects needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(zlib.MAX_WBITS | 16)
+    return _Identity()
+
+
+def encode(data, encoding):
+    encoder = compressor(encoding)
+    return encoder.compress(data) + encoder.flush()
+
+
+class DecodedStream(io.RawIOBase):
+    """
+    Readable file object over an S3 body, decompressed chunk by chunk as it is read.
+    """
+
+    def __init__(self, body, encoding, chunk_size=READ_CHUNK_SIZE):
+        self._body = body
+        self._chunks = body.iter_chunks(chunk_size)
+        self._decoder = decompressor(encoding)
+        self._buffer = b""
+        self._offset = 0
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while self._offset == len(self._buffer) and not self._done:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buffer, self._done = self._decoder.flush(), True
+            else:
+                self._buffer = self._decoder.decompress(chunk)
+            self._offset = 0
+        size = min(len(target), len(self._buffer) - self._offset)
+        target[:size] = self._buffer[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._body.close()
+        super().close()
+
+
+def open_object(s3_client, bucket, key, chunk_size=READ_CHUNK_SIZE):
+    """
+    Opens an S3 object for streaming reads, decompressed according to its Content-Encoding.
+
+    Returns:
+        BufferedReader: Binary file object of the decoded content.
+    """
+    obj = s3_client.get_object(Bucket=bucket, Key=key)
+    return io.BufferedReader(DecodedStream(obj["Body"], obj.get("ContentEncoding"), chunk_size))
+
+
+def download_object(s3_client, bucket, key, path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Downloads the decoded content of an S3 object to a local file.
+    """
+    with open_object(s3_client, bucket, key, chunk_size) as source, open(path, "wb") as target:
+        shutil.copyfileobj(source, target, chunk_size)
+
+
+def store_object(s3_client, bucket, key, body, object_class, **params):
+    """
+    Stores bytes in S3 compressed for their object class.
+
+    Returns:
+        dict: Key, encoding, and size before and after compression.
+    """
+    encoding = object_encoding(object_class)
+    data = encode(body, encoding)
+    if encoding:
+        params["ContentEncoding"] = encoding
+    s3_client.put_object(Bucket=bucket, Key=key, Body=data, **params)
+    return {"key": key, "encoding": encoding, "size": len(body), "stored_size": len(data)}
@@ -0,0 +1,276 @@
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+from config.config import Settings
+from analytic.chunked import csv_to_parquet
+from analytic.compression import decompressor, download_object
+
+settings = Settings()
+
+INT32 = np.iinfo(np.int32)
+
+
+def compact_frame(df, category_ratio=0.5):
+    """
+    Shrinks a DataFrame's dtypes: integers are downcast to int32 when they fit,
+    floats to float32 when every value survives, and low-cardinality strings
+    become categoricals.
+
+    Args:
+        df (DataFrame): Frame to compact, modified in place.
+        category_ratio (float): Maximum share of distinct values for a string column to become categorical.
+
+    Returns:
+        DataFrame: The compacted frame.
+    """
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            # never narrower than int32 nor unsigned, derived columns like differences must not wrap around
+            if not len(series) or (INT32.min <= series.min() and series.max() <= INT32.max):
+                df[column] = series.astype(np.int32)
+        elif pd.api.types.is_float_dtype(series):
+            downcast = series.astype(np.float32)
+            # only keep float32 when it round-trips, measurements must not drift
+            if np.array_equal(downcast.astype(series.dtype).to_numpy(), series.to_numpy(), equal_nan=True):
+                df[column] = downcast
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique(dropna=True) <= category_ratio * len(series):
+                df[column] = series.astype("category")
+    return df
+
+
+def dataset_key(cleaned_file):
+    return f"{cleaned_file}.parquet"
+
+
+def dataset_path(cleaned_file):
+    return os.path.join(settings.DATASET_CACHE_DIR, dataset_key(cleaned_file))
+
+
+def evict_datasets(max_bytes=None, keep=None):
+    """
+    Removes the least recently used Parquet copies from the local cache until it
+    fits in `max_bytes`. Copies are touched on every use, so their mtime orders them.
+
+    Args:
+        max_bytes (int): Cache budget, `DATASET_CACHE_MAX_BYTES` when None.
+        keep (str): Path that must stay, the copy about to be read.
+
+    Returns:
+        int: Number of copies removed.
+    """
+    max_bytes = settings.DATASET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    with os.scandir(settings.DATASET_CACHE_DIR) as scan:
+        for entry in scan:
+            # temporary files are copies still being written
+            if entry.is_file() and entry.name.endswith(".parquet"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            # readers that mapped the file keep it until they are done
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _write_parquet(df, path):
+    # write next to the target and rename, so readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def store_dataset(s3_client, bucket, cleaned_file):
+    """
+    Converts a cleaned CSV in S3 into a compact Parquet copy, kept in the local
+    cache and uploaded next to the CSV for other processes.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding `{cleaned_file}.csv`.
+        cleaned_file (str): Cleaned file id.
+
+    Returns:
+        dict: Artifact record with key, rows, columns and size of the Parquet copy.
+    """
+    key = f"{cleaned_file}.csv"
+    path = dataset_path(cleaned_file)
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    # a compressed csv gives no hint of its real size, it goes through the disk too
+    if head.get("ContentEncoding") or head["ContentLength"] > settings.CHUNKED_THRESHOLD_BYTES:
+        stats = _store_large_dataset(s3_client, bucket, key, path)
+    else:
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+        try:
+            df = compact_frame(pd.read_csv(body))
+        finally:
+            body.close()
+        _write_parquet(df, path)
+        stats = {"rows": len(df), "columns": len(df.columns)}
+    s3_client.upload_file(path, bucket, dataset_key(cleaned_file), ExtraArgs={"ContentType": "application/vnd.apache.parquet"})
+    size = os.path.getsize(path)
+    evict_datasets(keep=path)
+
+    return {
+        "key": dataset_key(cleaned_file),
+        **stats,
+        "size": size,
+    }
+
+
+def _store_large_dataset(s3_client, bucket, key, path):
+    # the csv is spilled to disk decompressed, and converted in chunks when too large to read at once
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, csv_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".csv.tmp")
+    os.close(fd)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        download_object(s3_client, bucket, key, csv_path)
+        if os.path.getsize(csv_path) > settings.CHUNKED_THRESHOLD_BYTES:
+            stats = csv_to_parquet(csv_path, tmp_path)
+        else:
+            df = compact_frame(pd.read_csv(csv_path))
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression="zstd")
+            stats = {"rows": len(df), "columns": len(df.columns)}
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    finally:
+        os.remove(csv_path)
+    return {"rows": stats["rows"], "columns": stats["columns"]}
+
+
+def ensure_dataset(s3_client, bucket, cleaned_file):
+    """
+    Makes the Parquet copy of a cleaned dataset available in the local cache,
+    downloading it, or building it from the CSV for datasets cleaned before the store existed.
+
+    Returns:
+        str: Local path of the Parquet file.
+    """
+    path = dataset_path(cleaned_file)
+    try:
+        # the mtime records the last use for evict_datasets
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        s3_client.download_file(bucket, dataset_key(cleaned_file), tmp_path)
+        os.replace(tmp_path, path)
+    except ClientError:
+        os.remove(tmp_path)
+        store_dataset(s3_client, bucket, cleaned_file)
+    evict_datasets(keep=path)
+    return path
+
+
+def load_dataset(s3_client, bucket, cleaned_file, columns=None, rows=None):
+    """
+    Loads a cleaned dataset from its memory-mapped Parquet copy.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding the dataset.
+        cleaned_file (str): Cleaned file id.
+        columns (list): Only load these columns.
+        rows (int): Only load the first `rows` rows.
+
+    Returns:
+        DataFrame: The dataset.
+    """
+    path = ensure_dataset(s3_client, bucket, cleaned_file)
+    if rows is not None:
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        batch = next(parquet_file.iter_batches(batch_size=rows, columns=columns), None)
+        if batch is None:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        return pa.Table.from_batches([batch]).to_pandas()
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def build_preview(df):
+    """
+    Builds the JSON-safe preview stored on the analytic row: column names,
+    dtypes and the given rows as value lists aligned with the columns.
+
+    Args:
+        df (DataFrame): Leading rows of the dataset.
+
+    Returns:
+        dict: Preview with columns, dtypes and rows.
+    """
+    return {
+        "columns": [str(column) for column in df.columns],
+        "dtypes": [str(dtype) for dtype in df.dtypes],
+        "rows": json.loads(df.to_json(orient="values", date_format="iso")),
+    }
+
+
+def preview_records(preview):
+    return [dict(zip(preview["columns"], row)) for row in preview["rows"]]
+
+
+def read_csv_preview(s3_client, bucket, cleaned_file, rows, range_bytes):
+    """
+    Rebuilds a preview from the first bytes of the cleaned CSV with HTTP range
+    reads, widening the range until it holds `rows` complete rows.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding `{cleaned_file}.csv`.
+        cleaned_file (str): Cleaned file id.
+        rows (int): Number of rows to preview.
+        range_bytes (int): Size of the first range read in bytes.
+
+    Returns:
+        dict: Preview with columns, dtypes and rows.
+    """
+    while True:
+        obj = s3_client.get_object(Bucket=bucket, Key=f"{cleaned_file}.csv", Range=f"bytes=0-{range_bytes - 1}")
+        raw = obj["Body"].read()
+        total = int(obj.get("ContentRange", "/0").rsplit("/", 1)[-1] or 0)
+        # compressed streams decode from their start, a prefix yields the first rows
+        data = decompressor(obj.get("ContentEncoding")).decompress(raw)
+        # the header plus `rows` lines must fit, otherwise read a wider range
+        if len(raw) < total and data.count(b"\n") <= rows:
+            range_bytes *= 4
+            continue
+        if len(raw) < total:
+            # drop the row cut in half by the range
+            data = data[:data.rfind(b"\n") + 1]
+        return build_preview(pd.read_csv(io.BytesIO(data), nrows=rows))
@@ -0,0 +1,169 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config.config import Settings
+from analytic.chunked import is_large, iter_frames
+from analytic.llm_cache import LRUCache
+
+settings = Settings()
+
+series_cache = LRUCache(settings.SERIES_CACHE_SIZE)
+
+# time buckets per kept point when large datasets are reduced chunk by chunk before LTTB
+PREBUCKETS_PER_POINT = 4
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Bucket bounds and the averages
+    of every next bucket are computed at once, only the choice of the point per
+    bucket depends on the previous choice.
+
+    Args:
+        x (ndarray): Sorted x values as floats.
+        y (ndarray): Values, same length as x and without NaN.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        ndarray: Indices of the kept points.
+    """
+    size = len(x)
+    if threshold >= size:
+        return np.arange(size)
+    if threshold < 3:
+        return np.linspace(0, size - 1, max(threshold, 0)).astype(np.int64)
+
+    # first and last points are always kept, the rest is split in threshold - 2 buckets
+    edges = np.floor(np.linspace(1, size - 1, threshold - 1)).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    averages_x = np.add.reduceat(x[1:size - 1], starts - 1) / counts
+    averages_y = np.add.reduceat(y[1:size - 1], starts - 1) / counts
+    # the last bucket is followed by the last point alone
+    next_x = np.append(averages_x[1:], x[-1])
+    next_y = np.append(averages_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = starts[bucket], ends[bucket]
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def series_key(version, date_column, value_columns, points):
+    return json.dumps([version, date_column, list(value_columns), points])
+
+
+def _parse_dates(dates):
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        dates = dates.astype(str)
+    return pd.to_datetime(dates, errors="coerce", format="mixed")
+
+
+def _series_points(x, y, points):
+    kept = lttb(x.astype("datetime64[ms]").astype(np.float64), y, points)
+    frame = pd.DataFrame({"date": x[kept], "value": y[kept]})
+    return json.loads(frame.to_json(orient="values", date_format="iso"))
+
+
+def downsample_series(df, date_column, value_columns, points):
+    """
+    Downsamples each value column against the date column.
+
+    Args:
+        df (DataFrame): Dataset with the date and value columns.
+        date_column (str): Column parsed as dates and used as x.
+        value_columns (list): Numeric columns to downsample.
+        points (int): Points kept per series.
+
+    Returns:
+        dict: `rows` of the full series and one list of `[date, value]` points per column in `series`.
+    """
+    dates = _parse_dates(df[date_column])
+    order = np.argsort(dates.to_numpy(), kind="stable")
+    dates = dates.iloc[order]
+    valid_dates = dates.notna().to_numpy()
+
+    series = {}
+    for column in value_columns:
+        values = pd.to_numeric(df[column].iloc[order], errors="coerce")
+        valid = valid_dates & values.notna().to_numpy()
+        series[column] = _series_points(dates.to_numpy()[valid], values.to_numpy(dtype=float)[valid], points)
+    return {"rows": len(df), "points": points, "series": series}
+
+
+def _extremes(frame):
+    # first, last, lowest and highest point of every bucket, what a line drawn through the bucket shows
+    grouped = frame.groupby("bucket", sort=False)
+    index = pd.concat([grouped["x"].idxmin(), grouped["x"].idxmax(), grouped["y"].idxmin(), grouped["y"].idxmax()])
+    return frame.loc[index.unique()].reset_index(drop=True)
+
+
+def chunked_series(path, date_column, value_columns, points, batch_size=None):
+    """
+    Downsamples each value column of a Parquet file one batch at a time. A
+    first pass over the dates finds the time range, the second keeps the
+    first, last, lowest and highest point of `PREBUCKETS_PER_POINT * points`
+    equal time buckets, and LTTB runs on what is left.
+
+    Args:
+        path (str): Local Parquet copy of the dataset.
+        date_column (str): Column parsed as dates and used as x.
+        value_columns (list): Numeric columns to downsample.
+        points (int): Points kept per series.
+        batch_size (int): Rows read at once, `CHUNK_ROWS` when None.
+
+    Returns:
+        dict: Same as `downsample_series`.
+    """
+    rows, low, high = 0, None, None
+    for df in iter_frames(path, [date_column], batch_size):
+        rows += len(df)
+        dates = _parse_dates(df[date_column]).dropna()
+        if len(dates):
+            low = dates.min() if low is None else min(low, dates.min())
+            high = dates.max() if high is None else max(high, dates.max())
+
+    buckets = points * PREBUCKETS_PER_POINT
+    empty = pd.DataFrame({"x": np.empty(0, dtype="datetime64[ns]"), "y": np.empty(0), "bucket": np.empty(0, dtype=np.int64)})
+    candidates = dict.fromkeys(value_columns, empty)
+    if low is not None:
+        span = max((high - low).value, 1)
+        for df in iter_frames(path, list(dict.fromkeys([date_column, *value_columns])), batch_size):
+            dates = _parse_dates(df[date_column])
+            bucket = ((dates - low).to_numpy(dtype="timedelta64[ns]").astype(np.float64) / span * buckets).clip(0, buckets - 1)
+            for column in value_columns:
+                values = pd.to_numeric(df[column], errors="coerce")
+                valid = (dates.notna() & values.notna()).to_numpy()
+                frame = pd.DataFrame({
+                    "x": dates.to_numpy()[valid],
+                    "y": values.to_numpy(dtype=float)[valid],
+                    "bucket": bucket[valid].astype(np.int64),
+                })
+                candidates[column] = _extremes(pd.concat([candidates[column], frame], ignore_index=True))
+
+    series = {}
+    for column, frame in candidates.items():
+        frame = frame.sort_values("x", kind="stable")
+        series[column] = _series_points(frame["x"].to_numpy(), frame["y"].to_numpy(dtype=float), points)
+    return {"rows": rows, "points": points, "series": series}
+
+
+def series_file(path, date_column, value_columns, points):
+    """
+    Downsamples the series of a Parquet file, in chunks above `CHUNKED_THRESHOLD_BYTES`.
+    """
+    if is_large(path):
+        return chunked_series(path, date_column, value_columns, points)
+    columns = list(dict.fromkeys([date_column, *value_columns]))
+    return downsample_series(pq.read_table(path, columns=columns, memory_map=True).to_pandas(), date_column, value_columns, points)
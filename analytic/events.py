@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from config.config import Settings
+from models.event import StatusEvent
+
+settings = Settings()
+
+
+class MemoryBackend:
+    """
+    Single process backend, events only reach subscribers of the publishing process.
+    """
+
+    async def publish(self, channel, message, origin):
+        pass
+
+    async def listen(self, origin, deliver):
+        await asyncio.Event().wait()
+
+
+class MongoBackend:
+    """
+    Cross process backend: events are written to the `status_event` collection
+    and every process with subscribers polls it for events published elsewhere.
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+
+    async def publish(self, channel, message, origin):
+        await StatusEvent(channel=channel, message=message, origin=origin).create()
+
+    async def listen(self, origin, deliver):
+        # clocks of other processes drift and inserts land out of order,
+        # so every poll looks back a little and skips events it already delivered
+        lag = timedelta(seconds=self.poll_interval * 2 + 1)
+        since = datetime.utcnow()
+        seen = {}
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            polled_at = datetime.utcnow()
+            events = await StatusEvent.find(
+                StatusEvent.createdAt >= since - lag,
+                StatusEvent.origin != origin,
+            ).sort(+StatusEvent.createdAt).to_list()
+            for event in events:
+                if event.id in seen:
+                    continue
+                seen[event.id] = event.createdAt
+                deliver(event.channel, event.message)
+            since = polled_at
+            seen = {id: created for id, created in seen.items() if created >= since - lag}
+
+
+BACKENDS = {
+    "memory": lambda: MemoryBackend(),
+    "mongo": lambda: MongoBackend(settings.EVENTS_POLL_INTERVAL),
+}
+
+
+class StatusBroker:
+    """
+    In-process pub/sub of analytic status updates. Subscribers get a bounded
+    queue per channel; the backend carries events between processes.
+    """
+
+    def __init__(self, backend, queue_size):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.origin = uuid.uuid4().hex
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    def deliver(self, channel, message):
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                # a slow subscriber only needs the latest status, drop the oldest
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def publish(self, channel, message):
+        """
+        Sends a message to the subscribers of `channel` in every process.
+        """
+        self.deliver(channel, message)
+        try:
+            await self.backend.publish(channel, message, self.origin)
+        except Exception as e:
+            print("==== publishing status event failed: ", e)
+
+    async def _listen(self):
+        while True:
+            try:
+                await self.backend.listen(self.origin, self.deliver)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("==== listening for status events failed: ", e)
+                await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """
+        Registers a subscriber for the duration of the block.
+
+        Yields:
+            asyncio.Queue: Messages published to `channel`.
+        """
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers[channel].add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            yield queue
+        finally:
+            self._subscribers[channel].discard(queue)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+            if not self._subscribers and self._listener is not None:
+                self._listener.cancel()
+                self._listener = None
+
+
+broker = StatusBroker(BACKENDS[settings.EVENTS_BACKEND](), settings.EVENTS_QUEUE_SIZE)
@@ -0,0 +1,143 @@
+import csv
+import datetime
+import io
+import os
+import re
+from tempfile import SpooledTemporaryFile
+
+SPREADSHEET_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+
+
+def is_spreadsheet(filename):
+    return os.path.splitext(filename)[1].lower() in SPREADSHEET_EXTENSIONS
+
+
+def csv_name(filename, sheet=None):
+    base = os.path.splitext(filename)[0]
+    if sheet is not None:
+        base += "_" + re.sub(r"[^\w.-]+", "-", sheet).strip("-")
+    return base + ".csv"
+
+
+def _cell(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _xlsx_sheets(fileobj):
+    import openpyxl
+
+    # read-only workbooks stream rows from the archive instead of building the cell tree
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.title, sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xls_rows(workbook, sheet):
+    import xlrd
+
+    for index in range(sheet.nrows):
+        row = []
+        for cell in sheet.row(index):
+            value = cell.value
+            if cell.ctype == xlrd.XL_CELL_DATE:
+                value = xlrd.xldate.xldate_as_datetime(value, workbook.datemode)
+            elif cell.ctype == xlrd.XL_CELL_NUMBER and value.is_integer():
+                # xls stores every number as a float
+                value = int(value)
+            elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                value = None
+            row.append(value)
+        yield row
+
+
+def _xls_sheets(fileobj):
+    import xlrd
+
+    # xls is read whole by xlrd, but sheets are loaded one at a time and released
+    workbook = xlrd.open_workbook(file_contents=fileobj.read(), on_demand=True)
+    try:
+        for name in workbook.sheet_names():
+            yield name, _xls_rows(workbook, workbook.sheet_by_name(name))
+            workbook.unload_sheet(name)
+    finally:
+        workbook.release_resources()
+
+
+def _write_sheet(rows, spool_max_size):
+    # trailing empty cells are trimmed while the width of the sheet is not known yet,
+    # a second pass pads every row back to it so csv readers see rectangular data
+    trimmed = SpooledTemporaryFile(max_size=spool_max_size, mode="w+", encoding="utf-8", newline="")
+    writer = csv.writer(trimmed)
+    count, width, blank = 0, 0, 0
+    for row in rows:
+        values = list(row)
+        while values and values[-1] in (None, ""):
+            values.pop()
+        if not values:
+            # blank rows are only written when data follows, trailing formatting rows are dropped
+            blank += 1
+            continue
+        for _ in range(blank):
+            writer.writerow([])
+        count += blank + 1
+        blank = 0
+        width = max(width, len(values))
+        writer.writerow([_cell(value) for value in values])
+    trimmed.seek(0)
+
+    spool = SpooledTemporaryFile(max_size=spool_max_size)
+    text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    with trimmed:
+        for values in csv.reader(trimmed):
+            writer.writerow(values + [""] * (width - len(values)))
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool, count, width
+
+
+def spreadsheet_to_csv(fileobj, filename, spool_max_size):
+    """
+    Converts every sheet of a workbook to UTF-8 CSV locally, one sheet at a
+    time with a streaming reader, so the assistant receives CSVs instead of
+    parsing the workbook in its sandbox.
+
+    Args:
+        fileobj: Readable binary file object holding the workbook.
+        filename (str): Name of the upload, its extension picks the reader.
+        spool_max_size (int): Bytes kept in memory by each converted sheet before it rolls over to disk.
+
+    Returns:
+        tuple: (spooled CSV of every sheet positioned at 0, None for empty sheets,
+        list of sheets with name, rows, columns and whether it was `selected`
+        as the main dataset, the one with the most rows).
+    """
+    fileobj.seek(0)
+    sheets = _xls_sheets(fileobj) if filename.lower().endswith(".xls") else _xlsx_sheets(fileobj)
+    spools, summaries = [], []
+    try:
+        for name, rows in sheets:
+            spool, count, width = _write_sheet(rows, spool_max_size)
+            if not count:
+                spool.close()
+                spool = None
+            spools.append(spool)
+            summaries.append({"name": name, "rows": count, "columns": width, "selected": False})
+    except Exception:
+        for spool in spools:
+            if spool is not None:
+                spool.close()
+        raise
+    if not any(spools):
+        raise ValueError(f"{filename} has no data")
+    selected = max(range(len(summaries)), key=lambda index: summaries[index]["rows"])
+    summaries[selected]["selected"] = True
+    return spools, summaries
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+
+from config.config import Settings
+from database.database import *
+
+settings = Settings()
+
+
+async def enqueue(kind, analytic_id, payload=None):
+    """
+    Queues a background job for a worker process to pick up.
+
+    Args:
+        kind (str): Job type, the key of its handler in the worker.
+        analytic_id (PydanticObjectId): Analytic row the job works on.
+        payload (dict): Optional extra arguments for the handler.
+
+    Returns:
+        Job: The queued job.
+    """
+    return await add_job(Job(
+        kind=kind,
+        analyticId=analytic_id,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    ))
+
+
+async def _heartbeat(job, worker):
+    # keep the job invisible to other workers while its handler is still running
+    while True:
+        await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT / 3)
+        await extend_job(job.id, worker, settings.JOB_VISIBILITY_TIMEOUT)
+
+
+async def execute(job, handler, worker):
+    """
+    Runs a claimed job and records its outcome. Failed jobs are retried with
+    exponential backoff until they run out of attempts.
+
+    Args:
+        job (Job): Claimed job.
+        handler: Coroutine function called with the analytic id (and payload, if any).
+        worker (str): Id of the worker owning the job.
+    """
+    heartbeat = asyncio.create_task(_heartbeat(job, worker))
+    try:
+        if job.payload:
+            await handler(job.analyticId, **job.payload)
+        else:
+            await handler(job.analyticId)
+    except Exception as e:
+        print(f"==== job {job.id} ({job.kind}) failed on attempt {job.attempts}: ", e)
+        update_data = dict(error=str(e))
+        if job.attempts < job.max_attempts:
+            update_data["state"] = "queued"
+            update_data["visibleAt"] = datetime.utcnow() + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            update_data["state"] = "failed"
+        await finish_job(job.id, worker, update_data)
+    else:
+        await finish_job(job.id, worker, {"state": "done"})
+    finally:
+        heartbeat.cancel()
+
+
+async def run_worker(handlers, concurrency, stop=None, worker=None):
+    """
+    Claims and runs jobs until `stop` is set, with at most `concurrency` jobs in flight.
+
+    Args:
+        handlers (dict): Maps job kinds to coroutine functions.
+        concurrency (int): Maximum number of jobs running at once.
+        stop (asyncio.Event): Set to drain running jobs and return.
+        worker (str): Worker id recorded on claimed jobs, defaults to host and pid.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    print(f"==== worker {worker} started for {list(handlers)} with concurrency {concurrency}")
+
+    while not stop.is_set():
+        await slots.acquire()
+        try:
+            job = await claim_job(list(handlers), worker, settings.JOB_VISIBILITY_TIMEOUT)
+        except Exception as e:
+            print("==== claiming job failed: ", e)
+            job = None
+        if not job:
+            slots.release()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.WORKER_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        if job.attempts > job.max_attempts:
+            await finish_job(job.id, worker, {"state": "failed"})
+            slots.release()
+            continue
+
+        task = asyncio.create_task(execute(job, handlers[job.kind], worker))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+    await asyncio.gather(*running)
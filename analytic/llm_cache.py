@@ -0,0 +1,155 @@
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from config.config import Settings
+from database.database import *
+
+settings = Settings()
+
+
+def cache_key(model, messages, max_tokens, temperature):
+    """
+    Hashes everything that determines a chat completion.
+
+    Returns:
+        str: Hex SHA-256 of the request.
+    """
+    request = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class LRUCache:
+    """
+    Bounded in-process mapping, evicting the least recently used entry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheStats:
+    """
+    Hit and miss counters of the response cache since the process started.
+    """
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.refreshed = 0
+
+    @property
+    def lookups(self):
+        return self.memory_hits + self.mongo_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        if not self.lookups:
+            return 0.0
+        return (self.memory_hits + self.mongo_hits) / self.lookups
+
+    def as_dict(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "refreshed": self.refreshed,
+            "hit_rate": self.hit_rate,
+        }
+
+
+memory_cache = LRUCache(settings.LLM_CACHE_SIZE)
+stats = CacheStats()
+
+
+async def cached_completion(create, model, messages, max_tokens, temperature=None, cache=True, refresh=False, parse=None):
+    """
+    Returns the content of a chat completion, served from the in-process LRU,
+    then the Mongo tier, and only calling `create` on a miss. A response is
+    only stored once `parse` accepted it, so an unusable answer is asked again
+    on the next call instead of being served until it expires.
+
+    Args:
+        create: Coroutine function taking the completion keyword arguments.
+        model (str): Model name.
+        messages (list): Chat messages.
+        max_tokens (int): Completion token limit.
+        temperature (float): Sampling temperature, the API default when None.
+        cache (bool): False bypasses the cache entirely, neither reading nor writing it.
+        refresh (bool): Skip cached entries and overwrite them with a fresh completion.
+        parse: Turns the content into the caller's result, raising when it cannot be used.
+
+    Returns:
+        Generated content, or what `parse` made of it.
+    """
+    parse = parse or (lambda content: content)
+    request = {"model": model, "messages": messages, "max_tokens": max_tokens}
+    if temperature is not None:
+        request["temperature"] = temperature
+
+    if not cache:
+        stats.bypassed += 1
+        response = await create(**request)
+        return parse(response.choices[0].message.content)
+
+    key = cache_key(model, messages, max_tokens, temperature)
+    if refresh:
+        stats.refreshed += 1
+    else:
+        content = memory_cache.get(key)
+        if content is not None:
+            stats.memory_hits += 1
+            return parse(content)
+        cached = await retrieve_llm_response(key)
+        if cached:
+            stats.mongo_hits += 1
+            memory_cache.set(key, cached.content)
+            return parse(cached.content)
+        stats.misses += 1
+
+    response = await create(**request)
+    content = response.choices[0].message.content
+    if content is None:
+        return parse(content)
+    # raises before anything is stored when the caller cannot use the response
+    result = parse(content)
+
+    now = datetime.utcnow()
+    memory_cache.set(key, content)
+    await add_llm_response(LLMResponse(
+        key=key,
+        model=model,
+        content=content,
+        size=len(content.encode()),
+        request={"max_tokens": max_tokens, "temperature": temperature},
+        createdAt=now,
+        lastHitAt=now,
+        expiresAt=now + timedelta(seconds=settings.LLM_CACHE_TTL),
+    ))
+    await evict_llm_responses(settings.LLM_CACHE_MAX_BYTES)
+    return result
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config.config import Settings
+from analytic.dataset_store import ensure_dataset
+from analytic.chunked import DistinctSketch
+
+settings = Settings()
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def _scalar(value):
+    # numpy and pandas scalars are not JSON serializable
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+class _Accumulator:
+    """
+    Merges per-chunk statistics of every column: null counts, min/max,
+    capped value counts and a uniform sample for quantiles.
+    """
+
+    def __init__(self, total_rows, sample_rows, count_limit):
+        self.total_rows = total_rows
+        self.sample_fraction = min(1.0, sample_rows / total_rows) if total_rows else 1.0
+        self.count_limit = count_limit
+        self.rows = 0
+        self.dtypes = None
+        self.nulls = None
+        self.minimum = None
+        self.maximum = None
+        self.counts = {}
+        self.truncated = set()
+        self.distinct = {}
+        self.samples = []
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        if self.dtypes is None:
+            self.dtypes = chunk.dtypes
+            self.nulls = chunk.isna().sum()
+        else:
+            self.nulls = self.nulls.add(chunk.isna().sum(), fill_value=0)
+
+        ordered = [column for column, dtype in chunk.dtypes.items()
+                   if _is_numeric(dtype) or pd.api.types.is_datetime64_any_dtype(dtype)]
+        if ordered:
+            low, high = chunk[ordered].min(), chunk[ordered].max()
+            self.minimum = low if self.minimum is None else pd.concat([self.minimum, low], axis=1).min(axis=1)
+            self.maximum = high if self.maximum is None else pd.concat([self.maximum, high], axis=1).max(axis=1)
+
+        for column in chunk.columns:
+            counts = chunk[column].value_counts(dropna=True)
+            # categoricals list every category, even those absent from this chunk
+            counts = counts[counts > 0]
+            if column in self.counts:
+                counts = self.counts[column].add(counts, fill_value=0)
+            if column in self.distinct:
+                self.distinct[column].update(chunk[column])
+            if len(counts) > self.count_limit:
+                if column not in self.distinct:
+                    # every value seen so far is still counted, the sketch takes over from here
+                    self.distinct[column] = DistinctSketch().update(pd.Series(counts.index))
+                # keep the most frequent values, distinct counts become an estimate
+                counts = counts.nlargest(self.count_limit)
+                self.truncated.add(column)
+            self.counts[column] = counts
+
+        self.samples.append(chunk if self.sample_fraction >= 1 else chunk.sample(frac=self.sample_fraction, random_state=0))
+
+    def result(self, top_k):
+        sample = pd.concat(self.samples, ignore_index=True) if self.samples else pd.DataFrame()
+        numeric = [column for column, dtype in (self.dtypes.items() if self.dtypes is not None else []) if _is_numeric(dtype)]
+        quantiles = sample[numeric].quantile(QUANTILES) if numeric and len(sample) else None
+
+        columns = []
+        for column, dtype in (self.dtypes.items() if self.dtypes is not None else []):
+            counts = self.counts.get(column, pd.Series(dtype="float64"))
+            stats = {
+                "name": str(column),
+                "dtype": str(dtype),
+                "nulls": _scalar(self.nulls[column] / self.rows) if self.rows else 0.0,
+                "distinct": max(len(counts), self.distinct[column].estimate()) if column in self.distinct else len(counts),
+                "distinct_exact": column not in self.truncated,
+            }
+            if self.minimum is not None and column in self.minimum.index:
+                stats["min"] = _scalar(self.minimum[column])
+                stats["max"] = _scalar(self.maximum[column])
+            if quantiles is not None and column in quantiles.columns:
+                stats["quantiles"] = [_scalar(value) for value in quantiles[column]]
+            if not _is_numeric(dtype) and len(counts):
+                top = counts.nlargest(top_k)
+                stats["top"] = [[_scalar(value), int(count)] for value, count in top.items()]
+                dates = _date_range(counts.index)
+                if dates:
+                    stats["dates"] = dates
+            columns.append(stats)
+        return {"rows": self.rows, "columns": columns}
+
+
+def _date_range(values):
+    # text columns whose distinct values mostly parse as dates get a date range
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        parsed = pd.Series(values)
+    else:
+        if not (pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)
+                or isinstance(values.dtype, pd.CategoricalDtype)):
+            return None
+        parsed = pd.to_datetime(pd.Series(values.astype(str)), errors="coerce", format="mixed")
+        if parsed.notna().mean() < 0.9:
+            return None
+    return [_scalar(parsed.min()), _scalar(parsed.max())]
+
+
+def profile_frame(df, top_k=None):
+    """
+    Profiles an in-memory DataFrame in a single pass.
+
+    Returns:
+        dict: Row count and per-column statistics, see `profile_dataset`.
+    """
+    accumulator = _Accumulator(len(df), len(df), settings.PROFILE_COUNT_LIMIT)
+    accumulator.add(df)
+    return accumulator.result(top_k or settings.PROFILE_TOP_K)
+
+
+def profile_dataset(s3_client, bucket, cleaned_file):
+    """
+    Profiles a cleaned dataset from its Parquet copy in chunks of
+    `PROFILE_CHUNK_ROWS`, so large files never load at once.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Bucket holding the dataset.
+        cleaned_file (str): Cleaned file id.
+
+    Returns:
+        dict: Row count and, per column, dtype, null ratio, distinct count,
+        min/max, quartiles (from a uniform sample of `PROFILE_SAMPLE_ROWS`),
+        top values and date range.
+    """
+    parquet_file = pq.ParquetFile(ensure_dataset(s3_client, bucket, cleaned_file), memory_map=True)
+    accumulator = _Accumulator(parquet_file.metadata.num_rows, settings.PROFILE_SAMPLE_ROWS, settings.PROFILE_COUNT_LIMIT)
+    for batch in parquet_file.iter_batches(batch_size=settings.PROFILE_CHUNK_ROWS):
+        accumulator.add(batch.to_pandas())
+    return accumulator.result(settings.PROFILE_TOP_K)
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def _describe_column(stats, detail):
+    line = f"- {stats['name']} ({stats['dtype']}"
+    if detail >= 1:
+        distinct = stats["distinct"] if stats["distinct_exact"] else f"~{stats['distinct']}"
+        line += f", {stats['nulls']:.0%} null, {distinct} distinct"
+    line += ")"
+    if detail >= 1 and "dates" in stats:
+        line += f": dates {stats['dates'][0]} to {stats['dates'][1]}"
+    elif detail >= 1 and "min" in stats:
+        line += f": min {_format_number(stats['min'])}, max {_format_number(stats['max'])}"
+        if detail >= 2 and "quantiles" in stats:
+            line += ", quartiles " + "/".join(_format_number(value) for value in stats["quantiles"])
+    if detail >= 2 and stats.get("top"):
+        line += "; top: " + ", ".join(f"{value} ({count})" for value, count in stats["top"])
+    return line
+
+
+def estimate_tokens(text):
+    # roughly four characters per token for English and code
+    return len(text) // 4 + 1
+
+
+def profile_prompt(profile, max_tokens=None):
+    """
+    Renders a profile as prompt context within a token budget, dropping
+    top values and quartiles first, then column statistics, then columns.
+
+    Args:
+        profile (dict): Result of `profile_dataset`.
+        max_tokens (int): Token budget, `PROMPT_PROFILE_TOKENS` when None.
+
+    Returns:
+        str: Dataset description.
+    """
+    max_tokens = max_tokens or settings.PROMPT_PROFILE_TOKENS
+    header = f"{profile['rows']} rows, {len(profile['columns'])} columns:"
+    for detail in (2, 1, 0):
+        lines = [_describe_column(stats, detail) for stats in profile["columns"]]
+        text = "\n".join([header] + lines)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+
+    # leave room for the trailer naming the dropped columns
+    budget = max_tokens * 4 - len(header) - 40
+    kept = []
+    for line in lines:
+        budget -= len(line) + 1
+        if budget < 0:
+            break
+        kept.append(line)
+    return "\n".join([header] + kept + [f"... and {len(lines) - len(kept)} more columns"])
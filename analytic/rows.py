@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config.config import Settings
+from analytic.chart_spec import apply_filters
+
+settings = Settings()
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_cursor(version, row):
+    return base64.urlsafe_b64encode(json.dumps({"v": version, "row": row}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, version):
+    """
+    Reads the source row a cursor points to.
+
+    Raises:
+        ValueError: When the cursor is malformed or belongs to another version of the dataset.
+    """
+    if not cursor:
+        return 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        row = int(data["row"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("invalid cursor")
+    if data.get("v") != version or row < 0:
+        raise ValueError("cursor does not match the current dataset")
+    return row
+
+
+def _batches(parquet_file, start, columns, batch_size):
+    # row groups before the cursor are never read, the first batch is cut at the cursor
+    metadata = parquet_file.metadata
+    first, position = 0, 0
+    while first < metadata.num_row_groups and position + metadata.row_group(first).num_rows <= start:
+        position += metadata.row_group(first).num_rows
+        first += 1
+    if first == metadata.num_row_groups:
+        return
+    groups = list(range(first, metadata.num_row_groups))
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=groups, columns=columns):
+        if position + batch.num_rows <= start:
+            position += batch.num_rows
+            continue
+        if position < start:
+            batch = batch.slice(start - position)
+            position = start
+        yield position, batch
+        position += batch.num_rows
+
+
+def filter_columns(filters):
+    return list(dict.fromkeys(chart_filter.column for chart_filter in filters))
+
+
+def page_end(path, start, limit, filters, batch_size=None):
+    """
+    Finds where a page ends by scanning only the filter columns.
+
+    Args:
+        path (str): Local Parquet copy of the dataset.
+        start (int): Source row the page starts at.
+        limit (int): Rows in the page.
+        filters (list): ChartFilter conditions rows must match.
+        batch_size (int): Rows read at once, `ROWS_BATCH_SIZE` when None.
+
+    Returns:
+        int: Source row after the last row of the page.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    total = parquet_file.metadata.num_rows
+    if not filters:
+        return min(start + limit, total)
+    matched = 0
+    for position, batch in _batches(parquet_file, start, filter_columns(filters), batch_size or settings.ROWS_BATCH_SIZE):
+        index = apply_filters(batch.to_pandas(), filters).index
+        if matched + len(index) >= limit:
+            return position + int(index[limit - matched - 1]) + 1
+        matched += len(index)
+    return total
+
+
+def stream_rows(path, start, end, columns, filters, output="ndjson", batch_size=None):
+    """
+    Yields the rows of a page one batch at a time, so memory stays bounded by
+    the batch size whatever the size of the dataset.
+
+    Args:
+        path (str): Local Parquet copy of the dataset.
+        start (int): Source row the page starts at.
+        end (int): Source row after the page, from `page_end`.
+        columns (list): Columns to return, all when None.
+        filters (list): ChartFilter conditions rows must match.
+        output (str): `ndjson` or `csv`.
+        batch_size (int): Rows read at once, `ROWS_BATCH_SIZE` when None.
+
+    Yields:
+        str: Serialized rows.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    names = columns or parquet_file.schema_arrow.names
+    read = None if columns is None else list(dict.fromkeys(columns + filter_columns(filters)))
+    header = output == "csv"
+    for position, batch in _batches(parquet_file, start, read, batch_size or settings.ROWS_BATCH_SIZE):
+        if position >= end:
+            break
+        df = batch.slice(0, end - position).to_pandas()
+        df = apply_filters(df, filters)[names]
+        if output == "csv":
+            yield df.to_csv(index=False, header=header, date_format="%Y-%m-%dT%H:%M:%S")
+            header = False
+        elif len(df):
+            yield df.to_json(orient="records", lines=True, date_format="iso")
+    if header:
+        # an empty page still tells csv readers the columns
+        yield pd.DataFrame(columns=names).to_csv(index=False)
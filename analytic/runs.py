@@ -0,0 +1,194 @@
+import asyncio
+import random
+
+import openai
+
+from config.config import Settings
+from database.database import *
+from analytic.clients import client
+
+settings = Settings()
+
+# run states worth another attempt, everything else is final
+RETRY_STATUSES = ["incomplete"]
+RETRY_ERROR_CODES = ["server_error", "rate_limit_exceeded"]
+RETRY_EXCEPTIONS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def run_error(run):
+    """
+    Describes why a run did not complete.
+
+    Args:
+        run: Run object in a final state.
+
+    Returns:
+        str: Human readable reason.
+    """
+    if run.last_error:
+        return run.last_error.message
+    if getattr(run, "incomplete_details", None):
+        return run.incomplete_details.reason
+    return run.status
+
+
+def backoff(attempt):
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        attempt (int): 1-based attempt that just failed.
+
+    Returns:
+        float: Seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(settings.RUN_BACKOFF_MAX, settings.RUN_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class RunProgress:
+    """
+    Collects streamed run steps and partial messages and writes them to
+    `status.progress` of the analytic row, at most once per `RUN_PROGRESS_INTERVAL`.
+    """
+
+    def __init__(self, id, stage):
+        self.id = id
+        self.stage = stage
+        self.attempt = 0
+        self.run_id = None
+        self.steps = {}
+        self.messages = {}
+        self._dirty = False
+        self._flushed_at = 0
+
+    def start(self, attempt):
+        self.attempt = attempt
+        self.run_id = None
+        self.steps = {}
+        self.messages = {}
+        self._dirty = True
+
+    def step(self, step):
+        self.steps[step.id] = {"type": step.type, "status": step.status}
+        self._dirty = True
+
+    def text(self, message_id, value):
+        self.messages[message_id] = self.messages.get(message_id, "") + value
+        self._dirty = True
+
+    async def flush(self, force=False):
+        loop = asyncio.get_running_loop()
+        if not self._dirty or (not force and loop.time() - self._flushed_at < settings.RUN_PROGRESS_INTERVAL):
+            return
+        self._dirty = False
+        self._flushed_at = loop.time()
+        await update_analytic_data(self.id, {"status.progress": {
+            "stage": self.stage,
+            "attempt": self.attempt,
+            "runId": self.run_id,
+            "steps": list(self.steps.values()),
+            "messages": list(self.messages.values()),
+        }})
+
+
+async def _stream_run(thread_id, assistant_id, instructions, progress):
+    run = None
+    stream = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        instructions=instructions,
+        stream=True,
+    )
+    async with stream:
+        async for event in stream:
+            if event.event.startswith("thread.run.step."):
+                # step deltas only carry the changed step details, not the type and status
+                if event.event != "thread.run.step.delta":
+                    progress.step(event.data)
+            elif event.event.startswith("thread.run."):
+                run = event.data
+                progress.run_id = run.id
+            elif event.event == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    if part.type == "text" and part.text and part.text.value:
+                        progress.text(event.data.id, part.text.value)
+            elif event.event == "error":
+                raise openai.APIError(event.data.message, None, body=None)
+            await progress.flush()
+    await progress.flush(force=True)
+    return run
+
+
+async def _cancel(thread_id, run_id):
+    try:
+        return await client.beta.threads.runs.cancel(run_id, thread_id=thread_id)
+    except Exception as e:
+        print(f"==== cancelling run {run_id} failed: ", e)
+
+
+async def drive_run(id, thread_id, assistant_id, instructions, stage):
+    """
+    Runs the assistant on a thread with streaming progress, retrying transient
+    failures with backoff, within `RUN_MAX_ATTEMPTS` attempts and `RUN_DEADLINE` seconds.
+
+    Args:
+        id (PydanticObjectId): Analytic row receiving progress updates.
+        thread_id (str): Thread to run.
+        assistant_id (str): Assistant to run.
+        instructions (str): Run instructions.
+        stage (str): Name of the pipeline stage, recorded with the progress.
+
+    Returns:
+        Run: The last run. Its status is `completed` on success; a run cut off by
+        the deadline is cancelled and returned as well.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.RUN_DEADLINE
+    progress = RunProgress(id, stage)
+    run = None
+
+    for attempt in range(1, settings.RUN_MAX_ATTEMPTS + 1):
+        progress.start(attempt)
+        try:
+            run = await asyncio.wait_for(
+                _stream_run(thread_id, assistant_id, instructions, progress),
+                timeout=max(deadline - loop.time(), 0),
+            )
+        except asyncio.TimeoutError:
+            print(f"==== run {progress.run_id} exceeded the {settings.RUN_DEADLINE}s deadline")
+            if progress.run_id:
+                return await _cancel(thread_id, progress.run_id) or run
+            raise
+        except RETRY_EXCEPTIONS as e:
+            print(f"==== run attempt {attempt} failed: ", e)
+            # the run may still be active server side, which would block the next one
+            if progress.run_id:
+                await _cancel(thread_id, progress.run_id)
+            if attempt == settings.RUN_MAX_ATTEMPTS:
+                raise
+        else:
+            if not run:
+                # stream ended before any run event arrived
+                if attempt == settings.RUN_MAX_ATTEMPTS:
+                    raise openai.APIConnectionError(request=None)
+            else:
+                print(f"==== run attempt {attempt}: {run.status}")
+                retry = run.status in RETRY_STATUSES or (
+                    run.status == "failed" and run.last_error and run.last_error.code in RETRY_ERROR_CODES
+                )
+                if not retry or attempt == settings.RUN_MAX_ATTEMPTS:
+                    return run
+
+        delay = backoff(attempt)
+        if loop.time() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+
+    if run:
+        return run
+    raise TimeoutError(f"run for {id} did not finish within {settings.RUN_DEADLINE}s")
@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import signal
+import struct
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config.config import Settings
+
+settings = Settings()
+
+# output of generated code is only kept for debugging, cap what travels back
+MAX_OUTPUT = 4096
+
+_frames = {}
+
+
+class ChartTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise ChartTimeout()
+
+
+def _init_worker(memory_limit):
+    # runs once per worker process, everything heavy is imported here and stays warm
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import pandas  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    import seaborn  # noqa: F401
+
+    signal.signal(signal.SIGALRM, _on_alarm)
+    if memory_limit:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _load_frame(dataset_path):
+    import pyarrow.parquet as pq
+
+    # keep the last dataset, consecutive charts usually share it
+    if dataset_path not in _frames:
+        _frames.clear()
+        df = pq.read_table(dataset_path, memory_map=True).to_pandas()
+        # generated code multiplies and sums freely, give it the integer width pandas defaults to
+        integers = df.select_dtypes("integer").columns
+        _frames[dataset_path] = df.astype(dict.fromkeys(integers, "int64"))
+    return _frames[dataset_path]
+
+
+def _render(code, name, dataset_path, timeout, dpi):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+
+    output = io.StringIO()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        # styles set by the code (sns.set_theme, plt.style.use, rcParams) end with the chart
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output), matplotlib.rc_context():
+            namespace = {"__name__": "generated_chart"}
+            exec(code, namespace)
+            result = namespace[name](_load_frame(dataset_path).copy())
+            figure = result if isinstance(result, Figure) else plt.gcf()
+            if not figure.get_axes():
+                raise ValueError(f"{name} did not draw a chart")
+            png = io.BytesIO()
+            figure.savefig(png, format="png", dpi=dpi, bbox_inches="tight")
+        # the tight bounding box changes the size, read it back from the png header
+        width, height = struct.unpack(">II", png.getbuffer()[16:24])
+        return {"png": png.getvalue(), "width": width, "height": height, "error": None, "output": output.getvalue()[-MAX_OUTPUT:]}
+    except ChartTimeout:
+        return {"png": None, "error": f"{name} timed out after {timeout}s", "output": output.getvalue()[-MAX_OUTPUT:]}
+    except MemoryError:
+        return {"png": None, "error": f"{name} exceeded the memory limit", "output": output.getvalue()[-MAX_OUTPUT:]}
+    except BaseException:
+        return {"png": None, "error": traceback.format_exc(limit=-3), "output": output.getvalue()[-MAX_OUTPUT:]}
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        plt.close("all")
+
+
+class ChartPool:
+    """
+    Warm pool of worker processes executing generated chart code away from
+    the event loop, with a wall-clock timeout and an address space limit per worker.
+    """
+
+    def __init__(self, workers, timeout, memory_limit):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._executor = None
+
+    def _ensure(self):
+        if self._executor is None:
+            # spawned workers do not inherit the event loop, sockets or threads of the api
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit,),
+            )
+        return self._executor
+
+    def reset(self):
+        """
+        Kills the workers, the next chart starts a fresh pool.
+        """
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # a worker stuck outside python never sees the alarm, terminate it
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def warm(self):
+        executor = self._ensure()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)])
+
+    async def render(self, code, name, dataset_path, dpi=100):
+        """
+        Runs `name` from the generated `code` on the dataset and renders the figure it draws.
+
+        Args:
+            code (str): Generated Python code.
+            name (str): Method defined by the code, called with the DataFrame.
+            dataset_path (str): Local Parquet copy of the dataset.
+            dpi (int): Resolution of the PNG.
+
+        Returns:
+            dict: `png` bytes with `width` and `height`, or None and the captured `error`,
+            plus the `output` the code printed.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._ensure(), _render, code, name, dataset_path, self.timeout, dpi)
+            # the alarm inside the worker fires first, this only catches a worker that ignored it
+            return await asyncio.wait_for(future, self.timeout + 5)
+        except asyncio.TimeoutError:
+            self.reset()
+            return {"png": None, "error": f"{name} did not finish after {self.timeout}s", "output": ""}
+        except BrokenProcessPool:
+            self.reset()
+            return {"png": None, "error": f"{name} crashed its worker process", "output": ""}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_pool = ChartPool(settings.CHART_WORKERS, settings.CHART_TIMEOUT, settings.CHART_MEMORY_LIMIT)
@@ -0,0 +1,203 @@
+import hashlib
+import itertools
+from tempfile import SpooledTemporaryFile
+
+from analytic.compression import compressor, decompressor
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def stream_upload(s3_client, fileobj, bucket, key, part_size, spool_max_size, encoding=None):
+    """
+    Streams a file object into S3 in bounded-size parts while hashing it and
+    spooling a copy for later re-reads.
+
+    Files that fit into a single part are stored with one `put_object` call,
+    larger ones go through a multipart upload which is aborted on failure.
+
+    Args:
+        s3_client: boto3 S3 client.
+        fileobj: Readable binary file object (e.g. `UploadFile.file`).
+        bucket (str): Target bucket.
+        key (str): Target object key.
+        part_size (int): Size of each uploaded part in bytes.
+        spool_max_size (int): Bytes kept in memory by the spooled copy before it rolls over to disk.
+        encoding (str): Content-Encoding to compress the object with, `zstd` or `gzip`.
+
+    Returns:
+        tuple: (spooled file positioned at 0, sha256 hex digest, size in bytes),
+        all of the uncompressed content.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    digest = hashlib.sha256()
+    spool = SpooledTemporaryFile(max_size=spool_max_size)
+    size = 0
+    encoder = compressor(encoding)
+    params = {"ContentEncoding": encoding} if encoding else {}
+    buffer = bytearray()
+    upload_id = None
+    parts = []
+
+    def upload_part(body):
+        part = s3_client.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=body,
+        )
+        parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+
+    try:
+        try:
+            while chunk := fileobj.read(part_size):
+                digest.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+                buffer += encoder.compress(chunk)
+                while len(buffer) >= part_size:
+                    if not upload_id:
+                        upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, **params)["UploadId"]
+                    upload_part(bytes(buffer[:part_size]))
+                    del buffer[:part_size]
+            buffer += encoder.flush()
+
+            if not upload_id:
+                s3_client.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), **params)
+            else:
+                if buffer:
+                    upload_part(bytes(buffer))
+                s3_client.complete_multipart_upload(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except Exception:
+            if upload_id:
+                s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+def spool_object(s3_client, bucket, key, chunk_size, spool_max_size):
+    """
+    Downloads an S3 object in chunks into a spooled temp file while hashing it,
+    decompressing objects stored with a Content-Encoding.
+
+    Args:
+        s3_client: boto3 S3 client.
+        bucket (str): Source bucket.
+        key (str): Source object key.
+        chunk_size (int): Size of each read from the response body in bytes.
+        spool_max_size (int): Bytes kept in memory by the spooled copy before it rolls over to disk.
+
+    Returns:
+        tuple: (spooled file positioned at 0, sha256 hex digest, size in bytes).
+    """
+    digest = hashlib.sha256()
+    spool = SpooledTemporaryFile(max_size=spool_max_size)
+    size = 0
+
+    obj = s3_client.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+    decoder = decompressor(obj.get("ContentEncoding"))
+    try:
+        for chunk in itertools.chain(map(decoder.decompress, body.iter_chunks(chunk_size)), [decoder.flush()]):
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        body.close()
+
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+async def transfer_openai_file(openai_client, s3, file_id, bucket, key, content_type, part_size, encoding=None):
+    """
+    Streams an OpenAI file into S3 in bounded-size parts without reading it fully into memory.
+
+    Args:
+        openai_client: AsyncOpenAI client.
+        s3: AsyncS3 client.
+        file_id (str): OpenAI file id.
+        bucket (str): Target bucket.
+        key (str): Target object key.
+        content_type (str): Content type stored with the object.
+        part_size (int): Size of each uploaded part in bytes.
+        encoding (str): Content-Encoding to compress the object with, `zstd` or `gzip`.
+
+    Returns:
+        dict: Artifact record with key, content type, encoding, size and sha256
+        of the uncompressed content, and the size stored.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    digest = hashlib.sha256()
+    encoder = compressor(encoding)
+    params = {"ContentType": content_type, **({"ContentEncoding": encoding} if encoding else {})}
+    buffer = bytearray()
+    size = 0
+    stored_size = 0
+    upload_id = None
+    parts = []
+
+    async def upload_part(body):
+        part = await s3.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=body,
+        )
+        parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+
+    try:
+        async with openai_client.files.with_streaming_response.content(file_id) as response:
+            async for chunk in response.iter_bytes():
+                digest.update(chunk)
+                size += len(chunk)
+                buffer += encoder.compress(chunk)
+                while len(buffer) >= part_size:
+                    if not upload_id:
+                        upload = await s3.create_multipart_upload(Bucket=bucket, Key=key, **params)
+                        upload_id = upload["UploadId"]
+                    stored_size += part_size
+                    await upload_part(bytes(buffer[:part_size]))
+                    del buffer[:part_size]
+        buffer += encoder.flush()
+        stored_size += len(buffer)
+
+        if not upload_id:
+            await s3.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), **params)
+        else:
+            if buffer:
+                await upload_part(bytes(buffer))
+            await s3.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+    except Exception:
+        if upload_id:
+            await s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return {
+        "key": key,
+        "content_type": content_type,
+        "encoding": encoding,
+        "size": size,
+        "stored_size": stored_size,
+        "sha256": digest.hexdigest(),
+    }
@@ -1,32 +1,41 @@
-import os, re
-from openai import OpenAI
-from config.config import Settings
+import os, re, json
 from database.database import *
+from analytic.clients import client
+from analytic.llm_cache import cached_completion
+from analytic.chart_spec import parse_spec, validate_spec, spec_prompt_schema
 
-client = OpenAI(api_key=Settings().APIKEY)
-
-def generate_chat_response(system_message, user_message):
+async def generate_chat_response(system_message, user_message, model='gpt-4', max_tokens=1200, temperature=None, cache=True, refresh=False, parse=None):
     """
     Generates a response based on system and user messages using OpenAI's ChatCompletion API.
+    Identical requests are answered from the response cache.
 
     Args:
         system_message (str): System's message.
         user_message (str): User's message.
+        model (str): Model to use.
+        max_tokens (int): Maximum tokens of the response.
+        temperature (float): Sampling temperature, the API default when None.
+        cache (bool): Whether to use the response cache at all.
+        refresh (bool): Ignore a cached response and replace it with a new one.
+        parse: Turns the response into the result, a response it raises on is not cached.
 
     Returns:
-        str: Generated response.
+        str: Generated response, or what `parse` made of it.
     """
     system = {'role': 'system', 'content': system_message}  # Define system's message structure
     user = {'role': 'user', 'content': user_message}  # Define user's message structure
 
-    response = client.chat.completions.create(  # Call OpenAI's ChatCompletion API
-        model='gpt-4',
+    return await cached_completion(  # Call OpenAI's ChatCompletion API unless the response is cached
+        client.chat.completions.create,
+        model=model,
         messages=[system, user],
-        max_tokens=1200
+        max_tokens=max_tokens,
+        temperature=temperature,
+        cache=cache,
+        refresh=refresh,
+        parse=parse,
     )
 
-    return response.choices[0].message.content  # Return the generated response
-
 def extract_code(response_content):
     """
     Extracts code from the response content.
@@ -42,7 +51,7 @@ def extract_code(response_content):
     return matches[0].replace("python", "")  # Return the extracted code
 
 
-def update_chart(code, user_message, execute=True):
+async def update_chart(code, user_message, execute=True):
     """
     Updates existing Python code based on user message and optionally executes it.
 
@@ -60,14 +69,98 @@ def update_chart(code, user_message, execute=True):
     Return the updated Python code wrapped in ``` delimiters. Do not provide elaborations.
     """
 
-    response_content = generate_chat_response(system_message, user_message)  # Generate response
-    current_chart = extract_code(response_content)  # Extract updated code from response
+    current_chart = await generate_chat_response(system_message, user_message, parse=extract_code)  # Generate response and extract the updated code
 
     if execute:
-        exec(current_chart, globals())  # Execute the updated code if execute flag is True
+        exec(current_chart, {})  # Execute the updated code in its own namespace if execute flag is True
 
     return current_chart  # Return the updated code
 
+def load_method(code, name):
+    """
+    Executes generated code in its own namespace and returns the method it defines.
+
+    Args:
+        code (str): Python code.
+        name (str): Name of the method defined by the code.
+
+    Returns:
+        function: The generated method.
+    """
+    namespace = {}
+    exec(code, namespace)
+    return namespace[name]
+
+
+async def create_query(user_message, refresh=False):
+    """
+    Generates a `generate_query` method from the user message and runs it.
+    Only a response whose method runs is cached.
+
+    Args:
+        user_message (str): User's message.
+        refresh (bool): Ignore a cached response.
+
+    Returns:
+        list: Questions returned by the generated method.
+    """
+    system_message = """
+    You are a data analyst and Python developer familiar with pandas.
+    Return the requested Python code wrapped in ``` delimiters. Do not provide elaborations.
+    """
+
+    def run_query(response_content):
+        code = extract_code(response_content)
+        print("Generated code for the current chart: ", code)
+        return load_method(code, "generate_query")()
+
+    return await generate_chat_response(system_message, user_message, refresh=refresh, parse=run_query)
+
+
+async def create_chart(user_message, refresh=False):
+    """
+    Generates the Python code of a `generate_method` chart method from the user message.
+
+    Args:
+        user_message (str): User's message.
+        refresh (bool): Ignore a cached response.
+
+    Returns:
+        str: Generated Python code.
+    """
+    system_message = """
+    You are a Python developer familiar with pandas, matplotlib and seaborn.
+    Return the requested Python code wrapped in ``` delimiters. Do not provide elaborations.
+    """
+
+    return await generate_chat_response(system_message, user_message, refresh=refresh, parse=extract_code)
+
+async def create_chart_spec(user_message, columns, refresh=False):
+    """
+    Asks for a declarative chart spec instead of plotting code.
+
+    Args:
+        user_message (str): User's message.
+        columns (list): Columns of the dataset the spec may use.
+        refresh (bool): Ignore a cached response.
+
+    Returns:
+        ChartSpec: Validated chart spec.
+    """
+    system_message = f"""
+    You are a data visualization expert. Answer with a single JSON chart spec following this JSON schema:
+    {spec_prompt_schema()}
+    Only use these columns: {json.dumps(columns)}.
+    Return only the JSON wrapped in ``` delimiters. Do not provide elaborations.
+    """
+
+    def checked_spec(response_content):
+        spec = parse_spec(response_content)
+        validate_spec(spec, columns)
+        return spec
+
+    return await generate_chat_response(system_message, user_message, max_tokens=600, refresh=refresh, parse=checked_spec)
+
 async def update_status(id, status):
     update_data = dict(exclude_unset=True)
     update_data["status"] = status
@@ -1,9 +1,12 @@
+import asyncio
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from auth.jwt_bearer import JWTBearer
-from config.config import initiate_database
+from config.config import Settings, initiate_database
+from analytic.assistants import maintain_thread_pool
 from routes.admin import router as AdminRouter
 from routes.student import router as StudentRouter
 from routes.analytic import router as AnalyticRouter
@@ -30,6 +33,12 @@ async def start_database():
     await initiate_database()
 
 
+@app.on_event("startup")
+async def start_thread_pool():
+    if Settings().THREAD_POOL_SIZE > 0:
+        app.state.thread_pool_task = asyncio.create_task(maintain_thread_pool())
+
+
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to this fantastic app."}
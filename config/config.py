@@ -15,6 +15,78 @@ class Settings(BaseSettings):
     S3_REGION: Optional[str] = None
     S3_PRIVATE_BUCKET: Optional[str] = None
     S3_PUBLIC_BUCKET: Optional[str] = None
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_TIMEOUT: float = 600
+    # uploads
+    S3_UPLOAD_PART_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_SPOOL_MAX_SIZE: int = 16 * 1024 * 1024
+    # spreadsheets are converted to csv before the assistant sees them
+    INGEST_SPREADSHEETS: bool = True
+    # Content-Encoding per stored object class: zstd, gzip or none
+    S3_COMPRESS_ORIGINAL: str = "zstd"
+    S3_COMPRESS_CLEANED: str = "gzip"
+    S3_COMPRESS_IMAGE: str = "none"
+    S3_COMPRESSION_LEVEL: int = 3
+    S3_PRESIGNED_URL_EXPIRES: int = 3600
+    TRANSFER_CONCURRENCY: int = 4
+    # assistants
+    THREAD_POOL_SIZE: int = 5
+    THREAD_POOL_REFILL_INTERVAL: int = 30
+    # datasets
+    DATASET_CACHE_DIR: str = "/tmp/datasets"
+    DATASET_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    PREVIEW_ROWS: int = 5
+    PREVIEW_RANGE_BYTES: int = 8192
+    PROFILE_CHUNK_ROWS: int = 100_000
+    PROFILE_SAMPLE_ROWS: int = 50_000
+    PROFILE_COUNT_LIMIT: int = 10_000
+    PROFILE_TOP_K: int = 5
+    PROMPT_PROFILE_TOKENS: int = 1500
+    AGGREGATE_CACHE_SIZE: int = 256
+    AGGREGATE_MAX_ROWS: int = 5000
+    SERIES_CACHE_SIZE: int = 128
+    SERIES_MAX_POINTS: int = 5000
+    ROWS_BATCH_SIZE: int = 10_000
+    ROWS_PAGE_LIMIT: int = 100_000
+    # datasets above this uncompressed size are processed in chunks
+    CHUNKED_THRESHOLD_BYTES: int = 256 * 1024 * 1024
+    CHUNK_ROWS: int = 100_000
+    CHUNKED_SAMPLE_ROWS: int = 100_000
+    SKETCH_K: int = 200
+    SKETCH_PRECISION: int = 12
+    # assistant runs
+    RUN_MAX_ATTEMPTS: int = 3
+    RUN_BACKOFF_BASE: float = 2
+    RUN_BACKOFF_MAX: float = 60
+    RUN_DEADLINE: int = 1800
+    RUN_PROGRESS_INTERVAL: float = 1
+    # background jobs
+    WORKER_CONCURRENCY: int = 4
+    WORKER_POLL_INTERVAL: float = 2
+    JOB_VISIBILITY_TIMEOUT: int = 300
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_DELAY: int = 30
+    # status events
+    EVENTS_BACKEND: str = "mongo"
+    EVENTS_POLL_INTERVAL: float = 0.5
+    EVENTS_KEEPALIVE: float = 15
+    EVENTS_QUEUE_SIZE: int = 16
+    # chart sandbox
+    CHART_WORKERS: int = 2
+    CHART_TIMEOUT: float = 60
+    CHART_MEMORY_LIMIT: int = 2 * 1024 * 1024 * 1024
+    CHART_PREWARM: bool = True
+    CHART_CODE_ATTEMPTS: int = 5
+    CHART_CODE_FAILURES: int = 20
+    GRAPH_CONCURRENCY: int = 4
+    CHART_ENGINE: str = "spec"
+    CHART_MAX_INCHES: float = 40
+    CHART_MAX_DPI: int = 300
+    # llm response cache
+    LLM_CACHE_SIZE: int = 256
+    LLM_CACHE_TTL: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
     # JWT
     secret_key: str = "secret"
     algorithm: str = "HS256"
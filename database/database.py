@@ -1,14 +1,29 @@
 from typing import List, Union
+from datetime import datetime, timedelta
 
 from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from models.admin import Admin
 from models.student import Student
-from models.analytic import Analytic
+from models.analytic import Analytic, AnalyticStatus
+from models.dataset import Dataset
+from models.assistant import Assistant, PooledThread
+from models.job import Job
+from models.llm_response import LLMResponse
+from models.chart_code import ChartCode
+from analytic.events import broker
 
 admin_collection = Admin
 student_collection = Student
 analytic_collection = Analytic
+dataset_collection = Dataset
+assistant_collection = Assistant
+thread_pool_collection = PooledThread
+job_collection = Job
+llm_response_collection = LLMResponse
+chart_code_collection = ChartCode
 
 
 async def add_admin(new_admin: Admin) -> Admin:
@@ -57,11 +72,195 @@ async def retrieve_analytic(id: PydanticObjectId) -> Analytic:
     if analytic:
         return analytic
 
+async def retrieve_analytic_status(id: PydanticObjectId) -> AnalyticStatus:
+    analytic = await analytic_collection.find_one(Analytic.id == id).project(AnalyticStatus)
+    if analytic:
+        return analytic
+
 async def update_analytic_data(id: PydanticObjectId, data: dict) -> Union[bool, Analytic]:
     des_body = {k: v for k, v in data.items() if v is not None}
     update_query = {"$set": {field: value for field, value in des_body.items()}}
     analytic = await analytic_collection.get(id)
     if analytic:
         await analytic.update(update_query)
+        if any(field == "status" or field.startswith("status.") for field in des_body):
+            await broker.publish(str(id), analytic.status)
         return analytic
-    return False
\ No newline at end of file
+    return False
+
+async def update_analytic_query(id: PydanticObjectId, index: int, data: dict, status: dict = None, inc: dict = None) -> bool:
+    # only touches queries.{index}, concurrent writers of other queries never overwrite each other
+    update_query = {"$set": {f"queries.{index}.{field}": value for field, value in data.items()}}
+    update_query["$set"].update({f"status.{field}": value for field, value in (status or {}).items()})
+    if inc:
+        update_query["$inc"] = {f"status.{field}": value for field, value in inc.items()}
+    analytic = await analytic_collection.get_motor_collection().find_one_and_update(
+        {"_id": id}, update_query, projection={"status": 1}, return_document=ReturnDocument.AFTER
+    )
+    if analytic:
+        await broker.publish(str(id), analytic.get("status"))
+        return True
+    return False
+
+async def retrieve_dataset(sha256: str) -> Dataset:
+    if not sha256:
+        return None
+    dataset = await dataset_collection.find_one(Dataset.sha256 == sha256)
+    if dataset:
+        return dataset
+
+async def add_dataset(new_dataset: Dataset) -> Dataset:
+    # concurrent uploads of the same bytes race on the unique hash index
+    try:
+        dataset = await new_dataset.create()
+    except DuplicateKeyError:
+        dataset = await retrieve_dataset(new_dataset.sha256)
+    return dataset
+
+async def update_dataset_data(sha256: str, data: dict) -> Union[bool, Dataset]:
+    des_body = {k: v for k, v in data.items() if v is not None}
+    des_body["updatedAt"] = datetime.utcnow()
+    update_query = {"$set": {field: value for field, value in des_body.items()}}
+    dataset = await retrieve_dataset(sha256)
+    if dataset:
+        await dataset.update(update_query)
+        return dataset
+    return False
+
+async def retrieve_assistant(config_hash: str) -> Assistant:
+    assistant = await assistant_collection.find_one(Assistant.config_hash == config_hash)
+    if assistant:
+        return assistant
+
+async def add_assistant(new_assistant: Assistant) -> Assistant:
+    # another process may have registered the same configuration first
+    try:
+        assistant = await new_assistant.create()
+    except DuplicateKeyError:
+        assistant = await retrieve_assistant(new_assistant.config_hash)
+    return assistant
+
+async def count_pooled_threads() -> int:
+    return await thread_pool_collection.count()
+
+async def add_pooled_thread(new_thread: PooledThread) -> PooledThread:
+    thread = await new_thread.create()
+    return thread
+
+async def claim_pooled_thread() -> Union[None, str]:
+    # atomic so concurrent requests never claim the same thread
+    thread = await thread_pool_collection.get_motor_collection().find_one_and_delete({}, sort=[("createdAt", 1)])
+    if thread:
+        return thread["threadId"]
+
+async def add_job(new_job: Job) -> Job:
+    job = await new_job.create()
+    return job
+
+async def retrieve_job(id: PydanticObjectId) -> Job:
+    job = await job_collection.get(id)
+    if job:
+        return job
+
+async def claim_job(kinds: List[str], worker: str, visibility_timeout: int) -> Union[None, Job]:
+    # running jobs whose visibility expired belong to a dead worker and are claimed again
+    now = datetime.utcnow()
+    job = await job_collection.get_motor_collection().find_one_and_update(
+        {"kind": {"$in": kinds}, "state": {"$in": ["queued", "running"]}, "visibleAt": {"$lte": now}},
+        {
+            "$set": {"state": "running", "worker": worker, "visibleAt": now + timedelta(seconds=visibility_timeout), "updatedAt": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("visibleAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        return Job.model_validate(job)
+
+async def extend_job(id: PydanticObjectId, worker: str, visibility_timeout: int) -> bool:
+    now = datetime.utcnow()
+    result = await job_collection.get_motor_collection().update_one(
+        {"_id": id, "state": "running", "worker": worker},
+        {"$set": {"visibleAt": now + timedelta(seconds=visibility_timeout), "updatedAt": now}},
+    )
+    return result.modified_count == 1
+
+async def finish_job(id: PydanticObjectId, worker: str, data: dict) -> bool:
+    des_body = {k: v for k, v in data.items() if v is not None}
+    des_body["updatedAt"] = datetime.utcnow()
+    result = await job_collection.get_motor_collection().update_one(
+        {"_id": id, "state": "running", "worker": worker},
+        {"$set": des_body},
+    )
+    return result.modified_count == 1
+
+async def retrieve_llm_response(key: str) -> Union[None, LLMResponse]:
+    # expired entries linger until mongo's ttl monitor runs, skip them
+    now = datetime.utcnow()
+    response = await llm_response_collection.get_motor_collection().find_one_and_update(
+        {"key": key, "$or": [{"expiresAt": None}, {"expiresAt": {"$gt": now}}]},
+        {"$set": {"lastHitAt": now}, "$inc": {"hits": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if response:
+        return LLMResponse.model_validate(response)
+
+async def add_llm_response(new_response: LLMResponse) -> LLMResponse:
+    # a refresh or a concurrent miss overwrites the entry in place
+    document = new_response.model_dump(exclude={"id", "revision_id"})
+    await llm_response_collection.get_motor_collection().update_one(
+        {"key": new_response.key}, {"$set": document}, upsert=True
+    )
+    return new_response
+
+async def evict_llm_responses(max_bytes: int) -> int:
+    # drop the least recently hit entries until the cache fits in max_bytes
+    collection = llm_response_collection.get_motor_collection()
+    totals = await collection.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]).to_list(1)
+    excess = (totals[0]["size"] if totals else 0) - max_bytes
+    evicted = []
+    if excess > 0:
+        async for entry in collection.find({}, {"size": 1}).sort("lastHitAt", 1):
+            evicted.append(entry["_id"])
+            excess -= entry["size"]
+            if excess <= 0:
+                break
+        await collection.delete_many({"_id": {"$in": evicted}})
+    return len(evicted)
+
+async def retrieve_chart_code(key: str) -> Union[None, ChartCode]:
+    chart_code = await chart_code_collection.find_one(ChartCode.key == key)
+    if chart_code:
+        return chart_code
+
+async def save_chart_code(key: str, fingerprint: str, question: str, code: str, code_hash: str) -> bool:
+    now = datetime.utcnow()
+    result = await chart_code_collection.get_motor_collection().update_one(
+        {"key": key},
+        {
+            "$set": {"code": code, "codeHash": code_hash, "updatedAt": now},
+            "$setOnInsert": {"fingerprint": fingerprint, "question": question, "failures": [], "hits": 0, "createdAt": now},
+        },
+        upsert=True,
+    )
+    return result.acknowledged
+
+async def hit_chart_code(key: str) -> bool:
+    result = await chart_code_collection.get_motor_collection().update_one({"key": key}, {"$inc": {"hits": 1}})
+    return result.modified_count == 1
+
+async def add_chart_failure(key: str, fingerprint: str, question: str, code_hash: str, error: str, limit: int) -> bool:
+    now = datetime.utcnow()
+    collection = chart_code_collection.get_motor_collection()
+    # the stored code is no longer valid when it is the variant that just failed
+    await collection.update_one({"key": key, "codeHash": code_hash}, {"$set": {"code": None, "codeHash": None}})
+    result = await collection.update_one(
+        {"key": key},
+        {
+            "$push": {"failures": {"$each": [{"codeHash": code_hash, "error": error}], "$slice": -limit}},
+            "$set": {"updatedAt": now},
+            "$setOnInsert": {"fingerprint": fingerprint, "question": question, "hits": 0, "createdAt": now},
+        },
+        upsert=True,
+    )
+    return result.acknowledged
@@ -1,5 +1,11 @@
 from models.admin import Admin
 from models.student import Student
 from models.analytic import Analytic
+from models.dataset import Dataset
+from models.assistant import Assistant, PooledThread
+from models.job import Job
+from models.event import StatusEvent
+from models.llm_response import LLMResponse
+from models.chart_code import ChartCode
 
-__all__ = [Student, Admin, Analytic]
+__all__ = [Student, Admin, Analytic, Dataset, Assistant, PooledThread, Job, StatusEvent, LLMResponse, ChartCode]
@@ -11,8 +11,17 @@ class Analytic(Document):
     assistantId: Optional[str] = None
     origin_file: Optional[str] = None
     file: Optional[Any] = None
+    file_hash: Optional[str] = None
+    file_size: Optional[int] = None
+    normalized_file: Optional[str] = None
+    sheets: Optional[Any] = None
+    upload: Optional[Any] = None
     cleaned_file: Optional[str] = None
+    artifacts: Optional[Any] = {}
     header: Optional[Any] = None
+    preview: Optional[Any] = None
+    profile: Optional[Any] = None
+    rollups: Optional[Any] = None
     queries: Optional[Any] = None
     status: Optional[Any] = {"current": "Started"}
 
@@ -30,3 +39,9 @@ class Analytic(Document):
 
     class Settings:
         name = "analytic"
+
+
+class AnalyticStatus(BaseModel):
+    status: Optional[Any] = None
+    cleaned_file: Optional[str] = None
+    preview: Optional[Any] = None
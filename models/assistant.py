@@ -0,0 +1,41 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from beanie import Document, Indexed
+from pydantic.fields import Field
+
+
+class Assistant(Document):
+    config_hash: Indexed(str, unique=True)
+    assistantId: str
+    config: Optional[Any] = None
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "config_hash": "4e07408562bedb8b60ce05c1decfe3ad16b72230967de01f640b7e4729b49fce",
+                "assistantId": "asst_abc123",
+                "config": {"model": "gpt-4o", "tools": [{"type": "code_interpreter"}]},
+            }
+        }
+
+    class Settings:
+        name = "assistant"
+
+
+class PooledThread(Document):
+    threadId: str
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "threadId": "thread_abc123",
+            }
+        }
+
+    class Settings:
+        name = "thread_pool"
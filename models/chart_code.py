@@ -0,0 +1,32 @@
+from typing import Optional, Any, List
+from datetime import datetime
+
+from beanie import Document, Indexed
+from pydantic.fields import Field
+
+
+class ChartCode(Document):
+    key: Indexed(str, unique=True)
+    fingerprint: str
+    question: str
+    code: Optional[str] = None
+    codeHash: Optional[str] = None
+    failures: List[Any] = []
+    hits: int = 0
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "key": "3f1c...:9ab2...",
+                "fingerprint": "3f1c5e0a4b7d9e2f1a3c5e7b9d1f3a5c7e9b1d3f5a7c9e1b3d5f7a9c1e3b5d7f",
+                "question": "Draw a bar chart comparing the total number of items sold per category.",
+                "code": "def generate_method(df):\n    ...",
+                "failures": [{"codeHash": "c0ffee...", "error": "KeyError: 'Revenue'"}],
+            }
+        }
+
+    class Settings:
+        name = "chart_code"
@@ -0,0 +1,35 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from beanie import Document, Indexed
+from pydantic.fields import Field
+
+
+class Dataset(Document):
+    sha256: Indexed(str, unique=True)
+    bucket: Optional[str] = None
+    origin_file: Optional[str] = None
+    normalized_file: Optional[str] = None
+    sheets: Optional[Any] = None
+    fileId: Optional[str] = None
+    file: Optional[Any] = None
+    cleaned_file: Optional[str] = None
+    cleaned: Optional[Any] = None
+    insights: Optional[Any] = None
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "sha256": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "bucket": "theorekabucket",
+                "origin_file": "2024-05-01-10-00-00_product_sales_dataset.csv",
+                "fileId": "file-abc123",
+                "cleaned_file": "file-def456",
+            }
+        }
+
+    class Settings:
+        name = "dataset"
@@ -0,0 +1,30 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from beanie import Document
+from pydantic.fields import Field
+import pymongo
+
+
+class StatusEvent(Document):
+    channel: str
+    message: Optional[Any] = None
+    origin: str
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "channel": "6650c3b0f1d2a3b4c5d6e7f8",
+                "message": {"current": "cleaned"},
+                "origin": "0f4c7d0e9a6b4f4f8c1d2e3f4a5b6c7d",
+            }
+        }
+
+    class Settings:
+        name = "status_event"
+        # events only matter to listeners polling right now, mongo drops them after an hour
+        indexes = [
+            pymongo.IndexModel([("createdAt", pymongo.ASCENDING)], expireAfterSeconds=3600),
+        ]
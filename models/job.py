@@ -0,0 +1,38 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from beanie import Document, PydanticObjectId
+from pydantic.fields import Field
+import pymongo
+
+
+class Job(Document):
+    kind: str
+    analyticId: PydanticObjectId
+    payload: Optional[Any] = None
+    state: str = "queued"
+    attempts: int = 0
+    max_attempts: int = 3
+    worker: Optional[str] = None
+    error: Optional[str] = None
+
+    visibleAt: datetime = Field(default_factory=datetime.utcnow)
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+    updatedAt: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "kind": "clean_file",
+                "analyticId": "6650c3b0f1d2a3b4c5d6e7f8",
+                "state": "queued",
+                "attempts": 0,
+                "max_attempts": 3,
+            }
+        }
+
+    class Settings:
+        name = "job"
+        indexes = [
+            [("state", pymongo.ASCENDING), ("visibleAt", pymongo.ASCENDING)],
+        ]
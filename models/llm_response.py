@@ -0,0 +1,38 @@
+from typing import Optional, Any
+from datetime import datetime
+
+from beanie import Document, Indexed
+from pydantic.fields import Field
+import pymongo
+
+
+class LLMResponse(Document):
+    key: Indexed(str, unique=True)
+    model: str
+    content: str
+    size: int = 0
+    hits: int = 0
+    request: Optional[Any] = None
+
+    createdAt: datetime = Field(default_factory=datetime.utcnow)
+    lastHitAt: datetime = Field(default_factory=datetime.utcnow)
+    expiresAt: Optional[datetime] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "key": "9f2b5c1e0d3a4b6c8e7f9a0b1c2d3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d",
+                "model": "gpt-4",
+                "content": "```python\ndef generate_query():\n    return []\n```",
+                "size": 52,
+                "hits": 3,
+            }
+        }
+
+    class Settings:
+        name = "llm_response"
+        indexes = [
+            # each entry carries its own expiry, set from LLM_CACHE_TTL when written
+            pymongo.IndexModel([("expiresAt", pymongo.ASCENDING)], expireAfterSeconds=0),
+            [("lastHitAt", pymongo.ASCENDING)],
+        ]
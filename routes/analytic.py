@@ -1,26 +1,42 @@
-from fastapi import APIRouter, Body, File, UploadFile, BackgroundTasks
-from openai import OpenAI
+from fastapi import APIRouter, Body, File, UploadFile, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, Response as BinaryResponse
 from datetime import datetime
-import boto3
-import pandas as pd
+from typing import List
+import asyncio
+import json
+import mimetypes
+import pyarrow.parquet as pq
 
 from database.database import *
 from models.analytic import Analytic
-from schemas.analytic import Response
+from models.dataset import Dataset
+from schemas.analytic import Response, InitiateUploadModel, PresignPartsModel, CompleteUploadModel, AggregateModel
+from schemas.chart_spec import ChartSpec, ChartFilter
 from config.config import Settings
 from analytic.utils import *
+from analytic.clients import client, S3_CLIENT
+from analytic.storage import stream_upload, spool_object, transfer_openai_file
+from analytic.compression import object_encoding, store_object
+from analytic.ingest import is_spreadsheet, csv_name, spreadsheet_to_csv
+from analytic.dataset_store import store_dataset, load_dataset, ensure_dataset, build_preview, preview_records, read_csv_preview
+from analytic.profiler import profile_dataset, profile_prompt
+from analytic.assistants import ANALYST_ASSISTANT, get_assistant_id, claim_thread
+from analytic.jobs import enqueue
+from analytic.runs import drive_run, run_error
+from analytic.events import broker
+from analytic import llm_cache
+from analytic.chart_cache import schema_fingerprint, chart_for_question
+from analytic.chart_spec import render_data, spec_columns, validate_spec
+from analytic.aggregate import aggregate_cache, aggregate_file, build_rollups, numeric_columns, query_key, spec_data, validate_query
+from analytic.downsample import series_cache, series_key, series_file
+from analytic.rows import MEDIA_TYPES, decode_cursor, encode_cursor, page_end, stream_rows
 
 settings = Settings()
 
 router = APIRouter()
-client = OpenAI(api_key=settings.APIKEY)
 
-S3_CLIENT = boto3.client(
-    's3',
-    aws_access_key_id=settings.S3_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
-    region_name=settings.S3_REGION
-)
 S3_PRIVATE_BUCKET = settings.S3_PRIVATE_BUCKET
 S3_PUBLIC_BUCKET = settings.S3_PUBLIC_BUCKET
 
@@ -50,6 +66,102 @@ async def add_analytic_data(analytic: Analytic = Body(...)):
         "data": False,
     }
 
+def dataset_file_ids(file_id, sheets):
+    """
+    OpenAI file ids of an upload: one CSV per non-empty sheet for converted workbooks, the upload itself otherwise.
+    """
+    return [sheet["fileId"] for sheet in sheets or [] if sheet.get("fileId")] or [file_id]
+
+async def setup_assistant(file_ids):
+    """
+    Resolves the shared analyst assistant and claims a pre-warmed thread with the dataset attached.
+
+    Args:
+        file_ids (list): OpenAI file ids of the dataset.
+
+    Returns:
+        dict: Analytic fields to update (threadId, assistantId).
+    """
+    update_data = dict(exclude_unset=True)
+    update_data["assistantId"] = await get_assistant_id(ANALYST_ASSISTANT)
+    update_data["threadId"] = await claim_thread(file_ids)
+    return update_data
+
+async def register_upload(bucket, filename, file_data, file_hash, file_size):
+    """
+    Links a freshly stored upload to its OpenAI file, reusing the S3 object and
+    OpenAI file of an identical earlier upload when the content hash is known.
+
+    Args:
+        bucket (str): Bucket the upload was stored in.
+        filename (str): Object key of the upload.
+        file_data: Readable binary file object holding the dataset.
+        file_hash (str): SHA-256 hex digest of the upload.
+        file_size (int): Size of the upload in bytes.
+
+    Returns:
+        dict: Analytic fields to update.
+    """
+    dataset = await retrieve_dataset(file_hash)
+    if dataset and dataset.bucket == bucket:
+        print(f"Reusing dataset {file_hash} for {filename}")
+        if dataset.origin_file != filename:
+            await S3_CLIENT.delete_object(Bucket=bucket, Key=filename)
+        filename = dataset.origin_file
+        uploadedFile = dataset.file
+        file_id = dataset.fileId
+        sheets = dataset.sheets
+        normalized_file = dataset.normalized_file
+    else:
+        uploads, sheets, normalized_file = [(filename, file_data)], None, None
+        if settings.INGEST_SPREADSHEETS and is_spreadsheet(filename):
+            # the assistant gets a local CSV conversion of every sheet and only does the semantic cleaning
+            try:
+                spools, sheets = await run_in_threadpool(spreadsheet_to_csv, file_data, filename, settings.UPLOAD_SPOOL_MAX_SIZE)
+                named = sum(spool is not None for spool in spools) > 1
+                uploads = [
+                    (csv_name(filename, sheet["name"] if named else None), spool)
+                    for spool, sheet in zip(spools, sheets) if spool is not None
+                ]
+            except Exception as e:
+                print("==== spreadsheet conversion failed: ", e)
+                file_data.seek(0)
+        try:
+            uploaded = await asyncio.gather(*[
+                client.files.create(file=(upload_name, upload_data), purpose="assistants")
+                for upload_name, upload_data in uploads
+            ])
+        finally:
+            for upload_name, upload_data in uploads:
+                if upload_data is not file_data:
+                    upload_data.close()
+        uploadedFile = uploaded[0]
+        if sheets:
+            converted = [sheet for sheet in sheets if sheet["rows"]]
+            for sheet, (upload_name, upload_data), created in zip(converted, uploads, uploaded):
+                sheet["file"], sheet["fileId"] = upload_name, created.id
+                if sheet["selected"]:
+                    uploadedFile, normalized_file = created, upload_name
+        file_id = uploadedFile.id
+        await add_dataset(Dataset(
+            sha256=file_hash,
+            bucket=bucket,
+            origin_file=filename,
+            normalized_file=normalized_file,
+            sheets=sheets,
+            fileId=file_id,
+            file=uploadedFile,
+        ))
+
+    update_data = await setup_assistant(dataset_file_ids(file_id, sheets))
+    update_data["origin_file"] = filename
+    update_data["normalized_file"] = normalized_file
+    update_data["sheets"] = sheets
+    update_data["file"] = uploadedFile
+    update_data["file_hash"] = file_hash
+    update_data["file_size"] = file_size
+    return update_data
+
 @router.post(
     "/upload_file/{id}",
     response_description="File uploaded successfully",
@@ -62,11 +174,18 @@ async def upload_file(id: PydanticObjectId, file: UploadFile = File(...)):
     filename = file.filename.replace(' ', '-')
     filename = f"{current_timestamp}_{filename}"
 
-    # save file on local
+    # stream file to s3 in parts, keeping a spooled copy for the assistant upload
     try:
-        file_data = file.file.read()
-        
-        S3_CLIENT.put_object(Bucket=S3_PUBLIC_BUCKET, Key=filename,  Body=file_data)
+        file_data, file_hash, file_size = await S3_CLIENT.run(
+            stream_upload,
+            S3_CLIENT.sync,
+            file.file,
+            S3_PUBLIC_BUCKET,
+            filename,
+            settings.S3_UPLOAD_PART_SIZE,
+            settings.UPLOAD_SPOOL_MAX_SIZE,
+            object_encoding("original"),
+        )
     except Exception as e:
         print(e)
         return {
@@ -79,23 +198,7 @@ async def upload_file(id: PydanticObjectId, file: UploadFile = File(...)):
         file.file.close()
 
     try:
-    # create an instance of assistant api    
-        uploadedFile = client.files.create(file=file_data, purpose="assistants")
-        
-        assistant = client.beta.assistants.create(
-            model='gpt-4o',
-            temperature=0.7,
-            instructions="You're an AI assistant who has access to tools to complete the task."
-                        "You should apply ReAct and Tree-of-thoughts approach to complete the given task.",
-            tools=[{"type": "code_interpreter"}],
-            tool_resources={
-                "code_interpreter": {
-                    "file_ids": [uploadedFile.id]
-                }
-            }
-        )
-        
-        thread = client.beta.threads.create()
+        update_data = await register_upload(S3_PUBLIC_BUCKET, filename, file_data, file_hash, file_size)
     except Exception as e:
         print(e)
         return {
@@ -104,12 +207,9 @@ async def upload_file(id: PydanticObjectId, file: UploadFile = File(...)):
             "data": 'file',
             "description": "There was an error uploading the file"
         }
+    finally:
+        file_data.close()
     # update analytic data
-    update_data = dict(exclude_unset=True)
-    update_data["origin_file"] = filename
-    update_data["threadId"] = thread.id
-    update_data["assistantId"] = assistant.id
-    update_data["file"] = uploadedFile
     update_data["status"] = 'uploaded'
     
     updated_analytic = await update_analytic_data(id, update_data)
@@ -118,7 +218,7 @@ async def upload_file(id: PydanticObjectId, file: UploadFile = File(...)):
         return {
             "status_code": 200,
             "response_type": "success",
-            "data": filename,
+            "data": update_data["origin_file"],
             "description": f"Successfully uploaded {file.filename}"
         }
     return {
@@ -128,25 +228,186 @@ async def upload_file(id: PydanticObjectId, file: UploadFile = File(...)):
         "data": False,
     }
 
+@router.post(
+    "/upload/initiate/{id}",
+    response_description="Multipart upload started",
+    response_model=Response,
+)
+async def initiate_upload(id: PydanticObjectId, req: InitiateUploadModel = Body(...)):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "Analytic with ID: {} not found".format(id),
+            "data": False,
+        }
+
+    current_timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+    filename = req.filename.replace(' ', '-')
+    filename = f"{current_timestamp}_{filename}"
+    bucket = S3_PRIVATE_BUCKET if req.private else S3_PUBLIC_BUCKET
+
+    params = {"Bucket": bucket, "Key": filename}
+    if req.content_type:
+        params["ContentType"] = req.content_type
+    upload = await S3_CLIENT.create_multipart_upload(**params)
+
+    update_data = dict(exclude_unset=True)
+    update_data["upload"] = {
+        "bucket": bucket,
+        "key": filename,
+        "uploadId": upload["UploadId"],
+        "filename": req.filename,
+    }
+    await update_analytic_data(id, update_data)
+
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": {"key": filename, "uploadId": upload["UploadId"], "partSize": settings.S3_UPLOAD_PART_SIZE},
+        "description": f"Started multipart upload for {req.filename}"
+    }
+
+@router.post(
+    "/upload/parts/{id}",
+    response_description="Presigned part URLs generated",
+    response_model=Response,
+)
+async def presign_upload_parts(id: PydanticObjectId, req: PresignPartsModel = Body(...)):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row or not analytic_row.upload:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "No upload in progress for {}".format(id),
+            "data": False,
+        }
+
+    upload = analytic_row.upload
+    urls = []
+    for part_number in req.part_numbers:
+        url = S3_CLIENT.sync.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": upload["bucket"],
+                "Key": upload["key"],
+                "UploadId": upload["uploadId"],
+                "PartNumber": part_number,
+            },
+            ExpiresIn=settings.S3_PRESIGNED_URL_EXPIRES,
+        )
+        urls.append({"PartNumber": part_number, "url": url})
+
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": urls,
+        "description": f"Generated {len(urls)} part URLs"
+    }
+
+@router.post(
+    "/upload/complete/{id}",
+    response_description="File uploaded successfully",
+    response_model=Response,
+)
+async def complete_upload(id: PydanticObjectId, req: CompleteUploadModel = Body(...)):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row or not analytic_row.upload:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "No upload in progress for {}".format(id),
+            "data": False,
+        }
+
+    upload = analytic_row.upload
+    parts = sorted([part.model_dump() for part in req.parts], key=lambda part: part["PartNumber"])
+    try:
+        await S3_CLIENT.complete_multipart_upload(
+            Bucket=upload["bucket"],
+            Key=upload["key"],
+            UploadId=upload["uploadId"],
+            MultipartUpload={"Parts": parts},
+        )
+        # re-read the assembled object in chunks for hashing and the assistant upload
+        file_data, file_hash, file_size = await S3_CLIENT.run(
+            spool_object,
+            S3_CLIENT.sync,
+            upload["bucket"],
+            upload["key"],
+            settings.S3_UPLOAD_PART_SIZE,
+            settings.UPLOAD_SPOOL_MAX_SIZE,
+        )
+    except Exception as e:
+        print(e)
+        return {
+            "status_code": 500,
+            "response_type": "error",
+            "data": f"There was an error completing the upload - {e}",
+            "description": "There was an error uploading the file"
+        }
+
+    try:
+        update_data = await register_upload(upload["bucket"], upload["key"], file_data, file_hash, file_size)
+    except Exception as e:
+        print(e)
+        return {
+            "status_code": 500,
+            "response_type": "error",
+            "data": 'file',
+            "description": "There was an error uploading the file"
+        }
+    finally:
+        file_data.close()
+    # update analytic data
+    update_data["upload"] = {}
+    update_data["status"] = 'uploaded'
+
+    updated_analytic = await update_analytic_data(id, update_data)
+
+    if updated_analytic:
+        return {
+            "status_code": 200,
+            "response_type": "success",
+            "data": update_data["origin_file"],
+            "description": f"Successfully uploaded {upload['filename']}"
+        }
+    return {
+        "status_code": 500,
+        "response_type": "error",
+        "description": "An error occurred while uploadding file for {}".format(id),
+        "data": False,
+    }
+
 async def handle_clean_file(id: PydanticObjectId):
 # retrieve analytic row
     analytic_row = await retrieve_analytic(id)
     
-    file_extension = os.path.splitext(analytic_row.origin_file)[1]
+    # spreadsheets reach the assistant already converted to csv
+    file_extension = os.path.splitext(analytic_row.normalized_file or analytic_row.origin_file)[1]
+    # every sheet of a workbook is attached, the one with the most rows is the dataset
+    converted = [sheet for sheet in analytic_row.sheets or [] if sheet.get("fileId")]
+    sheet_note = ""
+    if len(converted) > 1:
+        sheet_note = "The sheets of the uploaded workbook are attached as separate CSV files: {}. Clean {}, use the other sheets only as reference.".format(
+            ", ".join(f"{sheet['file']} (sheet {sheet['name']})" for sheet in converted), analytic_row.normalized_file
+        )
     threadId = analytic_row.threadId
     assistantId = analytic_row.assistantId
     cleaned_file=""
+    cleaned_artifact=None
     res_message=[]
     
     # run assistant api
-    message = client.beta.threads.messages.create(
+    message = await client.beta.threads.messages.create(
     thread_id=threadId,
     role="user",
     content=[
             {
                 "type": "text",
                 "text": f"""
-                            You're given an {file_extension} file. Please create .csv file based on that file for data analytics. Follow these steps:
+                            You're given an {file_extension} file. Please create .csv file based on that file for data analytics. {sheet_note} Follow these steps:
 
                             1. Load the {file_extension} file and create a new CSV file based on existing file.
                                 Examine the first few rows to identify proper column names. Note that the first line is often not the header, and column names may be found in the second or third line.
@@ -179,85 +440,86 @@ async def handle_clean_file(id: PydanticObjectId):
             # }
         ]
     )
-    while(1):
-        run = client.beta.threads.runs.create_and_poll(
-            thread_id=threadId,
-            assistant_id=assistantId,
-            instructions="Please answer the question is simpler english with an example."
-        )
+    run = await drive_run(
+        id,
+        threadId,
+        assistantId,
+        "Please answer the question is simpler english with an example.",
+        "cleaning",
+    )
 
-        if run.status == 'completed':
-            print("Run completed successfully. Processing messages.")
-            messages = client.beta.threads.messages.list(thread_id=run.thread_id, run_id=run.id)
-            for msg in messages.data:
-                if msg.role == "assistant":
-                    for content_item in msg.content: 
-                        if content_item.type == 'text':
-                            text_value = content_item.text.value
-                            res_message.insert(0, text_value)
-                            if content_item.text.annotations:
-                                for annotation in content_item.text.annotations:
-                                    if annotation.type == 'file_path':
-                                        file_id = annotation.file_path.file_id
-                                        print(f"Attempting to download file with ID: {file_id}")
-                                        file_data = client.files.content(file_id)
-                                        cleaned_file = file_id
-                                        file_path = S3_CLIENT.put_object(Bucket=S3_PUBLIC_BUCKET, Key=f"{file_id}.csv",  Body=file_data.read())
-                                        text_value += f"\nDownloaded CSV file: {file_path}"
-                            response = f"Assistant says: {text_value}"
-                            print(response)
-                        else:
-                            response = "Assistant says: Unhandled content type."
-                            print(response)
-                else:
-                    response = f"User says: {msg.content}"
-                    print(f"Processing user message: {response}")
-
-            update_data = dict(exclude_unset=True)
-            update_data["status"] = {
-                
-                "current": "cleaned",
-                "cleaned": {"status" : run.status, "message": ["Your file is successfully loaded and cleaned for data analytics and visualzation."], "description": res_message, "attachments": cleaned_file}
-            }
-            update_data["cleaned_file"] = cleaned_file
-            
-            updated_analytic = await update_analytic_data(id, update_data)
-            print("updated_analytic: ", updated_analytic)
-            break
-        elif run.status == 'incomplete':
-            print("=============run.status: ", run.status)
-            print("=============run: ", run)
-
-            # update_data = dict(exclude_unset=True)
-            # update_data["status"] = {
-            #     "current": "cleaned",
-            #     "cleaned": {"status" : run.status,"message": [f"Result: {run.status}"],"description": [f"Result: {run.status}"], "attachments": ""}
-            # }
-            # update_data["cleaned_file"] = ""
-            
-            # updated_analytic = await update_analytic_data(id, update_data)
-            # print("updated_analytic: ", updated_analytic)
-        else:
-            print("=============run.status: ", run.status)
-            print("=============run: ", run)
+    if run.status == 'completed':
+        print("Run completed successfully. Processing messages.")
+        messages = await client.beta.threads.messages.list(thread_id=run.thread_id, run_id=run.id)
+        for msg in messages.data:
+            if msg.role == "assistant":
+                for content_item in msg.content: 
+                    if content_item.type == 'text':
+                        text_value = content_item.text.value
+                        res_message.insert(0, text_value)
+                        if content_item.text.annotations:
+                            for annotation in content_item.text.annotations:
+                                if annotation.type == 'file_path':
+                                    file_id = annotation.file_path.file_id
+                                    print(f"Attempting to download file with ID: {file_id}")
+                                    cleaned_artifact = await transfer_openai_file(client, S3_CLIENT, file_id, S3_PUBLIC_BUCKET, f"{file_id}.csv", "text/csv", settings.S3_UPLOAD_PART_SIZE, object_encoding("cleaned"))
+                                    cleaned_file = file_id
+                                    text_value += f"\nDownloaded CSV file: {cleaned_artifact['key']}"
+                        response = f"Assistant says: {text_value}"
+                        print(response)
+                    else:
+                        response = "Assistant says: Unhandled content type."
+                        print(response)
+            else:
+                response = f"User says: {msg.content}"
+                print(f"Processing user message: {response}")
 
-            update_data = dict(exclude_unset=True)
-            update_data["status"] = {
-                "current": "cleaned",
-                "cleaned": {"status" : run.status,"message":  [f"Result: {run.status} \n {run.last_error.message}"],"description": [f"Result: {run.status} \n {run.last_error.message}"], "attachments": ""}
-            }
-            update_data["cleaned_file"] = ""
+        update_data = dict(exclude_unset=True)
+        update_data["status"] = {
             
-            updated_analytic = await update_analytic_data(id, update_data)
-            print("updated_analytic: ", updated_analytic)
-            break
+            "current": "cleaned",
+            "cleaned": {"status" : run.status, "message": ["Your file is successfully loaded and cleaned for data analytics and visualzation."], "description": res_message, "attachments": cleaned_file}
+        }
+        update_data["cleaned_file"] = cleaned_file
+        update_data["artifacts.cleaned"] = cleaned_artifact
+        if cleaned_file:
+            # columnar copy for the dataset readers, they rebuild it from the CSV if this fails
+            try:
+                update_data["artifacts.parquet"] = await S3_CLIENT.run(store_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, cleaned_file)
+                head = await S3_CLIENT.run(load_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, cleaned_file, rows=settings.PREVIEW_ROWS)
+                update_data["preview"] = build_preview(head)
+                update_data["profile"] = await S3_CLIENT.run(profile_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, cleaned_file)
+                # first dashboard views are served from these without touching the dataset
+                update_data["rollups"] = await S3_CLIENT.run(build_rollups, S3_CLIENT.sync, S3_PUBLIC_BUCKET, cleaned_file, update_data["profile"])
+            except Exception as e:
+                print("==== storing parquet dataset failed: ", e)
+        
+        updated_analytic = await update_analytic_data(id, update_data)
+        print("updated_analytic: ", updated_analytic)
+
+        # remember the result so identical uploads can skip the run
+        if cleaned_file:
+            await update_dataset_data(analytic_row.file_hash, {"cleaned_file": cleaned_file, "cleaned": update_data["status"]["cleaned"]})
+    else:
+        print("=============run.status: ", run.status)
+        print("=============run: ", run)
+
+        update_data = dict(exclude_unset=True)
+        update_data["status"] = {
+            "current": "cleaned",
+            "cleaned": {"status" : run.status,"message":  [f"Result: {run.status} \n {run_error(run)}"],"description": [f"Result: {run.status} \n {run_error(run)}"], "attachments": ""}
+        }
+        update_data["cleaned_file"] = ""
+        
+        updated_analytic = await update_analytic_data(id, update_data)
+        print("updated_analytic: ", updated_analytic)
 
 @router.post(
     "/clean_file/{id}",
     response_description="Your file is cleaned successfully",
     response_model=Response,
 )
-async def clean_file(id: PydanticObjectId, background_tasks:BackgroundTasks):
+async def clean_file(id: PydanticObjectId):
     
     update_data = dict(exclude_unset=True)
     update_data["status"] = {
@@ -265,11 +527,39 @@ async def clean_file(id: PydanticObjectId, background_tasks:BackgroundTasks):
         "cleaned": {"message": [], "attachments": ""}
     }
     update_data["cleaned_file"] = ""
+    update_data["preview"] = {}
+    update_data["profile"] = {}
+    update_data["rollups"] = []
+
+    # identical bytes were already cleaned, reuse the stored result
+    analytic_row = await retrieve_analytic(id)
+    dataset = await retrieve_dataset(analytic_row.file_hash) if analytic_row else None
+    if dataset and dataset.cleaned_file:
+        update_data["status"] = {"current": "cleaned", "cleaned": dataset.cleaned}
+        update_data["cleaned_file"] = dataset.cleaned_file
+        if analytic_row.threadId:
+            # the thread only holds the raw upload, later runs on it must analyse the cleaned file
+            await client.beta.threads.update(
+                analytic_row.threadId,
+                tool_resources={"code_interpreter": {"file_ids": dataset_file_ids(dataset.fileId, dataset.sheets) + [dataset.cleaned_file]}},
+            )
+            await client.beta.threads.messages.create(
+                thread_id=analytic_row.threadId,
+                role="user",
+                content=f"The file {dataset.cleaned_file} is the cleaned version of the dataset. Use it for every analysis.",
+            )
+        await update_analytic_data(id, update_data)
+        return {
+            "status_code": 200,
+            "response_type": "success",
+            "data": "Reused cleaned data",
+            "description": f"Reused cleaned data"
+        }
     
     updated_analytic = await update_analytic_data(id, update_data)
     print("updated_analytic: ", updated_analytic)
     
-    background_tasks.add_task(handle_clean_file, id)
+    await enqueue("clean_file", id)
     
     return {
         "status_code": 200,
@@ -284,9 +574,9 @@ async def handle_draw_insights(id: PydanticObjectId):
     assistantId = analytic_row.assistantId
     print(f"threadId: {threadId}, assistantId: {assistantId}")
     res_message=[]
-    insights_file=[]
+    pending_files=[]
     
-    message = client.beta.threads.messages.create(
+    message = await client.beta.threads.messages.create(
         thread_id=threadId,
         role="user",
         content=[
@@ -307,98 +597,98 @@ async def handle_draw_insights(id: PydanticObjectId):
                 },
             ]
     )
-    while(1):
-        print("~~~~While~~~~")
-        run = client.beta.threads.runs.create_and_poll(
-            thread_id=threadId,
-            assistant_id=assistantId,
-            instructions="Please answer the question is simpler english with an example."
-        )
+    run = await drive_run(
+        id,
+        threadId,
+        assistantId,
+        "Please answer the question is simpler english with an example.",
+        "insights",
+    )
 
-        if run.status == 'completed':
-            print("Run completed successfully. Processing messages.")
-            messages = client.beta.threads.messages.list(thread_id=run.thread_id, run_id=run.id)
-            for msg in messages.data:
-                if msg.role == "assistant":
-                    for content_item in msg.content:
-                        if content_item.type == 'text':
-                            text_value = content_item.text.value
-                            res_message.insert(0, text_value)
-                            if content_item.text.annotations:
-                                for annotation in content_item.text.annotations:
-                                    if annotation.type == 'file_path':
-                                        file_id = annotation.file_path.file_id
-                                        print(f"Attempting to download file with ID: {file_id}")
-                                        file_data = client.files.content(file_id)
-                                        image_file = f"{file_id}.png"
-                                        file_name = os.path.abspath( f"{file_id}.csv")
-                                        file_path = S3_CLIENT.put_object(Bucket=S3_PUBLIC_BUCKET, Key=image_file,  Body=file_data.read())
-                                        insights_file.insert(0, image_file)
-                                        text_value += f"\nDownloaded CSV file: {file_name}"
-                            response = f"Assistant says: {text_value}"
-                            print(response)
-                        # elif content_item.type == 'image_file':
-                        #     file_id = content_item.image_file.file_id
-                        #     print(f"Attempting to download image file with ID: {file_id}")
-                        #     file_data = client.files.content(file_id)
-                        #     image_file = f"{file_id}.png"
-                        #     if image_file not in insights_file:
-                        #         insights_file.insert(0, image_file)
-                        #         file_path = S3_CLIENT.put_object(Bucket=S3_PUBLIC_BUCKET, Key=image_file,  Body=file_data.read())
-                        #     response = f"Assistant says: Saved image file to {file_path}"
-                        #     print(response)
-                        else:
-                            response = "Assistant says: Unhandled content type."
-                            print(response)
-                else:
-                    response = f"User says: {msg.content}"
-                    print(f"Processing user message: {response}")
-
-            update_data = dict(exclude_unset=True)
-                    
-            _status = analytic_row.status
-            _status["current"] = "insights ready"
-            _status["message"] =  ["Insights are drawn based on your file"]
-            _status["description"] =  res_message
-            _status["insights"] =  insights_file
-            update_data["status"] = _status
-            
-            updated_analytic = await update_analytic_data(id, update_data)
-            print("updated_analytic: ", updated_analytic)
-            break
-        elif run.status == 'incomplete':
-            print("=============run.status: ", run.status)
-            print("=============run: ", run)
-            # update_data = dict(exclude_unset=True)
-            # _status = analytic_row.status
-            # _status["current"] = "insights ready"
-            # _status["message"] =  [f"Result: {run.status}"]
-            # _status["description"] =  [f"Result: {run.status}"]
-            # update_data["status"] = _status
-            
-            # updated_analytic = await update_analytic_data(id, update_data)
-            # print("updated_analytic: ", updated_analytic)
-        else:
-            print("=============run.status: ", run.status)
-            print("=============run.last_error.message: ", run.last_error.message)
-
-            update_data = dict(exclude_unset=True)
-            _status = analytic_row.status
-            _status["current"] = "insights ready"
-            _status["message"] = [f"Result: {run.status} \n {run.last_error.message}"]
-            _status["description"] = [f"Result: {run.status} \n {run.last_error.message}"]
-            update_data["status"] = _status
-            
-            updated_analytic = await update_analytic_data(id, update_data)
-            print("updated_analytic: ", updated_analytic)
-            break
+    if run.status == 'completed':
+        print("Run completed successfully. Processing messages.")
+        messages = await client.beta.threads.messages.list(thread_id=run.thread_id, run_id=run.id)
+        for msg in messages.data:
+            if msg.role == "assistant":
+                for content_item in msg.content:
+                    if content_item.type == 'text':
+                        text_value = content_item.text.value
+                        res_message.insert(0, text_value)
+                        if content_item.text.annotations:
+                            for annotation in content_item.text.annotations:
+                                if annotation.type == 'file_path':
+                                    file_id = annotation.file_path.file_id
+                                    print(f"Attempting to download file with ID: {file_id}")
+                                    content_type = mimetypes.guess_type(annotation.text)[0] or "image/png"
+                                    insight_file = f"{file_id}{mimetypes.guess_extension(content_type) or '.png'}"
+                                    pending_files.insert(0, (file_id, insight_file, content_type))
+                                    text_value += f"\nDownloaded file: {insight_file}"
+                        response = f"Assistant says: {text_value}"
+                        print(response)
+                    # elif content_item.type == 'image_file':
+                    #     file_id = content_item.image_file.file_id
+                    #     print(f"Attempting to download image file with ID: {file_id}")
+                    #     file_data = client.files.content(file_id)
+                    #     image_file = f"{file_id}.png"
+                    #     if image_file not in insights_file:
+                    #         insights_file.insert(0, image_file)
+                    #         file_path = S3_CLIENT.put_object(Bucket=S3_PUBLIC_BUCKET, Key=image_file,  Body=file_data.read())
+                    #     response = f"Assistant says: Saved image file to {file_path}"
+                    #     print(response)
+                    else:
+                        response = "Assistant says: Unhandled content type."
+                        print(response)
+            else:
+                response = f"User says: {msg.content}"
+                print(f"Processing user message: {response}")
+
+        # collect every file first, then transfer them concurrently
+        transfer_slots = asyncio.Semaphore(settings.TRANSFER_CONCURRENCY)
+
+        async def transfer(file_id, insight_file, content_type):
+            async with transfer_slots:
+                object_class = "image" if content_type.startswith("image/") else "cleaned"
+                return await transfer_openai_file(client, S3_CLIENT, file_id, S3_PUBLIC_BUCKET, insight_file, content_type, settings.S3_UPLOAD_PART_SIZE, object_encoding(object_class))
+
+        insights_artifacts = list(await asyncio.gather(*[transfer(*pending) for pending in pending_files]))
+        insights_file = [artifact["key"] for artifact in insights_artifacts if artifact["content_type"].startswith("image/")]
+
+        update_data = dict(exclude_unset=True)
+                
+        _status = analytic_row.status
+        _status["current"] = "insights ready"
+        _status["message"] =  ["Insights are drawn based on your file"]
+        _status["description"] =  res_message
+        _status["insights"] =  insights_file
+        update_data["status"] = _status
+        update_data["artifacts.insights"] = insights_artifacts
+        
+        updated_analytic = await update_analytic_data(id, update_data)
+        print("updated_analytic: ", updated_analytic)
+
+        # remember the result so identical uploads can skip the run
+        if insights_file:
+            await update_dataset_data(analytic_row.file_hash, {"insights": {"message": _status["message"], "description": res_message, "insights": insights_file}})
+    else:
+        print("=============run.status: ", run.status)
+        print("=============run_error(run): ", run_error(run))
+
+        update_data = dict(exclude_unset=True)
+        _status = analytic_row.status
+        _status["current"] = "insights ready"
+        _status["message"] = [f"Result: {run.status} \n {run_error(run)}"]
+        _status["description"] = [f"Result: {run.status} \n {run_error(run)}"]
+        update_data["status"] = _status
+        
+        updated_analytic = await update_analytic_data(id, update_data)
+        print("updated_analytic: ", updated_analytic)
 
 @router.post(
     "/draw_insights/{id}",
     response_description="load_data successfully",
     response_model=Response,
 )
-async def draw_insights(id: PydanticObjectId, background_tasks: BackgroundTasks):
+async def draw_insights(id: PydanticObjectId):
     analytic_row = await retrieve_analytic(id)
     update_data = dict(exclude_unset=True)
     _status = analytic_row.status
@@ -408,10 +698,23 @@ async def draw_insights(id: PydanticObjectId, background_tasks: BackgroundTasks)
         del _status["insights"]
     _status["current"] =  "cleaned"
     update_data["status"] = _status
+
+    # identical bytes already have insights, reuse the stored images
+    dataset = await retrieve_dataset(analytic_row.file_hash)
+    if dataset and dataset.insights:
+        _status["current"] = "insights ready"
+        _status.update(dataset.insights)
+        await update_analytic_data(id, update_data)
+        return {
+            "status_code": 200,
+            "response_type": "success",
+            "data": "Reused insights",
+            "description": f"Reused insights"
+        }
     
     await update_analytic_data(id, update_data)
     
-    background_tasks.add_task(handle_draw_insights, id)
+    await enqueue("draw_insights", id)
     
     return {
         "status_code": 200,
@@ -420,23 +723,45 @@ async def draw_insights(id: PydanticObjectId, background_tasks: BackgroundTasks)
         "description": f"Started to draw insights"
     }
 
+async def dataset_profile(analytic_row):
+    """
+    Returns the profile of a cleaned dataset, profiling rows cleaned before
+    profiles were stored once.
+    """
+    profile = analytic_row.profile
+    if not profile:
+        profile = await S3_CLIENT.run(profile_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+        await update_analytic_data(analytic_row.id, {"profile": profile})
+    return profile
+
+async def dataset_context(analytic_row):
+    """
+    Returns the token-budgeted profile of a cleaned dataset for prompts.
+    """
+    return profile_prompt(await dataset_profile(analytic_row))
+
 ##########################################
 @router.post(
     "/generate_queries/{id}",
     response_description="generate_queries successfully",
     response_model=Response,
 )
-async def generate_queries(id: PydanticObjectId):
+async def generate_queries(id: PydanticObjectId, refresh: bool = False):
     analytic_row = await retrieve_analytic(id)
 
-    product_sales_data = pd.read_csv(analytic_row.cleaned_file)
+    product_sales_data = await S3_CLIENT.run(load_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file, rows=5)
     headdata = product_sales_data.head()
     print("headdata ", headdata)
+    context = await dataset_context(analytic_row)
 
-    user_content = """
+    user_content = f"""
         Develop a Python method named generate_query that return query_data.
 
-        I have a dataset and the example look like :
+        I have a dataset with this profile:
+        ```
+        {context}
+        ```
+        and the example look like :
         ```
         {headdata}
         ```
@@ -446,23 +771,22 @@ async def generate_queries(id: PydanticObjectId):
         Finally return array value including 10 questions. example data looks like that:
         ```
         const query_data = [
-            {
+            {{
                 "question": "Draw a bar chart comparing the total number of items sold for the top 5 products by revenue.",
                 "Solution": "
                     Here will be the steps to implment the above question, not code.
                 "
-            }
+            }}
         ]
         ```
     """
-    current_chart = create_query(user_content)
-    print("Generated code for the current chart: ", current_chart)
-    # Make use of the generated method
-    query_data = generate_query()
+    # the generated generate_query method is run before its response is cached
+    query_data = await create_query(user_content, refresh=refresh)
     update_data = dict(exclude_unset=True)
-    update_data["header"] = headdata
+    update_data["header"] = ",".join(json.dumps(str(column)) for column in headdata.columns)
     update_data["queries"] = query_data
-    update_data["status"] = 'query ready'
+    # later jobs write status.* fields, status must stay a document
+    update_data["status"] = {"current": "query ready"}
     
     updated_analytic = await update_analytic_data(id, update_data)
 
@@ -480,91 +804,385 @@ async def generate_queries(id: PydanticObjectId):
         "data": False,
     }
 
-@router.post(
-    "/draw_graph/{id}",
-    response_description="draw_graphs successfully",
-    response_model=Response,
-)
-async def draw_graphs(id: PydanticObjectId):
-    analytic_row = await retrieve_analytic(id)
-    queries= analytic_row.queries
-    header= analytic_row.header
-    cleaned_file = pd.read_csv(analytic_row.cleaned_file)
+def chart_key(id, index):
+    return f"charts/{id}/{index}.png"
 
-    index = 0
-    round = 0
-    limit = 1
-    while(index < len(queries)):
-        query = queries[index]
+async def draw_spec_chart(question, solution, context, columns, cleaned_file, refresh=False):
+    """
+    Has the LLM describe the chart as a declarative spec and renders it locally.
 
-        print("==== query: ", query)
+    Returns:
+        tuple: The ChartSpec and the rendered chart.
+    """
+    user_content = f"""
+        Describe a chart answering this question about a dataset: ```{question}```.
+        Solution: ```{solution}```
+        The columns of the dataset are profiled here - ```{context}```.
+        Give the chart a clear and intuitive title and labeled axes, and pick a visually appealing theme and palette.
+        """
+    error = None
+    for attempt in range(settings.CHART_CODE_ATTEMPTS):
+        try:
+            # a retry must not get the cached spec that just failed
+            spec = await create_chart_spec(user_content, columns, refresh=refresh or attempt > 0)
+            path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, cleaned_file)
+            data = await run_in_threadpool(spec_data, path, spec)
+            chart = await run_in_threadpool(render_data, data, spec)
+            return spec, chart
+        except Exception as e:
+            error = e
+            print("==== chart spec failed: ", e)
+    raise error
 
-        if 'graph' in query:
-            index += 1
-            continue
-        
-        question = query['question']
-        solution = query['Solution']
+async def draw_query_graph(id, index, query, profile, cleaned_file, dataset_path, refresh=False):
+    """
+    Renders the chart of one query and persists it into `queries[index]`.
+    A declarative spec is tried first, generated plotting code is the fallback.
 
-        print("==== question: ", question)
-        print("==== solution: ", solution)
+    Returns:
+        bool: Whether the chart was drawn.
+    """
+    question = query['question']
+    solution = query['Solution']
+
+    print("==== question: ", question)
+    print("==== solution: ", solution)
+
+    context = profile_prompt(profile)
+    spec = None
+    chart = None
+    if settings.CHART_ENGINE == "spec":
+        try:
+            spec, chart = await draw_spec_chart(question, solution, context, [column["name"] for column in profile["columns"]], cleaned_file, refresh)
+        except Exception as e:
+            print("==== falling back to chart code: ", e)
 
-        user_content = f"""
+    user_content = f"""
         Develop a Python method named `generate_method` which accepts only a DataFrame as input. This method work following steps:
 
         1. Make a copy of the input DataFrame.
         2. Analyze the head of the DataFrame to understand the structure and content.
-        3. Extract all column names - ```{header}```.
+        3. The columns of the DataFrame are profiled here - ```{context}```.
         4.  ```{question}```.
             Solution: ```{solution}```
         6. Use the `seaborn` library to generate the heatmap and datetime to process date, time values.
 
-        7. Set the figure size to (12, 6) then save as then save as a file. File should be saved as ```static/{id}_{index}.png```. Then Just only return the filename, not filepath. 
+        7. Set the figure size to (12, 6) with matplotlib, do not save or show the chart, return the matplotlib Figure.
         8. Ensure the chart includes a clear and intuitive title, as well as labeled axes.
         9. Apply a visually appealing color scheme and a unique chart style.
 
         Please implement this method with the aforementioned specifications.
         """
-        subIndex = 0
-        while subIndex < 5:
-            subIndex += 1
-            try:
-                print("==== user_content", user_content)
-                current_chart = create_chart(user_content)
-                print("==== Generated code for the current chart: ", current_chart)
-                # Make use of the generated method
-                graph_path = generate_method(cleaned_file)
-                print("==== graph_path: ", graph_path)
-                
-                update_data = dict(exclude_unset=True)
-                update_data["status"] = "graph ready {index}"
-
-                update_query = dict(exclude_unset=True)
-                update_query["question"] = question
-                update_query["Solution"] = solution
-                update_query["graph"] = graph_path
-                _queries = queries
-                _queries[index] = update_query
-
-                update_data["queries"] = _queries
-                print("graph_path: ", update_data)
-
-                updated_analytic = await update_analytic_data(id, update_data)
-                print("==== updated_analytic: ", updated_analytic)
-                break
-            except Exception as e:
-                err = str(e)
-                print("==== Here error occured: ", err)
+    try:
+        if chart is None:
+            # code that already answered this question for the same columns is reused
+            chart = await chart_for_question(
+                user_content, question, schema_fingerprint(profile), dataset_path, refresh=refresh, attempts=settings.CHART_CODE_ATTEMPTS
+            )
+            if chart["error"]:
+                raise Exception(chart["error"])
+            print("==== Generated code for the current chart: ", chart["code"])
+        # rendered in memory and uploaded as is, charts never touch the local disk
+        graph_key = chart_key(id, index)
+        await S3_CLIENT.run(store_object, S3_CLIENT.sync, S3_PUBLIC_BUCKET, graph_key, chart["png"], "image", ContentType="image/png")
+        print("==== graph_key: ", graph_key)
 
-        round += 1 
-        if round == limit:
-            break
+        await update_analytic_query(id, index, {
+            "graph": graph_key,
+            "chart": {"key": graph_key, "content_type": "image/png", "size": len(chart["png"]), "width": chart["width"], "height": chart["height"]},
+            "spec": spec.model_dump(exclude_defaults=True) if spec else None,
+            "error": None,
+        }, inc={"graphs.done": 1})
+        return True
+    except Exception as e:
+        err = str(e)
+        print("==== Here error occured: ", err)
+        await update_analytic_query(id, index, {"error": err}, inc={"graphs.failed": 1})
+        return False
+
+async def handle_draw_graphs(id: PydanticObjectId, refresh: bool = False):
+    analytic_row = await retrieve_analytic(id)
+    queries = analytic_row.queries or []
+    pending = [index for index, query in enumerate(queries) if 'graph' not in query]
+    if not pending:
+        return
+
+    profile = await dataset_profile(analytic_row)
+    dataset_path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+
+    # status is replaced whole, rows saved before it was a document hold a plain string
+    # that the status.* writes of every drawn query could not update
+    status = analytic_row.status if isinstance(analytic_row.status, dict) else {}
+    await update_analytic_data(id, {"status": {
+        **status,
+        "current": "drawing graphs",
+        "graphs": {"total": len(pending), "done": 0, "failed": 0},
+    }})
+
+    slots = asyncio.Semaphore(settings.GRAPH_CONCURRENCY)
+
+    async def draw(index):
+        async with slots:
+            return await draw_query_graph(id, index, queries[index], profile, analytic_row.cleaned_file, dataset_path, refresh)
+
+    drawn = await asyncio.gather(*[draw(index) for index in pending])
+    failed = drawn.count(False)
+    await update_analytic_data(id, {"status.current": "graph ready"})
+
+    # drawn charts are kept, a retry of the job only draws the failed ones
+    if failed:
+        raise Exception(f"{failed} of {len(pending)} graphs failed")
+
+@router.post(
+    "/draw_graph/{id}",
+    response_description="draw_graphs successfully",
+    response_model=Response,
+)
+async def draw_graphs(id: PydanticObjectId, refresh: bool = False):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. Analytic with ID: {} not found".format(id),
+            "data": False,
+        }
+
+    job = await enqueue("draw_graphs", id, {"refresh": True} if refresh else None)
+
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": {"jobId": str(job.id)},
+        "description": f"Started to draw graphs"
+    }
+
+@router.get("/chart/{id}/{index}",
+            response_description="Chart re-rendered from its spec",
+)
+async def render_chart(id: PydanticObjectId, index: int, width: float = None, height: float = None, theme: str = None, dpi: int = None):
+    analytic_row = await retrieve_analytic(id)
+    queries = analytic_row.queries if analytic_row else None
+    if not queries or not 0 <= index < len(queries) or not queries[index].get("spec"):
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. No chart spec for query {} of {}".format(index, id),
+            "data": False,
+        }
+
+    spec = ChartSpec.model_validate(queries[index]["spec"])
+    if theme:
+        spec.style.theme = theme
+    try:
+        validate_spec(spec, spec_columns(spec))
+        # only the columns the chart reads are loaded from the parquet copy, in chunks for large datasets
+        path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+        data = await run_in_threadpool(spec_data, path, spec)
+        chart = await run_in_threadpool(render_data, data, spec, width=width, height=height, dpi=dpi)
+    except ValueError as e:
+        return {
+            "status_code": 400,
+            "response_type": "error",
+            "description": str(e),
+            "data": False,
+        }
+    return BinaryResponse(content=chart["png"], media_type="image/png")
+
+@router.post("/{id}/aggregate",
+            response_description="Aggregated dataset",
+            response_model=Response,
+)
+async def aggregate_dataset(id: PydanticObjectId, query: AggregateModel = Body(...)):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row or not analytic_row.cleaned_file:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. No cleaned dataset for {}".format(id),
+            "data": False,
+        }
+
+    key = query_key(analytic_row.cleaned_file, query)
+    result = aggregate_cache.get(key)
+    source = "cache"
+    if result is None:
+        rollup = next((rollup for rollup in analytic_row.rollups or [] if rollup["key"] == key), None)
+        result = rollup["result"] if rollup else None
+        source = "rollup"
+    if result is None:
+        profile = await dataset_profile(analytic_row)
+        try:
+            validate_query(query, [column["name"] for column in profile["columns"]], numeric_columns(profile))
+            # only the columns the query reads are loaded from the parquet copy, in chunks for large datasets
+            path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+            result = await run_in_threadpool(aggregate_file, path, query)
+        except (ValueError, TypeError) as e:
+            # TypeError covers what the profile cannot tell, like min of an unordered categorical
+            return {
+                "status_code": 400,
+                "response_type": "error",
+                "description": str(e),
+                "data": False,
+            }
+        source = "computed"
+    aggregate_cache.set(key, result)
+
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": result,
+        "description": source
+    }
+
+@router.get("/{id}/rollups",
+            response_description="Precomputed rollups",
+            response_model=Response,
+)
+async def list_rollups(id: PydanticObjectId):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. Analytic with ID: {} not found".format(id),
+            "data": False,
+        }
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": [rollup["query"] for rollup in analytic_row.rollups or []],
+        "description": "Queries answered from precomputed rollups"
+    }
+
+@router.get("/{id}/series",
+            response_description="Downsampled time series",
+            response_model=Response,
+)
+async def time_series(id: PydanticObjectId, date: str, values: List[str] = Query(...), points: int = 1000):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row or not analytic_row.cleaned_file:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. No cleaned dataset for {}".format(id),
+            "data": False,
+        }
+    if not 3 <= points <= settings.SERIES_MAX_POINTS:
+        return {
+            "status_code": 400,
+            "response_type": "error",
+            "description": "points must be between 3 and {}".format(settings.SERIES_MAX_POINTS),
+            "data": False,
+        }
+
+    key = series_key(analytic_row.cleaned_file, date, values, points)
+    result = series_cache.get(key)
+    source = "cache"
+    if result is None:
+        profile = await dataset_profile(analytic_row)
+        columns = [column["name"] for column in profile["columns"]]
+        missing = [column for column in [date, *values] if column not in columns]
+        if missing:
+            return {
+                "status_code": 400,
+                "response_type": "error",
+                "description": "unknown columns: {}".format(", ".join(missing)),
+                "data": False,
+            }
+        # only the date and value columns are read, in chunks for large datasets
+        path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+        result = await run_in_threadpool(series_file, path, date, values, points)
+        series_cache.set(key, result)
+        source = "computed"
 
     return {
-        "status_code": 400,
+        "status_code": 200,
+        "response_type": "success",
+        "data": result,
+        "description": source
+    }
+
+@router.get("/{id}/rows",
+            response_description="Rows of the cleaned dataset",
+)
+async def dataset_rows(
+    id: PydanticObjectId,
+    cursor: str = None,
+    limit: int = 1000,
+    columns: List[str] = Query(None),
+    filters: str = None,
+    format: str = "ndjson",
+):
+    analytic_row = await retrieve_analytic(id)
+    if not analytic_row or not analytic_row.cleaned_file:
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred. No cleaned dataset for {}".format(id),
+            "data": False,
+        }
+    try:
+        if format not in MEDIA_TYPES:
+            raise ValueError("format must be one of {}".format(", ".join(MEDIA_TYPES)))
+        if not 1 <= limit <= settings.ROWS_PAGE_LIMIT:
+            raise ValueError("limit must be between 1 and {}".format(settings.ROWS_PAGE_LIMIT))
+        start = decode_cursor(cursor, analytic_row.cleaned_file)
+        # filters come as a JSON list of {column, op, value}
+        conditions = [ChartFilter.model_validate(item) for item in json.loads(filters)] if filters else []
+        path = await S3_CLIENT.run(ensure_dataset, S3_CLIENT.sync, S3_PUBLIC_BUCKET, analytic_row.cleaned_file)
+        names = pq.read_schema(path).names
+        missing = [column for column in (columns or []) + [condition.column for condition in conditions] if column not in names]
+        if missing:
+            raise ValueError("unknown columns: {}".format(", ".join(missing)))
+        end = await run_in_threadpool(page_end, path, start, limit, conditions)
+    except ValueError as e:
+        return {
+            "status_code": 400,
+            "response_type": "error",
+            "description": str(e),
+            "data": False,
+        }
+
+    headers = {"X-Total-Rows": str(pq.read_metadata(path).num_rows)}
+    if end < int(headers["X-Total-Rows"]):
+        headers["X-Next-Cursor"] = encode_cursor(analytic_row.cleaned_file, end)
+    return StreamingResponse(
+        stream_rows(path, start, end, columns, conditions, format),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+@router.get("/jobs/{job_id}",
+            response_description="Background job state",
+            response_model=Response,
+)
+async def job_status(job_id: PydanticObjectId):
+    job = await retrieve_job(job_id)
+    if job:
+        return {
+            "status_code": 200,
+            "response_type": "success",
+            "data": {"jobId": str(job.id), "kind": job.kind, "state": job.state, "attempts": job.attempts, "error": job.error},
+            "description": f"Job is {job.state}"
+        }
+    return {
+        "status_code": 404,
         "response_type": "error",
-        "data": 'file',
-        "description": "There was an error uploading the file"
+        "description": "An error occurred. Job with ID: {} not found".format(job_id),
+        "data": False,
+    }
+
+@router.get("/llm_cache/stats",
+            response_description="LLM response cache counters",
+            response_model=Response,
+)
+async def llm_cache_stats():
+    return {
+        "status_code": 200,
+        "response_type": "success",
+        "data": llm_cache.stats.as_dict(),
+        "description": "LLM response cache counters since the process started"
     }
 
 @router.get("/check_status/{id}",
@@ -572,12 +1190,23 @@ async def draw_graphs(id: PydanticObjectId):
             response_model=Response,
 )
 async def check_status(id: PydanticObjectId):
-    analytic_row = await retrieve_analytic(id)
-    status = analytic_row.status
+    analytic_row = await retrieve_analytic_status(id)
+    status = analytic_row.status if analytic_row else None
     headdata = None
-    if analytic_row.cleaned_file:
-        product_sales_data = pd.read_csv(f"https://theorekabucket.s3.eu-north-1.amazonaws.com/{analytic_row.cleaned_file}.csv")
-        headdata = product_sales_data.head().to_dict(orient="records")
+    if status and analytic_row.cleaned_file:
+        preview = analytic_row.preview
+        if not preview:
+            # cleaned before previews were stored, rebuild it once from the head of the csv
+            preview = await S3_CLIENT.run(
+                read_csv_preview,
+                S3_CLIENT.sync,
+                S3_PUBLIC_BUCKET,
+                analytic_row.cleaned_file,
+                settings.PREVIEW_ROWS,
+                settings.PREVIEW_RANGE_BYTES,
+            )
+            await update_analytic_data(id, {"preview": preview})
+        headdata = preview_records(preview)
     if status:
          return {
             "status_code": 200,
@@ -590,4 +1219,68 @@ async def check_status(id: PydanticObjectId):
         "response_type": "error",
         "description": "An error occurred while getting status for {}".format(id),
         "data": "An error occurred while getting status for {}".format(id),
-    }
\ No newline at end of file
+    }
+
+async def status_updates(id: PydanticObjectId):
+    """
+    Yields the current status of an analytic row, then every status written
+    after it. Yields None every `EVENTS_KEEPALIVE` seconds without updates.
+    """
+    # subscribe before reading so no transition slips in between
+    async with broker.subscribe(str(id)) as queue:
+        analytic_row = await retrieve_analytic_status(id)
+        last = analytic_row.status if analytic_row else None
+        yield last
+        while True:
+            try:
+                status = await asyncio.wait_for(queue.get(), settings.EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if status != last:
+                last = status
+                yield status
+
+
+async def sse_events(id: PydanticObjectId, request: Request):
+    async for status in status_updates(id):
+        if await request.is_disconnected():
+            break
+        if status is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: status\ndata: {json.dumps(jsonable_encoder(status))}\n\n"
+
+
+@router.get("/events/{id}",
+            response_description="Server-Sent Events stream of status updates",
+)
+async def status_events(id: PydanticObjectId, request: Request):
+    if not await retrieve_analytic_status(id):
+        return {
+            "status_code": 404,
+            "response_type": "error",
+            "description": "An error occurred while getting status for {}".format(id),
+            "data": "An error occurred while getting status for {}".format(id),
+        }
+    return StreamingResponse(
+        sse_events(id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/events/{id}")
+async def status_events_socket(websocket: WebSocket, id: PydanticObjectId):
+    if not await retrieve_analytic_status(id):
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    try:
+        async for status in status_updates(id):
+            if status is None:
+                await websocket.send_json({"event": "keepalive"})
+            else:
+                await websocket.send_json({"event": "status", "data": jsonable_encoder(status)})
+    except WebSocketDisconnect:
+        pass
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Any
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, Any, List, Literal
+
+from schemas.chart_spec import ChartFilter
 
 class UpdateAnalyticModel(BaseModel):
 
@@ -8,8 +10,17 @@ class UpdateAnalyticModel(BaseModel):
     assistantId: Optional[str]
     origin_file: Optional[str]
     file: Optional[Any]
+    file_hash: Optional[str]
+    file_size: Optional[int]
+    normalized_file: Optional[str]
+    sheets: Optional[Any]
+    upload: Optional[Any]
     cleaned_file: Optional[str]
+    artifacts: Optional[Any]
     header: Optional[Any]
+    preview: Optional[Any]
+    profile: Optional[Any]
+    rollups: Optional[Any]
     queries: Optional[Any]
     status: Optional[Any]
 
@@ -25,6 +36,84 @@ class UpdateAnalyticModel(BaseModel):
             }
         }
 
+class InitiateUploadModel(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    private: bool = False
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "filename": "product_sales_dataset.xlsx",
+                "content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                "private": False,
+            }
+        }
+
+class PresignPartsModel(BaseModel):
+    part_numbers: List[int]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "part_numbers": [1, 2, 3],
+            }
+        }
+
+class UploadedPartModel(BaseModel):
+    PartNumber: int
+    ETag: str
+
+class CompleteUploadModel(BaseModel):
+    parts: List[UploadedPartModel]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "parts": [
+                    {"PartNumber": 1, "ETag": '"7778aef83f66abc1fa1e8477f296d394"'},
+                    {"PartNumber": 2, "ETag": '"8f6a7b1c3a6d1e0f6e4b6c1d2f3a4b5c"'},
+                ],
+            }
+        }
+
+class MeasureModel(BaseModel):
+    op: Literal["sum", "mean", "median", "count", "nunique", "min", "max", "quantile"]
+    column: Optional[str] = None
+    q: Optional[float] = Field(default=None, ge=0, le=1)
+    alias: Optional[str] = None
+
+class TimeBucketModel(BaseModel):
+    column: str
+    unit: Literal["day", "week", "month", "quarter", "year"]
+
+class SortModel(BaseModel):
+    by: str
+    order: Literal["asc", "desc"] = "desc"
+
+class AggregateModel(BaseModel):
+    group_by: List[str] = []
+    measures: List[MeasureModel] = [MeasureModel(op="count")]
+    filters: List[ChartFilter] = []
+    time_bucket: Optional[TimeBucketModel] = None
+    sort: Optional[SortModel] = None
+    limit: Optional[int] = Field(default=None, gt=0)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "group_by": ["Product_Category"],
+                "measures": [
+                    {"op": "sum", "column": "Items_Sold"},
+                    {"op": "quantile", "column": "Product_Price", "q": 0.9, "alias": "p90_price"},
+                ],
+                "filters": [{"column": "Product_Cost", "op": ">", "value": 10}],
+                "time_bucket": {"column": "Date", "unit": "month"},
+                "sort": {"by": "sum_Items_Sold", "order": "desc"},
+                "limit": 100,
+            }
+        }
+
 class Response(BaseModel):
     status_code: int
     response_type: str
@@ -0,0 +1,47 @@
+from pydantic import BaseModel
+from typing import Optional, Any, List, Literal
+
+class ChartFilter(BaseModel):
+    column: str
+    op: Literal["==", "!=", ">", ">=", "<", "<=", "in", "not in", "between", "contains"]
+    value: Any
+
+class ChartStyle(BaseModel):
+    theme: str = "default"
+    palette: Optional[str] = None
+    stacked: bool = False
+    horizontal: bool = False
+    width: float = 12
+    height: float = 6
+    dpi: int = 100
+
+class ChartSpec(BaseModel):
+    type: Literal["bar", "line", "area", "scatter", "pie", "hist", "box", "heatmap"]
+    x: Optional[str] = None
+    y: Optional[str] = None
+    group: Optional[str] = None
+    agg: Literal["sum", "mean", "median", "min", "max", "count", "nunique"] = "sum"
+    time_unit: Optional[Literal["day", "week", "month", "quarter", "year"]] = None
+    filters: List[ChartFilter] = []
+    sort: Optional[Literal["asc", "desc"]] = None
+    limit: Optional[int] = None
+    bins: int = 20
+    title: Optional[str] = None
+    x_label: Optional[str] = None
+    y_label: Optional[str] = None
+    style: ChartStyle = ChartStyle()
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "type": "bar",
+                "x": "Product_Category",
+                "y": "Items_Sold",
+                "agg": "sum",
+                "filters": [{"column": "Date", "op": ">=", "value": "2024-01-01"}],
+                "sort": "desc",
+                "limit": 5,
+                "title": "Items sold by category",
+                "style": {"theme": "ggplot", "palette": "viridis"},
+            }
+        }
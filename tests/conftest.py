@@ -1,12 +1,26 @@
 """Tests fixtures."""
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
 from beanie import init_beanie
+import boto3
 import pytest
 from asgi_lifespan import LifespanManager
 from httpx import AsyncClient
 
+os.environ.setdefault("APIKEY", "test")
+os.environ.setdefault("THREAD_POOL_SIZE", "0")
+os.environ.setdefault("CHART_PREWARM", "false")
+os.environ.setdefault("DATASET_CACHE_DIR", tempfile.mkdtemp())
+
 from app import app
 from mongomock_motor import AsyncMongoMockClient
+from moto import mock_aws
+from openai.types import FileObject
 from config.config import initiate_database
+from analytic.clients import AsyncS3
 
 import models as models
 from app import app, token_listener
@@ -21,6 +35,64 @@ async def mock_database():
     )
 
 
+class FakeRunStream:
+    """
+    Stand-in for the event stream returned by `runs.create(stream=True)`.
+    """
+
+    def __init__(self, events, delay=0):
+        self.events = events
+        self.delay = delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def __aiter__(self):
+        for event, data in self.events:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(event=event, data=data)
+
+
+class FakeFileResponse:
+    """
+    Stand-in for `files.with_streaming_response.content(...)`.
+    """
+
+    def __init__(self, data, chunk_size=4):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def iter_bytes(self, chunk_size=None):
+        for start in range(0, len(self.data), self.chunk_size):
+            yield self.data[start:start + self.chunk_size]
+
+
+def run_events(thread_id, status="completed", text="done", last_error=None):
+    """
+    Events of a run that creates one step and one message, then ends in `status`.
+    """
+    run = SimpleNamespace(id=f"run-{thread_id}", thread_id=thread_id, status=status, last_error=last_error, incomplete_details=None)
+    step = SimpleNamespace(id="step-1", type="message_creation", status="completed")
+    delta = SimpleNamespace(id="msg-1", delta=SimpleNamespace(content=[
+        SimpleNamespace(type="text", text=SimpleNamespace(value=text)),
+    ]))
+    return [
+        ("thread.run.created", SimpleNamespace(**{**run.__dict__, "status": "queued"})),
+        ("thread.run.step.created", step),
+        ("thread.message.delta", delta),
+        (f"thread.run.{status}", run),
+    ]
+
+
 def mock_no_authentication():
     app.dependency_overrides[token_listener] = lambda: {}
 
@@ -32,7 +104,7 @@ async def client_test(mocker):
     :return: yield HTTP client.
     """
 
-    mocker.patch("config.config.initiate_database", return_value=await mock_database())
+    mocker.patch("app.initiate_database", return_value=await mock_database())
 
     async with LifespanManager(app):
         async with AsyncClient(
@@ -44,3 +116,37 @@ async def client_test(mocker):
 @pytest.fixture
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture
+def mock_s3(mocker):
+    """
+    Patch the analytic routes with a moto backed S3 client and bucket.
+    :return: yield S3 client.
+    """
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="test-public-bucket")
+        mocker.patch("routes.analytic.S3_CLIENT", AsyncS3(s3, max_workers=4))
+        mocker.patch("routes.analytic.S3_PUBLIC_BUCKET", "test-public-bucket")
+        yield s3
+
+
+@pytest.fixture
+def mock_openai(mocker):
+    """
+    Patch the analytic routes with a mocked OpenAI client.
+    :return: mocked client.
+    """
+    openai_client = mocker.patch("routes.analytic.client", new=mocker.AsyncMock())
+    openai_client.files.create.return_value = FileObject(
+        id="file-1", bytes=0, created_at=0, filename="data.csv", object="file", purpose="assistants", status="processed"
+    )
+    openai_client.beta.assistants.create.return_value = SimpleNamespace(id="asst-1")
+    openai_client.beta.threads.create.return_value = SimpleNamespace(id="thread-1")
+    openai_client.files.with_streaming_response.content = mocker.MagicMock(
+        side_effect=lambda file_id: FakeFileResponse(b"a,b\n1,2\n")
+    )
+    mocker.patch("analytic.assistants.client", openai_client)
+    mocker.patch("analytic.runs.client", openai_client)
+    return openai_client
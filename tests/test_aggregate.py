@@ -0,0 +1,153 @@
+import io
+
+import pandas as pd
+import pytest
+from httpx import AsyncClient
+
+from analytic import aggregate, dataset_store
+from analytic.profiler import profile_frame
+from models.analytic import Analytic
+from schemas.analytic import AggregateModel
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+CSV = (
+    "Date,Product_Category,Product_Cost,Items_Sold\n"
+    "2024-01-01,Books,10.5,3\n"
+    "2024-01-20,Games,12.25,1\n"
+    "2024-02-03,Books,30.0,7\n"
+    "2024-02-04,Toys,8.75,2\n"
+)
+
+
+@pytest.fixture
+def frame():
+    return pd.read_csv(io.StringIO(CSV))
+
+
+@pytest.fixture
+def dataset(mock_s3, tmp_path, mocker):
+    mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+    mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=CSV.encode())
+    return "file-1"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    aggregate.aggregate_cache.clear()
+
+
+class TestRunAggregate:
+    def test_measures_per_month_and_category(self, frame):
+        query = AggregateModel(
+            group_by=["Date", "Product_Category"],
+            time_bucket={"column": "Date", "unit": "month"},
+            measures=[{"op": "count"}, {"op": "sum", "column": "Items_Sold"}, {"op": "quantile", "column": "Product_Cost", "q": 0.5}],
+        )
+
+        result = aggregate.run_aggregate(frame, query)
+
+        assert result["columns"] == ["Date", "Product_Category", "count", "sum_Items_Sold", "p50_Product_Cost"]
+        assert result["rows"] == [
+            ["2024-01-01T00:00:00.000", "Books", 1, 3, 10.5],
+            ["2024-01-01T00:00:00.000", "Games", 1, 1, 12.25],
+            ["2024-02-01T00:00:00.000", "Books", 1, 7, 30.0],
+            ["2024-02-01T00:00:00.000", "Toys", 1, 2, 8.75],
+        ]
+
+    def test_filters_sort_and_limit(self, frame):
+        query = AggregateModel(
+            group_by=["Product_Category"],
+            measures=[{"op": "mean", "column": "Product_Cost", "alias": "cost"}],
+            filters=[{"column": "Items_Sold", "op": ">", "value": 1}],
+            sort={"by": "cost", "order": "desc"},
+            limit=1,
+        )
+
+        result = aggregate.run_aggregate(frame, query)
+
+        assert result == {"columns": ["Product_Category", "cost"], "rows": [["Books", 20.25]], "truncated": True}
+
+    def test_totals_without_group_by(self, frame):
+        query = AggregateModel(measures=[{"op": "count"}, {"op": "max", "column": "Items_Sold"}])
+
+        assert aggregate.run_aggregate(frame, query)["rows"] == [[4, 7]]
+
+    def test_validate_rejects_bad_queries(self):
+        columns = ["Date", "Items_Sold"]
+
+        with pytest.raises(ValueError, match="unknown columns: Revenue"):
+            aggregate.validate_query(AggregateModel(measures=[{"op": "sum", "column": "Revenue"}]), columns)
+        with pytest.raises(ValueError, match="quantile needs q"):
+            aggregate.validate_query(AggregateModel(measures=[{"op": "quantile", "column": "Items_Sold"}]), columns)
+        with pytest.raises(ValueError, match="cannot sort by"):
+            aggregate.validate_query(AggregateModel(sort={"by": "Items_Sold"}), columns)
+        with pytest.raises(ValueError, match="mean needs a numeric column, Date is not"):
+            aggregate.validate_query(AggregateModel(measures=[{"op": "mean", "column": "Date"}]), columns, ["Items_Sold"])
+        aggregate.validate_query(AggregateModel(measures=[{"op": "max", "column": "Date"}]), columns, ["Items_Sold"])
+
+    def test_default_rollups_cover_dates_and_categories(self, frame):
+        profile = profile_frame(frame.assign(Date=pd.to_datetime(frame["Date"])))
+
+        queries = aggregate.default_rollups(profile)
+
+        assert [query.group_by for query in queries] == [["Date"], ["Product_Category"]]
+        assert queries[0].time_bucket.unit == "month"
+        assert {"op": "sum", "column": "Items_Sold"} in [measure.model_dump(exclude_none=True) for measure in queries[1].measures]
+
+
+class TestAggregateRoute:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_computed_then_cached(self, client_test: AsyncClient, dataset, mocker):
+        analytic = await Analytic(aId="a1", cleaned_file=dataset).create()
+        body = {"group_by": ["Product_Category"], "measures": [{"op": "sum", "column": "Items_Sold"}]}
+
+        first = (await client_test.post(f"analytic/{analytic.id}/aggregate", json=body)).json()
+        second = (await client_test.post(f"analytic/{analytic.id}/aggregate", json=body)).json()
+
+        assert first["description"] == "computed"
+        assert first["data"]["rows"] == [["Books", 10], ["Games", 1], ["Toys", 2]]
+        assert second["description"] == "cache"
+        assert second["data"] == first["data"]
+
+    @pytest.mark.anyio
+    async def test_served_from_rollup(self, client_test: AsyncClient, mocker):
+        query = AggregateModel(group_by=["Product_Category"])
+        result = {"columns": ["Product_Category", "count"], "rows": [["Books", 2]], "truncated": False}
+        analytic = await Analytic(aId="a1", cleaned_file="file-1", rollups=[
+            {"key": aggregate.query_key("file-1", query), "query": query.model_dump(mode="json"), "result": result},
+        ]).create()
+        load_dataset = mocker.patch("routes.analytic.load_dataset")
+
+        response = (await client_test.post(f"analytic/{analytic.id}/aggregate", json={"group_by": ["Product_Category"]})).json()
+
+        load_dataset.assert_not_called()
+        assert response["description"] == "rollup"
+        assert response["data"] == result
+
+    @pytest.mark.anyio
+    async def test_invalid_query_is_rejected(self, client_test: AsyncClient, dataset):
+        analytic = await Analytic(aId="a1", cleaned_file=dataset).create()
+
+        response = await client_test.post(f"analytic/{analytic.id}/aggregate", json={"measures": [{"op": "sum", "column": "Revenue"}]})
+
+        assert response.json()["status_code"] == 400
+
+    @pytest.mark.anyio
+    async def test_numeric_measures_on_text_are_rejected(self, client_test: AsyncClient, dataset, mocker):
+        analytic = await Analytic(aId="a1", cleaned_file=dataset).create()
+
+        for measure in [{"op": "sum", "column": "Product_Category"}, {"op": "quantile", "column": "Date", "q": 0.5}]:
+            response = await client_test.post(f"analytic/{analytic.id}/aggregate", json={"measures": [measure]})
+
+            assert response.json()["status_code"] == 400
+
+        # dtype errors the profile cannot predict still end as a bad request
+        mocker.patch("routes.analytic.aggregate_file", side_effect=TypeError("Categorical is not ordered"))
+        response = await client_test.post(f"analytic/{analytic.id}/aggregate", json={"measures": [{"op": "min", "column": "Product_Category"}]})
+
+        assert response.json() == {"status_code": 400, "response_type": "error", "description": "Categorical is not ordered", "data": False}
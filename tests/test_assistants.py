@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+from analytic import assistants
+from models.assistant import Assistant, PooledThread
+
+
+class TestAssistantRegistry:
+    @pytest.mark.anyio
+    async def test_assistant_created_once_per_config(self, client_test: AsyncClient, mock_openai):
+        assistants._assistant_ids.clear()
+        await assistants.get_assistant_id()
+        # a fresh process only has the Mongo registry to go on
+        assistants._assistant_ids.clear()
+        assistant_id = await assistants.get_assistant_id()
+
+        assert assistant_id == "asst-1"
+        assert mock_openai.beta.assistants.create.call_count == 1
+        assert await Assistant.count() == 1
+
+    @pytest.mark.anyio
+    async def test_claim_pooled_thread(self, client_test: AsyncClient, mock_openai, mocker):
+        mocker.patch.object(assistants.settings, "THREAD_POOL_SIZE", 2)
+        mock_openai.beta.threads.create.side_effect = [SimpleNamespace(id="thread-a"), SimpleNamespace(id="thread-b")]
+
+        assert await assistants.refill_thread_pool() == 2
+        assert await assistants.refill_thread_pool() == 0
+
+        thread_id = await assistants.claim_thread(["file-1"])
+
+        assert thread_id == "thread-a"
+        assert await PooledThread.count() == 1
+        mock_openai.beta.threads.update.assert_called_once_with(
+            "thread-a", tool_resources={"code_interpreter": {"file_ids": ["file-1"]}}
+        )
+
+    @pytest.mark.anyio
+    async def test_claim_empty_pool_creates_thread(self, client_test: AsyncClient, mock_openai):
+        thread_id = await assistants.claim_thread(["file-1"])
+
+        assert thread_id == "thread-1"
+        mock_openai.beta.threads.create.assert_called_once_with(
+            tool_resources={"code_interpreter": {"file_ids": ["file-1"]}}
+        )
@@ -0,0 +1,69 @@
+import pytest
+from httpx import AsyncClient
+
+from analytic import chart_cache
+from models.chart_code import ChartCode
+
+GOOD = "def generate_method(df):\n    return df\n"
+BAD = "def generate_method(df):\n    return df['missing']\n"
+PROFILE = {"rows": 3, "columns": [
+    {"name": "Date", "dtype": "category", "dates": ["2024-01-01", "2024-01-03"]},
+    {"name": "Items_Sold", "dtype": "uint8"},
+]}
+
+
+@pytest.fixture
+def render(mocker):
+    async def render(code, name, dataset_path):
+        if "missing" in code:
+            return {"png": None, "error": "KeyError: 'missing'", "output": ""}
+        return {"png": b"png", "width": 1, "height": 1, "error": None, "output": ""}
+
+    return mocker.patch.object(chart_cache.chart_pool, "render", side_effect=render)
+
+
+class TestChartCache:
+    def test_fingerprint_ignores_narrow_dtypes_and_order(self):
+        other = {"rows": 9, "columns": [
+            {"name": " items_sold", "dtype": "int64"},
+            {"name": "date", "dtype": "object", "dates": ["2023-01-01", "2023-02-01"]},
+        ]}
+
+        assert chart_cache.schema_fingerprint(PROFILE) == chart_cache.schema_fingerprint(other)
+        assert chart_cache.schema_fingerprint(PROFILE) != chart_cache.schema_fingerprint({"columns": PROFILE["columns"][:1]})
+
+    def test_validate_chart_code(self):
+        assert chart_cache.validate_chart_code(GOOD, "generate_method") is None
+        assert chart_cache.validate_chart_code("def other(df):\n    pass\n", "generate_method") == "generate_method is not defined"
+        assert chart_cache.validate_chart_code("def generate_method(df:\n", "generate_method").startswith("SyntaxError")
+
+    @pytest.mark.anyio
+    async def test_working_code_is_reused(self, client_test: AsyncClient, render, mocker):
+        create_chart = mocker.patch("analytic.chart_cache.create_chart", side_effect=[BAD, GOOD])
+        fingerprint = chart_cache.schema_fingerprint(PROFILE)
+
+        first = await chart_cache.chart_for_question("prompt", "Items per day?", fingerprint, "data.parquet")
+        second = await chart_cache.chart_for_question("prompt", "  items per DAY? ", fingerprint, "other.parquet")
+
+        assert first["code"] == second["code"] == GOOD
+        assert create_chart.call_count == 2
+        # the retry is told what went wrong and skips the cached response
+        assert "KeyError: 'missing'" in create_chart.call_args.args[0]
+        assert create_chart.call_args.kwargs["refresh"]
+        entry = await ChartCode.find_one(ChartCode.key == chart_cache.chart_code_key(fingerprint, "Items per day?"))
+        assert entry.hits == 1
+        assert entry.failures == [{"codeHash": chart_cache.code_hash(BAD), "error": "KeyError: 'missing'"}]
+
+    @pytest.mark.anyio
+    async def test_known_failures_are_not_run_again(self, client_test: AsyncClient, render, mocker):
+        fingerprint = chart_cache.schema_fingerprint(PROFILE)
+        mocker.patch("analytic.chart_cache.create_chart", side_effect=[BAD])
+        await chart_cache.chart_for_question("prompt", "q", fingerprint, "data.parquet", attempts=1)
+        render.reset_mock()
+        mocker.patch("analytic.chart_cache.create_chart", side_effect=[BAD, GOOD])
+
+        chart = await chart_cache.chart_for_question("prompt", "q", fingerprint, "data.parquet")
+
+        assert chart["code"] == GOOD
+        # the regenerated failing variant was skipped without rendering it
+        assert render.call_count == 1
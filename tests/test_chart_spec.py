@@ -0,0 +1,125 @@
+import io
+
+import pandas as pd
+import PIL.Image
+import pytest
+from httpx import AsyncClient
+
+from analytic import chart_spec, dataset_store
+from models.analytic import Analytic
+from routes import analytic as analytic_routes
+from schemas.chart_spec import ChartSpec
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+CSV = (
+    "Date,Product_Category,Product_Cost,Items_Sold\n"
+    "2024-01-01,Books,10.5,3\n"
+    "2024-01-20,Games,12.25,1\n"
+    "2024-02-03,Books,30.0,7\n"
+    "2024-02-04,Toys,8.75,2\n"
+)
+PROFILE = {"rows": 4, "columns": [
+    {"name": name, "dtype": "object", "nulls": 0.0, "distinct": 4, "distinct_exact": True}
+    for name in ["Date", "Product_Category", "Product_Cost", "Items_Sold"]
+]}
+
+
+@pytest.fixture
+def frame():
+    return pd.read_csv(io.StringIO(CSV))
+
+
+@pytest.fixture
+def dataset(mock_s3, tmp_path, mocker):
+    mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+    mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=CSV.encode())
+    return "file-1"
+
+
+class TestChartSpec:
+    def test_aggregate_groups_by_month(self, frame):
+        spec = ChartSpec(type="bar", x="Date", y="Items_Sold", group="Product_Category", time_unit="month")
+
+        table = chart_spec.aggregate(frame, spec)
+
+        assert [month.strftime("%Y-%m") for month in table.index] == ["2024-01", "2024-02"]
+        assert table.loc[:, "Books"].tolist() == [3, 7]
+        assert table.loc[:, "Games"].tolist() == [1, 0]
+
+    def test_filters_sort_and_limit(self, frame):
+        filtered = ChartSpec(
+            type="bar", x="Product_Category", agg="count",
+            filters=[{"column": "Product_Cost", "op": "<", "value": 20}, {"column": "Date", "op": ">=", "value": "2024-01-10"}],
+        )
+        top = ChartSpec(type="bar", x="Product_Category", y="Items_Sold", sort="desc", limit=2)
+
+        assert chart_spec.aggregate(frame, filtered).to_dict() == {"count": {"Games": 1, "Toys": 1}}
+        assert chart_spec.aggregate(frame, top).to_dict() == {"Items_Sold": {"Books": 10, "Toys": 2}}
+
+    def test_validate_rejects_unknown_columns(self):
+        spec = chart_spec.parse_spec('```json\n{"type": "line", "x": "Date", "y": "Revenue"}\n```')
+
+        with pytest.raises(ValueError, match="unknown columns: Revenue"):
+            chart_spec.validate_spec(spec, ["Date", "Items_Sold"])
+
+    def test_render_resizes_without_new_spec(self, frame):
+        spec = ChartSpec(type="line", x="Date", y="Product_Cost", time_unit="week", style={"theme": "ggplot", "palette": "viridis"})
+
+        small = chart_spec.render_spec(frame, spec, width=4, height=3, dpi=50)
+        large = chart_spec.render_spec(frame, spec, width=8, height=6, dpi=50)
+
+        assert PIL.Image.open(io.BytesIO(small["png"])).size == (small["width"], small["height"])
+        assert large["width"] > small["width"] * 1.5
+
+
+class TestSpecCharts:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_graph_drawn_from_spec_and_rerendered(self, client_test: AsyncClient, dataset, mocker):
+        create_chart_spec = mocker.patch(
+            "routes.analytic.create_chart_spec",
+            return_value=ChartSpec(type="bar", x="Product_Category", y="Items_Sold", title="Items sold"),
+        )
+        chart_for_question = mocker.patch("routes.analytic.chart_for_question")
+        analytic = await Analytic(
+            aId="a1", cleaned_file=dataset, profile=PROFILE, status="query ready",
+            queries=[{"question": "Items sold per category?", "Solution": "sum"}],
+        ).create()
+
+        await analytic_routes.handle_draw_graphs(analytic.id)
+
+        chart_for_question.assert_not_called()
+        assert create_chart_spec.call_args.args[1] == ["Date", "Product_Category", "Product_Cost", "Items_Sold"]
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.queries[0]["spec"] == {"type": "bar", "x": "Product_Category", "y": "Items_Sold", "title": "Items sold"}
+        assert analytic.queries[0]["graph"] == f"charts/{analytic.id}/0.png"
+
+        response = await client_test.get(f"analytic/chart/{analytic.id}/0?width=5&height=2&dpi=40&theme=dark_background")
+
+        assert response.headers["content-type"] == "image/png"
+        assert PIL.Image.open(io.BytesIO(response.content)).size[1] < 100
+
+    @pytest.mark.anyio
+    async def test_unknown_theme_is_rejected(self, client_test: AsyncClient, dataset):
+        analytic = await Analytic(
+            aId="a1", cleaned_file=dataset, queries=[{"question": "q", "Solution": "s", "spec": {"type": "pie", "x": "Product_Category", "agg": "count"}}],
+        ).create()
+
+        response = await client_test.get(f"analytic/chart/{analytic.id}/0?theme=neon")
+
+        assert response.json()["status_code"] == 400
+
+    @pytest.mark.anyio
+    async def test_oversized_chart_is_rejected(self, client_test: AsyncClient, dataset):
+        analytic = await Analytic(
+            aId="a1", cleaned_file=dataset, queries=[{"question": "q", "Solution": "s", "spec": {"type": "pie", "x": "Product_Category", "agg": "count"}}],
+        ).create()
+
+        for params in ["width=500&height=500", "dpi=1000", "width=-2"]:
+            response = await client_test.get(f"analytic/chart/{analytic.id}/0?{params}")
+
+            assert response.json()["status_code"] == 400
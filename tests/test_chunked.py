@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from analytic import aggregate, chart_spec, chunked, dataset_store
+from schemas.analytic import AggregateModel
+from schemas.chart_spec import ChartSpec
+
+BUCKET = "test-public-bucket"
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=1000, freq="6h").strftime("%Y-%m-%d %H:%M"),
+        "Region": rng.choice(["north", "south", "east"], 1000),
+        "Sales": rng.integers(0, 100, 1000),
+        "Price": rng.normal(20, 5, 1000).round(2),
+    })
+
+
+@pytest.fixture
+def large(frame, tmp_path, mocker):
+    # every dataset counts as large, batches are kept small to cross many boundaries
+    mocker.patch.object(chunked.settings, "CHUNKED_THRESHOLD_BYTES", 0)
+    mocker.patch.object(chunked.settings, "CHUNK_ROWS", 64)
+    path = str(tmp_path / "large.parquet")
+    frame.to_parquet(path, row_group_size=100)
+    return path
+
+
+class TestSketches:
+    def test_quantiles_within_rank_error(self):
+        values = np.random.default_rng(1).normal(size=200_000)
+        sketch = chunked.QuantileSketch()
+        for part in np.array_split(values, 13):
+            sketch.update(part)
+
+        for q in (0.1, 0.5, 0.9):
+            rank = (values < sketch.quantile(q)).mean()
+            assert abs(rank - q) < 0.02
+        assert chunked.QuantileSketch().update([1, 2, 3, 4]).quantile(0.5) == 2.5
+
+    def test_distinct_counts_merge(self):
+        left = chunked.DistinctSketch().update(np.arange(0, 60_000))
+        right = chunked.DistinctSketch().update(np.arange(30_000, 90_000))
+
+        assert abs(left.merge(right).estimate() - 90_000) < 90_000 * 0.05
+        assert chunked.DistinctSketch().update(pd.Series(["a", "b", None, "a"], dtype="category")).estimate() == 2
+
+
+class TestChunkedAggregate:
+    def test_matches_in_memory_query(self, frame, large):
+        query = AggregateModel(
+            group_by=["Date", "Region"],
+            time_bucket={"column": "Date", "unit": "month"},
+            measures=[{"op": "count"}, {"op": "sum", "column": "Sales"}, {"op": "mean", "column": "Price"},
+                      {"op": "min", "column": "Price"}, {"op": "nunique", "column": "Sales"}],
+            filters=[{"column": "Sales", "op": ">", "value": 10}],
+        )
+
+        assert aggregate.aggregate_file(large, query) == aggregate.run_aggregate(frame, query)
+
+    def test_quantiles_and_totals(self, frame, large):
+        query = AggregateModel(measures=[{"op": "count"}, {"op": "median", "column": "Price"}])
+
+        result = aggregate.aggregate_file(large, query)
+
+        assert result["rows"][0][0] == 1000
+        assert abs(result["rows"][0][1] - frame["Price"].median()) < 0.5
+
+    def test_spec_data_matches(self, frame, large):
+        spec = ChartSpec(type="bar", x="Region", y="Sales", group="Date", time_unit=None, agg="sum", sort="desc", limit=2)
+        line = ChartSpec(type="line", x="Date", y="Price", agg="max", time_unit="week")
+
+        pd.testing.assert_frame_equal(aggregate.spec_data(large, spec), chart_spec.aggregate(frame, spec), check_names=False)
+        pd.testing.assert_frame_equal(aggregate.spec_data(large, line), chart_spec.aggregate(frame, line), check_names=False)
+
+
+class TestCsvToParquet:
+    def test_dtypes_decided_over_all_chunks(self, tmp_path):
+        csv = tmp_path / "data.csv"
+        pd.DataFrame({
+            "small": list(range(200)),
+            "large": [2 ** 40 + i for i in range(200)],
+            "late_null": list(range(199)) + [None],
+            "code": [str(i) for i in range(150)] + ["x"] * 50,
+            "kind": ["a", "b"] * 100,
+        }).to_csv(csv, index=False)
+        path = str(tmp_path / "data.parquet")
+
+        assert chunked.csv_to_parquet(str(csv), path, chunk_rows=64)["rows"] == 200
+
+        df = pq.read_table(path).to_pandas()
+        assert str(df["small"].dtype) == "int32"
+        assert str(df["large"].dtype) == "int64"
+        assert (df["small"] - 100).min() == -100
+        assert str(df["late_null"].dtype).startswith("float")
+        assert df["code"].tolist()[149:151] == ["149", "x"]
+        assert isinstance(df["kind"].dtype, pd.CategoricalDtype)
+
+    def test_store_dataset_converts_large_csv_in_chunks(self, mock_s3, tmp_path, mocker):
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+        mocker.patch.object(dataset_store.settings, "CHUNKED_THRESHOLD_BYTES", 10)
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=b"a,b\n1,x\n2,y\n")
+
+        artifact = dataset_store.store_dataset(mock_s3, BUCKET, "file-1")
+
+        assert artifact["rows"] == 2
+        assert dataset_store.load_dataset(mock_s3, BUCKET, "file-1")["a"].tolist() == [1, 2]
+        assert [name for name in tmp_path.iterdir() if name.suffix == ".tmp"] == []
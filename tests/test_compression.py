@@ -0,0 +1,79 @@
+import hashlib
+import io
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from analytic import compression, dataset_store
+from analytic.clients import AsyncS3
+from analytic.storage import MIN_PART_SIZE, spool_object, stream_upload, transfer_openai_file
+from tests.conftest import FakeFileResponse
+
+BUCKET = "test-bucket"
+CSV = b"Date,Items_Sold\n" + b"".join(b"2024-01-%02d,%d\n" % (day % 28 + 1, day) for day in range(5000))
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        yield s3
+
+
+class TestCompression:
+    @pytest.mark.parametrize("encoding", ["zstd", "gzip", None])
+    def test_decoded_stream_round_trip(self, s3_client, encoding):
+        s3_client.put_object(Bucket=BUCKET, Key="data.csv", Body=compression.encode(CSV, encoding), **({"ContentEncoding": encoding} if encoding else {}))
+
+        with compression.open_object(s3_client, BUCKET, "data.csv", chunk_size=100) as stream:
+            assert stream.read(10) == CSV[:10]
+            assert stream.read() == CSV[10:]
+
+    def test_encoding_per_object_class(self, mocker):
+        mocker.patch.multiple(compression.settings, S3_COMPRESS_ORIGINAL="ZSTD", S3_COMPRESS_CLEANED="gzip", S3_COMPRESS_IMAGE="none")
+
+        assert [compression.object_encoding(name) for name in ("original", "cleaned", "image")] == ["zstd", "gzip", None]
+        mocker.patch.object(compression, "zstandard", None)
+        assert compression.object_encoding("original") == "gzip"
+
+    def test_upload_compressed_and_spooled_back(self, s3_client):
+        data = CSV * 400
+
+        spool, file_hash, size = stream_upload(s3_client, io.BytesIO(data), BUCKET, "big.csv", MIN_PART_SIZE, 1024, "zstd")
+
+        obj = s3_client.head_object(Bucket=BUCKET, Key="big.csv")
+        assert obj["ContentEncoding"] == "zstd"
+        assert obj["ContentLength"] < len(data) / 5
+        assert (size, file_hash) == (len(data), hashlib.sha256(data).hexdigest())
+        assert spool.read() == data
+        respooled, respooled_hash, respooled_size = spool_object(s3_client, BUCKET, "big.csv", 4096, 1024)
+        assert (respooled_size, respooled_hash) == (size, file_hash)
+
+    @pytest.mark.anyio
+    async def test_transfer_compressed(self, s3_client, mocker):
+        openai_client = mocker.MagicMock()
+        openai_client.files.with_streaming_response.content.return_value = FakeFileResponse(CSV, chunk_size=1000)
+
+        artifact = await transfer_openai_file(
+            openai_client, AsyncS3(s3_client, 2), "file-1", BUCKET, "file-1.csv", "text/csv", MIN_PART_SIZE, "gzip"
+        )
+
+        obj = s3_client.get_object(Bucket=BUCKET, Key="file-1.csv")
+        assert obj["ContentEncoding"] == "gzip"
+        assert artifact["stored_size"] == obj["ContentLength"] < artifact["size"] == len(CSV)
+        assert compression.decompressor("gzip").decompress(obj["Body"].read()) == CSV
+
+
+class TestCompressedDatasets:
+    def test_store_and_preview_compressed_csv(self, s3_client, tmp_path, mocker):
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+        s3_client.put_object(Bucket=BUCKET, Key="file-1.csv", Body=compression.encode(CSV, "zstd"), ContentEncoding="zstd")
+
+        artifact = dataset_store.store_dataset(s3_client, BUCKET, "file-1")
+        preview = dataset_store.read_csv_preview(s3_client, BUCKET, "file-1", 2, 16)
+
+        assert artifact["rows"] == 5000
+        assert dataset_store.load_dataset(s3_client, BUCKET, "file-1")["Items_Sold"].sum() == sum(range(5000))
+        assert preview["rows"] == [["2024-01-01", 0], ["2024-01-02", 1]]
@@ -0,0 +1,53 @@
+import pytest
+from httpx import AsyncClient
+
+from models.analytic import Analytic
+from models.dataset import Dataset
+from models.job import Job
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+
+
+class TestDatasetDedup:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_identical_upload_reuses_dataset(self, client_test: AsyncClient, mock_s3, mock_openai):
+        first = await Analytic(aId="a1").create()
+        second = await Analytic(aId="a2").create()
+        data = b"Date,Items_Sold\n2024-01-01,3\n"
+
+        await client_test.post(f"analytic/upload_file/{first.id}", files={"file": ("sales.csv", data)})
+        await client_test.post(f"analytic/upload_file/{second.id}", files={"file": ("sales copy.csv", data)})
+
+        first = await Analytic.get(first.id)
+        second = await Analytic.get(second.id)
+        assert first.file_hash == second.file_hash
+        assert second.origin_file == first.origin_file
+        assert second.file["id"] == "file-1"
+        assert mock_openai.files.create.call_count == 1
+        # the duplicate object is dropped, only the original remains
+        keys = [obj["Key"] for obj in mock_s3.list_objects_v2(Bucket=BUCKET)["Contents"]]
+        assert keys == [first.origin_file]
+
+    @pytest.mark.anyio
+    async def test_clean_file_reuses_cleaned_result(self, client_test: AsyncClient, mock_openai):
+        cleaned = {"status": "completed", "message": ["cleaned"], "description": [], "attachments": "file-2"}
+        await Dataset(sha256="abc", fileId="file-1", cleaned_file="file-2", cleaned=cleaned).create()
+        analytic = await Analytic(aId="a3", file_hash="abc", threadId="thread-3").create()
+
+        response = await client_test.post(f"analytic/clean_file/{analytic.id}")
+
+        assert response.json()["status_code"] == 200
+        assert await Job.find(Job.kind == "clean_file").count() == 0
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.cleaned_file == "file-2"
+        assert analytic.status == {"current": "cleaned", "cleaned": cleaned}
+        # insights drawn on this thread must see the cleaned file
+        mock_openai.beta.threads.update.assert_called_once_with(
+            "thread-3", tool_resources={"code_interpreter": {"file_ids": ["file-1", "file-2"]}},
+        )
+        assert "file-2" in mock_openai.beta.threads.messages.create.call_args.kwargs["content"]
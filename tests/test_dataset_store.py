@@ -0,0 +1,151 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from httpx import AsyncClient
+
+from analytic import dataset_store
+from models.analytic import Analytic
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+CSV = (
+    "Date,Product_Category,Product_Cost,Items_Sold,Score\n"
+    "2024-01-01,Books,10.5,3,0.1\n"
+    "2024-01-02,Books,12.25,-1,0.2\n"
+    "2024-01-03,Games,30.0,7,0.3\n"
+    "2024-01-04,Books,8.75,2,0.4\n"
+)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, mocker):
+    mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+class TestDatasetStore:
+    def test_compact_frame(self):
+        df = pd.DataFrame({
+            "count": [1, 2, 3, 4],
+            "delta": [-1, 0, 1, 2],
+            "exact": [0.5, 1.25, 2.0, np.nan],
+            "precise": [0.1, 0.2, 0.3, 0.4],
+            "category": ["a", "b", "a", "a"],
+            "unique": ["w", "x", "y", "z"],
+        })
+
+        df = dataset_store.compact_frame(df)
+
+        assert df["count"].dtype == np.int32
+        assert df["delta"].dtype == np.int32
+        assert df["exact"].dtype == np.float32
+        # float32 would change these values, so they stay float64
+        assert df["precise"].dtype == np.float64
+        assert isinstance(df["category"].dtype, pd.CategoricalDtype)
+        assert not isinstance(df["unique"].dtype, pd.CategoricalDtype)
+
+    def test_compact_frame_keeps_derived_columns_exact(self):
+        df = dataset_store.compact_frame(pd.DataFrame({"Price": [10, 20, 30], "Cost": [12, 5, 40], "Qty": [200, 100, 3]}))
+
+        assert (df["Price"] - df["Cost"]).tolist() == [-2, 15, -10]
+        assert (df["Qty"] * 2).tolist() == [400, 200, 6]
+
+    def test_store_and_load(self, mock_s3, cache_dir):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=CSV.encode())
+
+        artifact = dataset_store.store_dataset(mock_s3, BUCKET, "file-1")
+
+        assert artifact["key"] == "file-1.parquet"
+        assert artifact["rows"] == 4
+        mock_s3.head_object(Bucket=BUCKET, Key="file-1.parquet")
+
+        df = dataset_store.load_dataset(mock_s3, BUCKET, "file-1", columns=["Product_Category", "Items_Sold"])
+        assert list(df.columns) == ["Product_Category", "Items_Sold"]
+        assert isinstance(df["Product_Category"].dtype, pd.CategoricalDtype)
+        assert df["Items_Sold"].tolist() == [3, -1, 7, 2]
+
+        head = dataset_store.load_dataset(mock_s3, BUCKET, "file-1", rows=2)
+        assert len(head) == 2
+        assert head["Product_Cost"].tolist() == [10.5, 12.25]
+
+    def test_load_downloads_missing_cache(self, mock_s3, cache_dir):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-2.csv", Body=CSV.encode())
+        dataset_store.store_dataset(mock_s3, BUCKET, "file-2")
+        os.remove(dataset_store.dataset_path("file-2"))
+        # the parquet copy in s3 is used, not the csv
+        mock_s3.delete_object(Bucket=BUCKET, Key="file-2.csv")
+
+        df = dataset_store.load_dataset(mock_s3, BUCKET, "file-2")
+
+        assert len(df) == 4
+
+    def test_load_builds_legacy_dataset(self, mock_s3, cache_dir):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-3.csv", Body=CSV.encode())
+
+        df = dataset_store.load_dataset(mock_s3, BUCKET, "file-3")
+
+        assert len(df) == 4
+        mock_s3.head_object(Bucket=BUCKET, Key="file-3.parquet")
+        assert [name for name in os.listdir(cache_dir)] == ["file-3.parquet"]
+
+    def test_least_recently_used_copies_are_evicted(self, mock_s3, cache_dir, mocker):
+        for index, cleaned_file in enumerate(["file-6", "file-7", "file-8"]):
+            mock_s3.put_object(Bucket=BUCKET, Key=f"{cleaned_file}.csv", Body=CSV.encode())
+            dataset_store.store_dataset(mock_s3, BUCKET, cleaned_file)
+            os.utime(dataset_store.dataset_path(cleaned_file), (index, index))
+        size = os.path.getsize(dataset_store.dataset_path("file-6"))
+        # a hit makes file-6 the most recently used copy
+        dataset_store.ensure_dataset(mock_s3, BUCKET, "file-6")
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_MAX_BYTES", 2 * size)
+        os.remove(dataset_store.dataset_path("file-8"))
+
+        dataset_store.ensure_dataset(mock_s3, BUCKET, "file-8")
+
+        assert sorted(os.listdir(cache_dir)) == ["file-6.parquet", "file-8.parquet"]
+
+    def test_csv_preview_widens_range(self, mock_s3):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-5.csv", Body=CSV.encode())
+
+        preview = dataset_store.read_csv_preview(mock_s3, BUCKET, "file-5", 2, 16)
+
+        assert preview["columns"] == ["Date", "Product_Category", "Product_Cost", "Items_Sold", "Score"]
+        assert preview["dtypes"][2] == "float64"
+        assert preview["rows"] == [["2024-01-01", "Books", 10.5, 3, 0.1], ["2024-01-02", "Books", 12.25, -1, 0.2]]
+
+
+class TestCheckStatus:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_check_status_reads_stored_preview(self, client_test: AsyncClient, mock_s3, mocker):
+        preview = dataset_store.build_preview(pd.read_csv(io.StringIO(CSV), nrows=2))
+        analytic = await Analytic(aId="a1", cleaned_file="file-4", status={"current": "cleaned"}, preview=preview).create()
+        get_object = mocker.spy(mock_s3, "get_object")
+
+        response = await client_test.get(f"analytic/check_status/{analytic.id}")
+
+        rows = response.json()["description"]
+        assert rows == [
+            {"Date": "2024-01-01", "Product_Category": "Books", "Product_Cost": 10.5, "Items_Sold": 3, "Score": 0.1},
+            {"Date": "2024-01-02", "Product_Category": "Books", "Product_Cost": 12.25, "Items_Sold": -1, "Score": 0.2},
+        ]
+        get_object.assert_not_called()
+
+    @pytest.mark.anyio
+    async def test_check_status_rebuilds_legacy_preview(self, client_test: AsyncClient, mock_s3):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-6.csv", Body=CSV.encode())
+        analytic = await Analytic(aId="a2", cleaned_file="file-6", status={"current": "cleaned"}).create()
+
+        response = await client_test.get(f"analytic/check_status/{analytic.id}")
+
+        rows = response.json()["description"]
+        assert len(rows) == 4
+        assert rows[0]["Product_Category"] == "Books"
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.preview["columns"][0] == "Date"
+        assert len(analytic.preview["rows"]) == 4
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+from httpx import AsyncClient
+
+from analytic import chunked, dataset_store, downsample
+from models.analytic import Analytic
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+
+
+def naive_lttb(x, y, threshold):
+    # straight transcription of the reference algorithm
+    every = (len(x) - 2) / (threshold - 2)
+    selected, previous = [0], 0
+    for bucket in range(threshold - 2):
+        start, end = int(np.floor(bucket * every)) + 1, int(np.floor((bucket + 1) * every)) + 1
+        next_end = min(int(np.floor((bucket + 2) * every)) + 1, len(x))
+        if bucket == threshold - 3:
+            average_x, average_y = x[-1], y[-1]
+        else:
+            average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = [
+            abs((x[previous] - average_x) * (y[index] - y[previous]) - (x[previous] - x[index]) * (average_y - y[previous]))
+            for index in range(start, end)
+        ]
+        previous = start + int(np.argmax(areas))
+        selected.append(previous)
+    return selected + [len(x) - 1]
+
+
+class TestLTTB:
+    def test_matches_reference(self):
+        rng = np.random.default_rng(0)
+        x = np.arange(1000, dtype=float)
+        y = np.cumsum(rng.normal(size=1000))
+
+        assert downsample.lttb(x, y, 50).tolist() == naive_lttb(x, y, 50)
+
+    def test_keeps_spikes_and_short_series(self):
+        x = np.arange(500, dtype=float)
+        y = np.zeros(500)
+        y[250] = 100
+
+        assert 250 in downsample.lttb(x, y, 20)
+        assert downsample.lttb(x[:10], y[:10], 20).tolist() == list(range(10))
+
+    def test_series_per_column(self):
+        df = pd.DataFrame({
+            "Date": pd.date_range("2024-01-01", periods=100, freq="h")[::-1],
+            "Sales": np.arange(100, dtype=float),
+            "Cost": [None] * 50 + list(range(50)),
+        })
+
+        result = downsample.downsample_series(df, "Date", ["Sales", "Cost"], 10)
+
+        assert len(result["series"]["Sales"]) == 10
+        assert result["series"]["Sales"][0] == ["2024-01-01T00:00:00.000", 99.0]
+        assert len(result["series"]["Cost"]) == 10
+
+
+    def test_chunked_series_keeps_extremes(self, tmp_path):
+        rng = np.random.default_rng(1)
+        sales = np.cumsum(rng.normal(size=5000))
+        sales[3210] = 500
+        df = pd.DataFrame({
+            "Date": pd.date_range("2024-01-01", periods=5000, freq="min").astype(str),
+            "Sales": sales,
+            "Cost": np.where(np.arange(5000) % 7 == 0, np.nan, sales / 2),
+        }).sample(frac=1, random_state=0)
+        path = str(tmp_path / "data.parquet")
+        df.to_parquet(path, row_group_size=700)
+
+        result = downsample.chunked_series(path, "Date", ["Sales", "Cost"], 50, batch_size=700)
+        exact = downsample.downsample_series(df, "Date", ["Sales", "Cost"], 50)
+
+        assert result["rows"] == 5000
+        for column in ["Sales", "Cost"]:
+            points = result["series"][column]
+            assert len(points) == 50
+            assert points[0] == exact["series"][column][0]
+            assert points[-1] == exact["series"][column][-1]
+            assert [date for date, _ in points] == sorted(date for date, _ in points)
+        assert ["2024-01-03T05:30:00.000", 500.0] in result["series"]["Sales"]
+
+    def test_chunked_series_matches_short_series(self, tmp_path):
+        df = pd.DataFrame({"Date": pd.date_range("2024-01-01", periods=30, freq="D"), "Sales": np.arange(30.0)})
+        path = str(tmp_path / "data.parquet")
+        df.to_parquet(path)
+
+        result = downsample.chunked_series(path, "Date", ["Sales"], 50, batch_size=7)
+
+        assert result == downsample.downsample_series(df, "Date", ["Sales"], 50)
+
+
+class TestSeriesRoute:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_computed_then_cached(self, client_test: AsyncClient, mock_s3, tmp_path, mocker):
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+        csv = "Date,Sales\n" + "".join(f"2024-01-{day:02d},{day * 2}\n" for day in range(1, 31))
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=csv.encode())
+        downsample.series_cache.clear()
+        analytic = await Analytic(aId="a1", cleaned_file="file-1").create()
+        url = f"analytic/{analytic.id}/series?date=Date&values=Sales&points=5"
+
+        first = (await client_test.get(url)).json()
+        second = (await client_test.get(url)).json()
+        unknown = (await client_test.get(f"analytic/{analytic.id}/series?date=Date&values=Revenue")).json()
+
+        assert first["description"] == "computed"
+        assert first["data"]["rows"] == 30
+        assert first["data"]["series"]["Sales"][0] == ["2024-01-01T00:00:00.000", 2]
+        assert len(first["data"]["series"]["Sales"]) == 5
+        assert second["description"] == "cache"
+        assert unknown["status_code"] == 400
+
+    @pytest.mark.anyio
+    async def test_large_dataset_is_chunked(self, client_test: AsyncClient, mock_s3, tmp_path, mocker):
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+        mocker.patch.object(chunked.settings, "CHUNKED_THRESHOLD_BYTES", 10)
+        chunked_series = mocker.spy(downsample, "chunked_series")
+        csv = "Date,Sales\n" + "".join(f"2024-01-{day:02d},{day * 2}\n" for day in range(1, 31))
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=csv.encode())
+        downsample.series_cache.clear()
+        analytic = await Analytic(aId="a1", cleaned_file="file-1").create()
+
+        response = (await client_test.get(f"analytic/{analytic.id}/series?date=Date&values=Sales&points=5")).json()
+
+        chunked_series.assert_called_once()
+        assert response["data"]["rows"] == 30
+        assert response["data"]["series"]["Sales"][0] == ["2024-01-01T00:00:00.000", 2]
+        assert response["data"]["series"]["Sales"][-1] == ["2024-01-30T00:00:00.000", 60]
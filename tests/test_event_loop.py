@@ -0,0 +1,84 @@
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+from models.analytic import Analytic
+from routes.analytic import handle_clean_file, handle_draw_insights
+from tests.conftest import FakeRunStream, mock_no_authentication, run_events
+
+RUN_SECONDS = 1.0
+S3_SECONDS = 0.3
+
+
+@pytest.fixture
+def frozen_gc():
+    # keep full collections of the (large, moto-heavy) test heap out of the measurement
+    gc.collect()
+    gc.freeze()
+    yield
+    gc.unfreeze()
+
+
+def assistant_message(file_id, path):
+    annotation = SimpleNamespace(type="file_path", text=f"sandbox:/mnt/data/{path}", file_path=SimpleNamespace(file_id=file_id))
+    text = SimpleNamespace(value="done", annotations=[annotation])
+    return SimpleNamespace(role="assistant", content=[SimpleNamespace(type="text", text=text)])
+
+
+class TestEventLoop:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_check_status_latency_flat_during_jobs(self, client_test: AsyncClient, mock_s3, mock_openai, mocker, frozen_gc):
+        async def create_run(thread_id, **kwargs):
+            events = run_events(thread_id)
+            return FakeRunStream(events, delay=RUN_SECONDS / len(events))
+
+        def slow_put_object(**kwargs):
+            # boto3 blocks its calling thread for the whole request
+            time.sleep(S3_SECONDS)
+
+        mock_openai.beta.threads.runs.create.side_effect = create_run
+        mock_openai.beta.threads.messages.list.return_value = SimpleNamespace(data=[assistant_message("file-out", "chart.png")])
+        mocker.patch.object(mock_s3, "put_object", side_effect=slow_put_object)
+
+        polled = await Analytic(aId="polled", status={"current": "uploaded"}).create()
+        jobs = []
+        for i in range(3):
+            analytic = await Analytic(aId=f"clean-{i}", origin_file="data.csv", threadId=f"t-{i}", assistantId="a").create()
+            jobs.append(handle_clean_file(analytic.id))
+        for i in range(3):
+            analytic = await Analytic(aId=f"insights-{i}", threadId=f"i-{i}", assistantId="a", status={"current": "cleaned"}).create()
+            jobs.append(handle_draw_insights(analytic.id))
+
+        started = time.perf_counter()
+        running = [asyncio.ensure_future(job) for job in jobs]
+        await asyncio.sleep(0.05)
+
+        latencies = []
+        while not all(task.done() for task in running):
+            # measured from when the poll is due, so a stalled loop shows up even between requests
+            due = time.perf_counter() + 0.05
+            await asyncio.sleep(0.05)
+            response = await client_test.get(f"analytic/check_status/{polled.id}")
+            latencies.append(time.perf_counter() - due)
+            assert response.json()["status_code"] == 200
+        await asyncio.gather(*running)
+
+        # the jobs overlapped instead of running back to back ...
+        assert time.perf_counter() - started < len(jobs) * (RUN_SECONDS + S3_SECONDS)
+        # ... while status polls kept being served promptly
+        assert len(latencies) > 10
+        assert max(latencies) < S3_SECONDS / 2
+
+        cleaned = await Analytic.find_one(Analytic.aId == "clean-0")
+        assert cleaned.cleaned_file == "file-out"
+        assert cleaned.artifacts["cleaned"]["content_type"] == "text/csv"
+        insights = await Analytic.find_one(Analytic.aId == "insights-0")
+        assert insights.status["insights"] == ["file-out.png"]
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from starlette.testclient import TestClient
+
+from analytic import events
+from analytic.events import BACKENDS, MemoryBackend, MongoBackend, StatusBroker
+from database.database import update_analytic_data
+from models.analytic import Analytic
+from routes import analytic as analytic_routes
+from tests.conftest import mock_database
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+class TestStatusBroker:
+    @pytest.mark.anyio
+    async def test_slow_subscriber_keeps_latest(self):
+        broker = StatusBroker(MemoryBackend(), queue_size=2)
+
+        async with broker.subscribe("a1") as queue:
+            for current in ["uploaded", "cleaned", "insights ready"]:
+                await broker.publish("a1", {"current": current})
+            await broker.publish("a2", {"current": "other"})
+
+            assert queue.get_nowait() == {"current": "cleaned"}
+            assert queue.get_nowait() == {"current": "insights ready"}
+            assert queue.empty()
+        assert broker._listener is None
+
+    @pytest.mark.anyio
+    async def test_mongo_backend_crosses_processes(self, client_test: AsyncClient):
+        # two brokers stand in for the web process and a worker
+        web = StatusBroker(MongoBackend(poll_interval=0.01), queue_size=4)
+        worker = StatusBroker(MongoBackend(poll_interval=0.01), queue_size=4)
+
+        async with web.subscribe("a1") as queue:
+            await asyncio.sleep(0.02)
+            await worker.publish("a1", {"current": "cleaned"})
+            await web.publish("a1", {"current": "insights ready"})
+
+            assert await asyncio.wait_for(queue.get(), 1) == {"current": "insights ready"}
+            assert await asyncio.wait_for(queue.get(), 1) == {"current": "cleaned"}
+            # its own event is not delivered a second time by the poll
+            await asyncio.sleep(0.05)
+            assert queue.empty()
+
+
+class TestStatusEvents:
+    @pytest.mark.anyio
+    async def test_sse_streams_transitions(self, client_test: AsyncClient):
+        analytic = await Analytic(aId="a1", status={"current": "uploaded"}).create()
+        stream = analytic_routes.sse_events(analytic.id, FakeRequest())
+
+        assert await anext(stream) == 'event: status\ndata: {"current": "uploaded"}\n\n'
+        next_frame = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        # progress writes are forwarded too
+        await update_analytic_data(analytic.id, {"status.progress": {"stage": "cleaning"}})
+        assert await next_frame == 'event: status\ndata: {"current": "uploaded", "progress": {"stage": "cleaning"}}\n\n'
+        next_frame = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        await update_analytic_data(analytic.id, {"status": {"current": "cleaned"}})
+        assert await next_frame == 'event: status\ndata: {"current": "cleaned"}\n\n'
+        await stream.aclose()
+
+    @pytest.mark.anyio
+    async def test_sse_streams_worker_transitions(self, client_test: AsyncClient, mocker):
+        assert events.settings.EVENTS_BACKEND == "mongo"
+        mocker.patch.object(events.broker.backend, "poll_interval", 0.01)
+        # the worker process publishes through its own broker
+        worker = StatusBroker(BACKENDS[events.settings.EVENTS_BACKEND](), queue_size=4)
+        analytic = await Analytic(aId="a1", status={"current": "uploaded"}).create()
+        stream = analytic_routes.sse_events(analytic.id, FakeRequest())
+
+        assert await anext(stream) == 'event: status\ndata: {"current": "uploaded"}\n\n'
+        next_frame = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.02)
+        await worker.publish(str(analytic.id), {"current": "cleaned"})
+        assert await asyncio.wait_for(next_frame, 1) == 'event: status\ndata: {"current": "cleaned"}\n\n'
+        await stream.aclose()
+
+    @pytest.mark.anyio
+    async def test_sse_unknown_id(self, client_test: AsyncClient):
+        response = await client_test.get("analytic/events/6650c3b0f1d2a3b4c5d6e7f8")
+
+        assert response.json()["status_code"] == 404
+
+    def test_websocket_streams_transitions(self):
+        with TestClient(analytic_routes.router) as test_client:
+            test_client.portal.call(mock_database)
+            analytic = test_client.portal.call(Analytic(aId="a1", status={"current": "uploaded"}).create)
+
+            with test_client.websocket_connect(f"/events/{analytic.id}") as websocket:
+                assert websocket.receive_json() == {"event": "status", "data": {"current": "uploaded"}}
+                test_client.portal.call(update_analytic_data, analytic.id, {"status": {"current": "cleaned"}})
+                assert websocket.receive_json() == {"event": "status", "data": {"current": "cleaned"}}
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from models.analytic import Analytic
+from models.job import Job
+from routes import analytic as analytic_routes
+
+PROFILE = {"rows": 3, "columns": [{"name": "Items_Sold", "dtype": "uint8", "nulls": 0.0, "distinct": 3, "distinct_exact": True}]}
+
+
+def query(question, **extra):
+    return {"question": question, "Solution": "steps", **extra}
+
+
+class TestDrawGraphs:
+    @pytest.mark.anyio
+    async def test_endpoint_returns_job_handle(self, client_test: AsyncClient):
+        analytic = await Analytic(aId="a1", status="query ready", queries=[query("q")]).create()
+
+        response = await client_test.post(f"analytic/draw_graph/{analytic.id}?refresh=true")
+
+        job_id = response.json()["data"]["jobId"]
+        job = await Job.get(job_id)
+        assert job.kind == "draw_graphs"
+        assert job.payload == {"refresh": True}
+        response = await client_test.get(f"analytic/jobs/{job_id}")
+        assert response.json()["data"]["state"] == "queued"
+
+    @pytest.mark.anyio
+    async def test_pending_queries_drawn_concurrently(self, client_test: AsyncClient, mock_s3, mocker):
+        mocker.patch.object(analytic_routes.settings, "GRAPH_CONCURRENCY", 2)
+        mocker.patch.object(analytic_routes.settings, "CHART_ENGINE", "code")
+        mocker.patch("routes.analytic.ensure_dataset", return_value="data.parquet")
+        running = 0
+        peak = 0
+
+        async def chart_for_question(prompt, question, fingerprint, dataset_path, refresh=False, attempts=5):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            if question == "broken":
+                return {"png": None, "error": "KeyError: 'x'", "code": None}
+            return {"png": b"png", "width": 1200, "height": 600, "error": None, "code": "code"}
+
+        mocker.patch("routes.analytic.chart_for_question", side_effect=chart_for_question)
+        queries = [query("done", graph="old.png"), query("q1"), query("broken"), query("q3")]
+        analytic = await Analytic(aId="a1", status="query ready", queries=queries, profile=PROFILE, cleaned_file="f").create()
+
+        with pytest.raises(Exception, match="1 of 3 graphs failed"):
+            await analytic_routes.handle_draw_graphs(analytic.id)
+
+        assert peak == 2
+        analytic = await Analytic.get(analytic.id)
+        assert [query.get("graph") for query in analytic.queries] == ["old.png", f"charts/{analytic.id}/1.png", None, f"charts/{analytic.id}/3.png"]
+        assert analytic.queries[1]["chart"] == {
+            "key": f"charts/{analytic.id}/1.png", "content_type": "image/png", "size": 3, "width": 1200, "height": 600,
+        }
+        obj = mock_s3.get_object(Bucket="test-public-bucket", Key=f"charts/{analytic.id}/3.png")
+        assert obj["ContentType"] == "image/png"
+        assert obj["Body"].read() == b"png"
+        assert analytic.queries[2]["error"] == "KeyError: 'x'"
+        assert analytic.status["current"] == "graph ready"
+        assert analytic.status["graphs"] == {"total": 3, "done": 2, "failed": 1}
@@ -0,0 +1,107 @@
+import csv
+import datetime
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+from httpx import AsyncClient
+from openai.types import FileObject
+
+from analytic import ingest
+from models.analytic import Analytic
+from models.dataset import Dataset
+from tests.conftest import mock_no_authentication
+
+
+def workbook_bytes():
+    workbook = openpyxl.Workbook()
+    notes = workbook.active
+    notes.title = "Notes"
+    notes.append(["exported by the lab"])
+    data = workbook.create_sheet("Data")
+    data.append(["Patient", "Visit", "HB"])
+    data.append(["p1", datetime.datetime(2024, 1, 2, 9, 30), 12.5])
+    data.append([])
+    data.append(["p2", datetime.date(2024, 1, 3), None, None])
+    # formatting below the data shows up as empty rows in read-only mode
+    data.cell(row=10, column=1).number_format = "0.00"
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class TestSpreadsheetToCsv:
+    def test_every_sheet_converted(self):
+        spools, sheets = ingest.spreadsheet_to_csv(io.BytesIO(workbook_bytes()), "labs.xlsx", 1024)
+
+        notes, data = [list(csv.reader(io.TextIOWrapper(spool, encoding="utf-8", newline=""))) for spool in spools]
+        assert notes == [["exported by the lab"]]
+        # rows are padded to the width of the sheet
+        assert data == [["Patient", "Visit", "HB"], ["p1", "2024-01-02 09:30:00", "12.5"], ["", "", ""], ["p2", "2024-01-03 00:00:00", ""]]
+        assert sheets == [
+            {"name": "Notes", "rows": 1, "columns": 1, "selected": False},
+            {"name": "Data", "rows": 4, "columns": 3, "selected": True},
+        ]
+
+    def test_title_row_keeps_columns_aligned(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["Quarterly report"])
+        workbook.active.append(["Region", "Q1", "Q2", "Q3"])
+        workbook.active.append(["North", 1, 2, 3])
+        workbook.create_sheet("Empty")
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        spools, sheets = ingest.spreadsheet_to_csv(buffer, "report.xlsx", 1024)
+
+        df = pd.read_csv(spools[0], skiprows=1)
+        assert list(df.columns) == ["Region", "Q1", "Q2", "Q3"]
+        assert df.values.tolist() == [["North", 1, 2, 3]]
+        assert spools[1] is None
+        assert [sheet["selected"] for sheet in sheets] == [True, False]
+
+    def test_names(self):
+        assert ingest.is_spreadsheet("2024_labs.XLSX")
+        assert not ingest.is_spreadsheet("labs.csv")
+        assert ingest.csv_name("2024_labs.xls") == "2024_labs.csv"
+        assert ingest.csv_name("2024_labs.xls", "Q1 / Sales") == "2024_labs_Q1-Sales.csv"
+
+
+class TestSpreadsheetUpload:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_assistant_receives_every_sheet(self, client_test: AsyncClient, mock_s3, mock_openai):
+        mock_openai.files.create.side_effect = lambda file, purpose: FileObject(
+            id=f"file-{file[0].rsplit('_', 1)[1]}", bytes=0, created_at=0, filename=file[0], object="file", purpose=purpose, status="processed"
+        )
+        analytic = await Analytic(aId="a1").create()
+
+        response = await client_test.post(f"analytic/upload_file/{analytic.id}", files={"file": ("labs.xlsx", workbook_bytes())})
+
+        assert response.json()["status_code"] == 200
+        names = [call.kwargs["file"][0] for call in mock_openai.files.create.call_args_list]
+        assert [name.rsplit("_", 2)[1:] for name in names] == [["labs", "Notes.csv"], ["labs", "Data.csv"]]
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.origin_file.endswith("_labs.xlsx")
+        assert analytic.normalized_file == names[1]
+        assert analytic.file["id"] == "file-Data.csv"
+        assert [(sheet["rows"], sheet["fileId"]) for sheet in analytic.sheets] == [(1, "file-Notes.csv"), (4, "file-Data.csv")]
+        assert (await Dataset.find_one(Dataset.sha256 == analytic.file_hash)).sheets == analytic.sheets
+        mock_openai.beta.threads.create.assert_called_once_with(
+            tool_resources={"code_interpreter": {"file_ids": ["file-Notes.csv", "file-Data.csv"]}}
+        )
+
+    @pytest.mark.anyio
+    async def test_unreadable_workbook_uploaded_as_is(self, client_test: AsyncClient, mock_s3, mock_openai):
+        analytic = await Analytic(aId="a1").create()
+
+        await client_test.post(f"analytic/upload_file/{analytic.id}", files={"file": ("labs.xlsx", b"not a workbook")})
+
+        name, data = mock_openai.files.create.call_args.kwargs["file"]
+        assert name.endswith("_labs.xlsx")
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.sheets is None
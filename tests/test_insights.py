@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+from models.analytic import Analytic
+from routes import analytic as analytic_routes
+from tests.conftest import FakeRunStream, run_events
+
+
+def annotation(file_id, path):
+    return SimpleNamespace(type="file_path", text=f"sandbox:/mnt/data/{path}", file_path=SimpleNamespace(file_id=file_id))
+
+
+class TestDrawInsights:
+    @pytest.mark.anyio
+    async def test_artifacts_transferred_concurrently_in_order(self, client_test: AsyncClient, mock_s3, mock_openai, mocker):
+        mocker.patch.object(analytic_routes.settings, "TRANSFER_CONCURRENCY", 2)
+        running = 0
+        peak = 0
+
+        async def transfer(openai_client, s3, file_id, bucket, key, content_type, part_size, encoding=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return {"key": key, "content_type": content_type, "size": 1, "sha256": file_id}
+
+        mocker.patch("routes.analytic.transfer_openai_file", side_effect=transfer)
+        text = SimpleNamespace(value="two charts", annotations=[
+            annotation("f1", "pie.png"),
+            annotation("f2", "bars.png"),
+            annotation("f3", "table.csv"),
+            annotation("f4", "violin.png"),
+        ])
+        message = SimpleNamespace(role="assistant", content=[SimpleNamespace(type="text", text=text)])
+        mock_openai.beta.threads.runs.create.return_value = FakeRunStream(run_events("t1"))
+        mock_openai.beta.threads.messages.list.return_value = SimpleNamespace(data=[message])
+        analytic = await Analytic(aId="a1", threadId="t1", assistantId="a", status={"current": "cleaned"}).create()
+        update_analytic_data = mocker.spy(analytic_routes, "update_analytic_data")
+
+        await analytic_routes.handle_draw_insights(analytic.id)
+
+        assert peak == 2
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.status["current"] == "insights ready"
+        assert analytic.status["insights"] == ["f4.png", "f2.png", "f1.png"]
+        assert analytic.status["description"] == ["two charts"]
+        assert [artifact["key"] for artifact in analytic.artifacts["insights"]] == ["f4.png", "f3.csv", "f2.png", "f1.png"]
+        # results land in a single write
+        assert update_analytic_data.call_count == 1
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from analytic import jobs
+from database.database import claim_job
+from models.analytic import Analytic
+from models.job import Job
+from tests.conftest import mock_no_authentication
+
+
+@pytest.fixture
+def fast_jobs(mocker):
+    mocker.patch.object(jobs.settings, "WORKER_POLL_INTERVAL", 0.01)
+    mocker.patch.object(jobs.settings, "JOB_RETRY_DELAY", 0)
+
+
+async def run_until(handlers, concurrency, done):
+    stop = asyncio.Event()
+    worker = asyncio.create_task(jobs.run_worker(handlers, concurrency, stop=stop, worker="test"))
+    while not await done():
+        await asyncio.sleep(0.01)
+    stop.set()
+    await worker
+
+
+class TestJobQueue:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_clean_file_only_enqueues(self, client_test: AsyncClient, mocker):
+        handle_clean_file = mocker.patch("routes.analytic.handle_clean_file")
+        analytic = await Analytic(aId="a1").create()
+
+        response = await client_test.post(f"analytic/clean_file/{analytic.id}")
+
+        assert response.json()["status_code"] == 200
+        handle_clean_file.assert_not_called()
+        job = await Job.find_one(Job.analyticId == analytic.id)
+        assert job.kind == "clean_file"
+        assert job.state == "queued"
+
+    @pytest.mark.anyio
+    async def test_failed_job_is_retried(self, client_test: AsyncClient, fast_jobs):
+        calls = []
+
+        async def flaky(id):
+            calls.append(id)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        job = await jobs.enqueue("flaky", (await Analytic(aId="a2").create()).id)
+
+        async def done():
+            return (await Job.get(job.id)).state == "done"
+
+        await run_until({"flaky": flaky}, 1, done)
+
+        job = await Job.get(job.id)
+        assert len(calls) == 2
+        assert job.attempts == 2
+        assert job.error == "boom"
+
+    @pytest.mark.anyio
+    async def test_job_fails_after_max_attempts(self, client_test: AsyncClient, fast_jobs):
+        async def broken(id):
+            raise RuntimeError("always")
+
+        job = await jobs.enqueue("broken", (await Analytic(aId="a3").create()).id)
+
+        async def done():
+            return (await Job.get(job.id)).state == "failed"
+
+        await run_until({"broken": broken}, 1, done)
+
+        assert (await Job.get(job.id)).attempts == jobs.settings.JOB_MAX_ATTEMPTS
+
+    @pytest.mark.anyio
+    async def test_worker_concurrency_limit(self, client_test: AsyncClient, fast_jobs):
+        running = 0
+        peak = 0
+
+        async def slow(id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+        analytic = await Analytic(aId="a4").create()
+        for _ in range(6):
+            await jobs.enqueue("slow", analytic.id)
+
+        async def done():
+            return await Job.find(Job.kind == "slow", Job.state == "done").count() == 6
+
+        await run_until({"slow": slow}, 2, done)
+
+        assert peak == 2
+
+    @pytest.mark.anyio
+    async def test_expired_job_is_reclaimed(self, client_test: AsyncClient):
+        job = await jobs.enqueue("crashy", (await Analytic(aId="a5").create()).id)
+
+        claimed = await claim_job(["crashy"], "dead-worker", visibility_timeout=0)
+        reclaimed = await claim_job(["crashy"], "live-worker", visibility_timeout=60)
+
+        assert claimed.id == job.id
+        assert reclaimed.id == job.id
+        assert reclaimed.worker == "live-worker"
+        assert reclaimed.attempts == 2
+        assert await claim_job(["crashy"], "other-worker", visibility_timeout=60) is None
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+from analytic import llm_cache, utils
+from database.database import evict_llm_responses
+from models.llm_response import LLMResponse
+
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def create(mocker):
+    mocker.patch.object(llm_cache, "memory_cache", llm_cache.LRUCache(8))
+    mocker.patch.object(llm_cache, "stats", llm_cache.CacheStats())
+    create = mocker.AsyncMock(side_effect=lambda **kwargs: completion(f"answer {create.call_count}"))
+    mocker.patch("analytic.utils.client").chat.completions.create = create
+    return create
+
+
+class TestLLMCache:
+    def test_lru_evicts_least_recently_used(self):
+        cache = llm_cache.LRUCache(2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert len(cache) == 2
+
+    @pytest.mark.anyio
+    async def test_identical_prompts_hit_cache(self, client_test: AsyncClient, create):
+        first = await utils.generate_chat_response("system", "question")
+        second = await utils.generate_chat_response("system", "question")
+        llm_cache.memory_cache.clear()
+        # another process only has the mongo tier
+        third = await utils.generate_chat_response("system", "question")
+        other = await utils.generate_chat_response("system", "question", max_tokens=10)
+
+        assert first == second == third == "answer 1"
+        assert other == "answer 2"
+        assert create.call_count == 2
+        assert llm_cache.stats.as_dict() == {
+            "memory_hits": 1,
+            "mongo_hits": 1,
+            "misses": 2,
+            "bypassed": 0,
+            "refreshed": 0,
+            "hit_rate": 0.5,
+        }
+
+    @pytest.mark.anyio
+    async def test_bypass_and_refresh(self, client_test: AsyncClient, create):
+        await utils.generate_chat_response("system", "question")
+
+        bypassed = await utils.generate_chat_response("system", "question", cache=False)
+        refreshed = await utils.generate_chat_response("system", "question", refresh=True)
+        cached = await utils.generate_chat_response("system", "question")
+
+        assert bypassed == "answer 2"
+        assert refreshed == cached == "answer 3"
+        assert create.call_count == 3
+
+    @pytest.mark.anyio
+    async def test_rejected_responses_are_not_cached(self, client_test: AsyncClient, create):
+        def parse(content):
+            if content == "answer 1":
+                raise IndexError("list index out of range")
+            return content.upper()
+
+        with pytest.raises(IndexError):
+            await utils.generate_chat_response("system", "question", parse=parse)
+        second = await utils.generate_chat_response("system", "question", parse=parse)
+        third = await utils.generate_chat_response("system", "question", parse=parse)
+
+        assert second == third == "ANSWER 2"
+        assert create.call_count == 2
+        assert [entry.content for entry in await LLMResponse.find_all().to_list()] == ["answer 2"]
+
+    @pytest.mark.anyio
+    async def test_query_code_is_run_before_caching(self, client_test: AsyncClient, create):
+        create.side_effect = [
+            completion("no code block"),
+            completion("```python\ndef generate_query():\n    return [{'question': 'q'}]\n```"),
+        ]
+
+        with pytest.raises(IndexError):
+            await utils.create_query("questions")
+
+        assert await utils.create_query("questions") == [{"question": "q"}]
+        assert await utils.create_query("questions") == [{"question": "q"}]
+        assert create.call_count == 2
+
+    @pytest.mark.anyio
+    async def test_expired_entries_are_ignored(self, client_test: AsyncClient, create):
+        key = llm_cache.cache_key("gpt-4", [{"role": "system", "content": "system"}, {"role": "user", "content": "question"}], 1200, None)
+        await LLMResponse(key=key, model="gpt-4", content="stale", expiresAt=datetime.utcnow() - timedelta(seconds=1)).create()
+
+        assert await utils.generate_chat_response("system", "question") == "answer 1"
+
+    @pytest.mark.anyio
+    async def test_evicts_least_recently_hit(self, client_test: AsyncClient):
+        now = datetime.utcnow()
+        for index in range(4):
+            await LLMResponse(key=str(index), model="gpt-4", content="x", size=10, lastHitAt=now + timedelta(seconds=index)).create()
+
+        evicted = await evict_llm_responses(25)
+
+        assert evicted == 2
+        assert sorted(entry.key for entry in await LLMResponse.find_all().to_list()) == ["2", "3"]
+
+    @pytest.mark.anyio
+    async def test_stats_endpoint(self, client_test: AsyncClient, create):
+        await utils.generate_chat_response("system", "question")
+
+        response = await client_test.get("analytic/llm_cache/stats")
+
+        assert response.json()["data"]["misses"] == 1
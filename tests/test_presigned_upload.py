@@ -0,0 +1,61 @@
+import pytest
+import requests
+from httpx import AsyncClient
+
+from models.analytic import Analytic
+from analytic.storage import MIN_PART_SIZE
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+
+
+class TestPresignedUpload:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_presigned_multipart_upload(self, client_test: AsyncClient, mock_s3, mock_openai):
+        analytic = await Analytic(aId="a1").create()
+        data = [b"a" * MIN_PART_SIZE, b"b" * 1024]
+
+        response = await client_test.post(
+            f"analytic/upload/initiate/{analytic.id}", json={"filename": "sales data.csv"}
+        )
+        initiated = response.json()["data"]
+        assert initiated["key"].endswith("_sales-data.csv")
+
+        response = await client_test.post(
+            f"analytic/upload/parts/{analytic.id}", json={"part_numbers": [1, 2]}
+        )
+        urls = response.json()["data"]
+        assert [url["PartNumber"] for url in urls] == [1, 2]
+
+        # the client uploads straight to s3, bypassing the api
+        parts = []
+        for url, chunk in zip(urls, data):
+            uploaded = requests.put(url["url"], data=chunk)
+            parts.append({"PartNumber": url["PartNumber"], "ETag": uploaded.headers["ETag"]})
+
+        response = await client_test.post(f"analytic/upload/complete/{analytic.id}", json={"parts": parts})
+        assert response.json()["status_code"] == 200
+
+        obj = mock_s3.get_object(Bucket=BUCKET, Key=initiated["key"])
+        assert obj["Body"].read() == b"".join(data)
+
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.origin_file == initiated["key"]
+        assert analytic.threadId == "thread-1"
+        assert analytic.assistantId == "asst-1"
+        assert analytic.file_size == len(b"".join(data))
+        assert analytic.status == "uploaded"
+        assert not analytic.upload
+
+    @pytest.mark.anyio
+    async def test_complete_without_initiate(self, client_test: AsyncClient, mock_s3, mock_openai):
+        analytic = await Analytic(aId="a2").create()
+
+        response = await client_test.post(f"analytic/upload/complete/{analytic.id}", json={"parts": []})
+
+        assert response.json()["status_code"] == 404
+        mock_openai.files.create.assert_not_called()
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from analytic import dataset_store, profiler
+
+BUCKET = "test-public-bucket"
+CSV = (
+    "Date,Product_Category,Product_Cost,Items_Sold\n"
+    "2024-01-01,Books,10.5,3\n"
+    "2024-01-02,Books,12.25,\n"
+    "2024-01-03,Games,30.0,7\n"
+    "2024-02-04,Books,8.75,2\n"
+)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, mocker):
+    mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def columns(profile):
+    return {stats["name"]: stats for stats in profile["columns"]}
+
+
+class TestProfiler:
+    def test_chunked_profile_matches_single_pass(self, mock_s3, cache_dir, mocker):
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=CSV.encode())
+        mocker.patch.object(profiler.settings, "PROFILE_CHUNK_ROWS", 1)
+
+        chunked = profiler.profile_dataset(mock_s3, BUCKET, "file-1")
+        single = profiler.profile_frame(dataset_store.load_dataset(mock_s3, BUCKET, "file-1"))
+
+        assert chunked == single
+        assert chunked["rows"] == 4
+        stats = columns(chunked)
+        assert stats["Date"]["dates"] == ["2024-01-01T00:00:00", "2024-02-04T00:00:00"]
+        assert stats["Product_Category"]["top"] == [["Books", 3], ["Games", 1]]
+        assert stats["Product_Category"]["distinct"] == 2
+        assert stats["Items_Sold"]["nulls"] == 0.25
+        assert stats["Items_Sold"]["min"] == 2
+        assert stats["Product_Cost"]["max"] == 30.0
+        assert stats["Product_Cost"]["quantiles"] == [10.0625, 11.375, 16.6875]
+
+    def test_value_counts_are_capped(self, mocker):
+        mocker.patch.object(profiler.settings, "PROFILE_COUNT_LIMIT", 3)
+
+        stats = columns(profiler.profile_frame(pd.DataFrame({"name": list("abcdeaa")})))
+
+        # past the cap the distinct count comes from a sketch
+        assert stats["name"]["distinct"] == 5
+        assert not stats["name"]["distinct_exact"]
+        assert stats["name"]["top"][0] == ["a", 3]
+
+    def test_prompt_respects_token_budget(self):
+        df = pd.DataFrame({f"column_{index}": ["value"] * 3 for index in range(50)})
+        profile = profiler.profile_frame(df)
+
+        full = profiler.profile_prompt(profile, max_tokens=10_000)
+        short = profiler.profile_prompt(profile, max_tokens=100)
+
+        assert "top: value (3)" in full
+        assert profiler.estimate_tokens(short) <= 100
+        assert short.startswith("3 rows, 50 columns:")
+        assert short.endswith("more columns")
@@ -0,0 +1,74 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+from httpx import AsyncClient
+
+from analytic import dataset_store, rows
+from models.analytic import Analytic
+from schemas.chart_spec import ChartFilter
+from tests.conftest import mock_no_authentication
+
+BUCKET = "test-public-bucket"
+
+
+@pytest.fixture
+def parquet(tmp_path):
+    path = str(tmp_path / "rows.parquet")
+    df = pd.DataFrame({"id": range(100), "kind": ["a", "b", "c", "d"] * 25, "value": [x / 2 for x in range(100)]})
+    df.to_parquet(path, row_group_size=30)
+    return path
+
+
+class TestRows:
+    def test_pages_cover_every_matching_row_once(self, parquet):
+        filters = [ChartFilter(column="kind", op="in", value=["a", "c"])]
+        seen, start = [], 0
+        while start < 100:
+            end = rows.page_end(parquet, start, 7, filters, batch_size=8)
+            page = "".join(rows.stream_rows(parquet, start, end, ["id"], filters, batch_size=8))
+            seen += [json.loads(line)["id"] for line in page.splitlines()]
+            start = end
+
+        assert seen == list(range(0, 100, 2))
+
+    def test_csv_projection(self, parquet):
+        page = "".join(rows.stream_rows(parquet, 95, 100, ["value", "kind"], [], output="csv", batch_size=8))
+
+        assert pd.read_csv(io.StringIO(page)).to_dict("list") == {"value": [47.5, 48.0, 48.5, 49.0, 49.5], "kind": ["d", "a", "b", "c", "d"]}
+        assert "".join(rows.stream_rows(parquet, 100, 100, ["id"], [], output="csv")) == "id\n"
+
+    def test_cursor_is_bound_to_dataset_version(self):
+        cursor = rows.encode_cursor("file-1", 40)
+
+        assert rows.decode_cursor(cursor, "file-1") == 40
+        with pytest.raises(ValueError, match="does not match"):
+            rows.decode_cursor(cursor, "file-2")
+        with pytest.raises(ValueError, match="invalid cursor"):
+            rows.decode_cursor("not-a-cursor", "file-1")
+
+
+class TestRowsRoute:
+    @classmethod
+    def setup_class(cls):
+        mock_no_authentication()
+
+    @pytest.mark.anyio
+    async def test_streams_pages(self, client_test: AsyncClient, mock_s3, tmp_path, mocker):
+        mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+        csv = "Date,Sales\n" + "".join(f"2024-01-{day:02d},{day}\n" for day in range(1, 11))
+        mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=csv.encode())
+        analytic = await Analytic(aId="a1", cleaned_file="file-1").create()
+        filters = json.dumps([{"column": "Sales", "op": ">", "value": 3}])
+
+        first = await client_test.get(f"analytic/{analytic.id}/rows", params={"limit": 4, "columns": "Sales", "filters": filters})
+        second = await client_test.get(f"analytic/{analytic.id}/rows", params={"limit": 4, "format": "csv", "cursor": first.headers["x-next-cursor"]})
+        unknown = await client_test.get(f"analytic/{analytic.id}/rows", params={"columns": "Revenue"})
+
+        assert first.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in first.text.splitlines()] == [{"Sales": 4}, {"Sales": 5}, {"Sales": 6}, {"Sales": 7}]
+        assert first.headers["x-total-rows"] == "10"
+        assert second.text.splitlines() == ["Date,Sales", "2024-01-08,8", "2024-01-09,9", "2024-01-10,10"]
+        assert "x-next-cursor" not in second.headers
+        assert unknown.json()["status_code"] == 400
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import openai
+import pytest
+from httpx import AsyncClient
+from openai.types.beta.threads import Run
+from openai.types.beta.threads.runs import RunStep, RunStepDeltaEvent
+
+from analytic import runs
+from models.analytic import Analytic
+from tests.conftest import FakeRunStream, run_events
+
+
+@pytest.fixture
+def fast_runs(mocker):
+    mocker.patch.object(runs.settings, "RUN_BACKOFF_BASE", 0.001)
+    mocker.patch.object(runs.settings, "RUN_PROGRESS_INTERVAL", 0)
+
+
+class TestRunDriver:
+    @pytest.mark.anyio
+    async def test_incomplete_run_is_retried(self, client_test: AsyncClient, mock_openai, fast_runs):
+        analytic = await Analytic(aId="a1", status={"current": "uploaded"}).create()
+        mock_openai.beta.threads.runs.create.side_effect = [
+            FakeRunStream(run_events("t1", status="incomplete")),
+            FakeRunStream(run_events("t1", text="cleaned it")),
+        ]
+
+        run = await runs.drive_run(analytic.id, "t1", "a", "go", "cleaning")
+
+        assert run.status == "completed"
+        assert mock_openai.beta.threads.runs.create.call_count == 2
+        # streamed progress lands on the status document as it arrives
+        analytic = await Analytic.get(analytic.id)
+        progress = analytic.status["progress"]
+        assert progress["stage"] == "cleaning"
+        assert progress["attempt"] == 2
+        assert progress["messages"] == ["cleaned it"]
+        assert progress["steps"] == [{"type": "message_creation", "status": "completed"}]
+
+    @pytest.mark.anyio
+    async def test_attempts_are_bounded(self, client_test: AsyncClient, mock_openai, fast_runs):
+        analytic = await Analytic(aId="a2", status={"current": "uploaded"}).create()
+        mock_openai.beta.threads.runs.create.side_effect = lambda **kwargs: FakeRunStream(run_events("t2", status="incomplete"))
+
+        run = await runs.drive_run(analytic.id, "t2", "a", "go", "cleaning")
+
+        assert run.status == "incomplete"
+        assert mock_openai.beta.threads.runs.create.call_count == runs.settings.RUN_MAX_ATTEMPTS
+
+    @pytest.mark.anyio
+    async def test_transient_errors_are_retried(self, client_test: AsyncClient, mock_openai, fast_runs):
+        analytic = await Analytic(aId="a3", status={"current": "uploaded"}).create()
+        mock_openai.beta.threads.runs.create.side_effect = [
+            openai.APIConnectionError(request=None),
+            FakeRunStream(run_events("t3")),
+        ]
+
+        run = await runs.drive_run(analytic.id, "t3", "a", "go", "insights")
+
+        assert run.status == "completed"
+
+    @pytest.mark.anyio
+    async def test_deadline_cancels_run(self, client_test: AsyncClient, mock_openai, fast_runs, mocker):
+        mocker.patch.object(runs.settings, "RUN_DEADLINE", 0.2)
+        analytic = await Analytic(aId="a4", status={"current": "uploaded"}).create()
+        mock_openai.beta.threads.runs.create.return_value = FakeRunStream(run_events("t4"), delay=0.15)
+        mock_openai.beta.threads.runs.cancel.return_value = SimpleNamespace(id="run-t4", status="cancelling", last_error=None)
+
+        run = await runs.drive_run(analytic.id, "t4", "a", "go", "cleaning")
+
+        assert run.status == "cancelling"
+        mock_openai.beta.threads.runs.cancel.assert_called_once_with("run-t4", thread_id="t4")
+        assert mock_openai.beta.threads.runs.create.call_count == 1
+
+    @pytest.mark.anyio
+    async def test_step_deltas_are_skipped(self, client_test: AsyncClient, mock_openai, fast_runs):
+        analytic = await Analytic(aId="a5", status={"current": "uploaded"}).create()
+        run = Run.model_validate({
+            "id": "run-t5", "assistant_id": "a", "created_at": 0, "instructions": "go", "model": "gpt-4o",
+            "object": "thread.run", "parallel_tool_calls": True, "status": "completed", "thread_id": "t5", "tools": [],
+        })
+        step = RunStep.model_validate({
+            "id": "step-1", "assistant_id": "a", "created_at": 0, "object": "thread.run.step", "run_id": "run-t5",
+            "status": "in_progress", "thread_id": "t5", "type": "tool_calls",
+            "step_details": {"type": "tool_calls", "tool_calls": []},
+        })
+        delta = RunStepDeltaEvent.model_validate({
+            "id": "step-1", "object": "thread.run.step.delta",
+            "delta": {"step_details": {"type": "tool_calls", "tool_calls": [
+                {"index": 0, "type": "code_interpreter", "code_interpreter": {"input": "df.head()"}},
+            ]}},
+        })
+        completed = step.model_copy(update={"status": "completed"})
+        mock_openai.beta.threads.runs.create.return_value = FakeRunStream([
+            ("thread.run.created", run.model_copy(update={"status": "queued"})),
+            ("thread.run.step.created", step),
+            ("thread.run.step.delta", delta),
+            ("thread.run.step.completed", completed),
+            ("thread.run.completed", run),
+        ])
+
+        result = await runs.drive_run(analytic.id, "t5", "a", "go", "cleaning")
+
+        assert result.status == "completed"
+        analytic = await Analytic.get(analytic.id)
+        assert analytic.status["progress"]["steps"] == [{"type": "tool_calls", "status": "completed"}]
@@ -0,0 +1,88 @@
+import io
+
+import PIL.Image
+import pytest
+
+from analytic import dataset_store
+from analytic.sandbox import ChartPool
+
+BUCKET = "test-public-bucket"
+CSV = "Product_Category,Items_Sold\nBooks,3\nGames,7\nToys,2\n"
+
+CHART = """
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+def generate_method(df):
+    fig, ax = plt.subplots(figsize=(4, 3))
+    sns.barplot(data=df, x="Product_Category", y="Items_Sold", ax=ax)
+    print("drawn", len(df))
+    return fig
+"""
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ChartPool(workers=1, timeout=5, memory_limit=2 * 1024 * 1024 * 1024)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def dataset(mock_s3, tmp_path, mocker):
+    mocker.patch.object(dataset_store.settings, "DATASET_CACHE_DIR", str(tmp_path))
+    mock_s3.put_object(Bucket=BUCKET, Key="file-1.csv", Body=CSV.encode())
+    return dataset_store.ensure_dataset(mock_s3, BUCKET, "file-1")
+
+
+class TestChartPool:
+    @pytest.mark.anyio
+    async def test_renders_png(self, pool, dataset):
+        chart = await pool.render(CHART, "generate_method", dataset)
+
+        assert chart["error"] is None
+        assert chart["png"].startswith(b"\x89PNG")
+        assert chart["output"] == "drawn 3\n"
+        image = PIL.Image.open(io.BytesIO(chart["png"]))
+        assert (chart["width"], chart["height"]) == image.size
+
+    @pytest.mark.anyio
+    async def test_errors_are_captured(self, pool, dataset):
+        chart = await pool.render("def generate_method(df):\n    return df['missing']\n", "generate_method", dataset)
+
+        assert chart["png"] is None
+        assert "KeyError" in chart["error"]
+
+    @pytest.mark.anyio
+    async def test_timeout_keeps_worker(self, pool, dataset, mocker):
+        mocker.patch.object(pool, "timeout", 0.5)
+
+        chart = await pool.render("import time\ndef generate_method(df):\n    time.sleep(10)\n", "generate_method", dataset)
+        after = await pool.render(CHART, "generate_method", dataset)
+
+        assert chart["error"] == "generate_method timed out after 0.5s"
+        assert after["error"] is None
+
+    @pytest.mark.anyio
+    async def test_memory_limit(self, pool, dataset):
+        chart = await pool.render("def generate_method(df):\n    return bytearray(4 * 1024 ** 3)\n", "generate_method", dataset)
+
+        assert chart["error"] == "generate_method exceeded the memory limit"
+
+    @pytest.mark.anyio
+    async def test_integers_are_widened(self, pool, dataset):
+        code = CHART.replace('print("drawn", len(df))', 'print(df["Items_Sold"].dtype)')
+
+        chart = await pool.render(code, "generate_method", dataset)
+
+        assert chart["output"] == "int64\n"
+
+    @pytest.mark.anyio
+    async def test_styles_do_not_leak(self, pool, dataset):
+        styled = CHART.replace("    fig, ax", '    sns.set_theme(style="darkgrid")\n    plt.rcParams["axes.facecolor"] = "red"\n    fig, ax')
+        probe = CHART.replace('print("drawn", len(df))', 'print(plt.rcParams["axes.facecolor"])')
+
+        assert (await pool.render(styled, "generate_method", dataset))["error"] is None
+        chart = await pool.render(probe, "generate_method", dataset)
+
+        assert chart["output"] == "white\n"
@@ -0,0 +1,87 @@
+import hashlib
+import io
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from analytic.clients import AsyncS3
+from analytic.storage import MIN_PART_SIZE, stream_upload, transfer_openai_file
+from tests.conftest import FakeFileResponse
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        yield s3
+
+
+class TestStreamUpload:
+    def test_small_file_single_put(self, s3_client):
+        data = b"a,b\n1,2\n"
+
+        spool, file_hash, size = stream_upload(s3_client, io.BytesIO(data), BUCKET, "small.csv", MIN_PART_SIZE, 1024)
+
+        assert size == len(data)
+        assert file_hash == hashlib.sha256(data).hexdigest()
+        assert spool.read() == data
+        assert s3_client.get_object(Bucket=BUCKET, Key="small.csv")["Body"].read() == data
+
+    def test_large_file_multipart(self, s3_client):
+        data = b"x" * (MIN_PART_SIZE * 2 + 123)
+
+        spool, file_hash, size = stream_upload(s3_client, io.BytesIO(data), BUCKET, "large.csv", MIN_PART_SIZE, 1024)
+
+        obj = s3_client.get_object(Bucket=BUCKET, Key="large.csv")
+        assert size == len(data)
+        assert file_hash == hashlib.sha256(data).hexdigest()
+        assert obj["ContentLength"] == len(data)
+        assert obj["ETag"].endswith('-3"')
+        assert spool.read() == data
+        # spooled copy rolled over to disk instead of staying in memory
+        assert spool._rolled
+
+
+class TestTransferOpenAIFile:
+    @pytest.mark.anyio
+    async def test_small_file_keeps_content_type(self, s3_client, mocker):
+        data = b"\x89PNG fake image"
+        openai_client = mocker.MagicMock()
+        openai_client.files.with_streaming_response.content.return_value = FakeFileResponse(data)
+
+        artifact = await transfer_openai_file(
+            openai_client, AsyncS3(s3_client, 2), "file-1", BUCKET, "file-1.png", "image/png", MIN_PART_SIZE
+        )
+
+        obj = s3_client.get_object(Bucket=BUCKET, Key="file-1.png")
+        assert obj["ContentType"] == "image/png"
+        assert obj["Body"].read() == data
+        assert artifact == {
+            "key": "file-1.png",
+            "content_type": "image/png",
+            "encoding": None,
+            "size": len(data),
+            "stored_size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+
+    @pytest.mark.anyio
+    async def test_large_file_streams_in_parts(self, s3_client, mocker):
+        data = b"1,2\n" * (MIN_PART_SIZE // 2)
+        openai_client = mocker.MagicMock()
+        openai_client.files.with_streaming_response.content.return_value = FakeFileResponse(data, chunk_size=1024 * 1024)
+
+        artifact = await transfer_openai_file(
+            openai_client, AsyncS3(s3_client, 2), "file-2", BUCKET, "file-2.csv", "text/csv", MIN_PART_SIZE
+        )
+
+        obj = s3_client.get_object(Bucket=BUCKET, Key="file-2.csv")
+        assert obj["ContentType"] == "text/csv"
+        assert obj["ETag"].endswith('-2"')
+        assert obj["Body"].read() == data
+        assert artifact["size"] == len(data)
+        assert artifact["sha256"] == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,35 @@
+import asyncio
+import signal
+
+from config.config import Settings, initiate_database
+from analytic.jobs import run_worker
+from analytic.sandbox import chart_pool
+from routes.analytic import handle_clean_file, handle_draw_insights, handle_draw_graphs
+
+HANDLERS = {
+    "clean_file": handle_clean_file,
+    "draw_insights": handle_draw_insights,
+    "draw_graphs": handle_draw_graphs,
+}
+
+
+async def main():
+    await initiate_database()
+
+    # finish in-flight jobs on deploys instead of dropping them
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # graph jobs render here, start the chart workers before the first one arrives
+    if Settings().CHART_PREWARM:
+        warm = asyncio.create_task(chart_pool.warm())
+    try:
+        await run_worker(HANDLERS, Settings().WORKER_CONCURRENCY, stop=stop)
+    finally:
+        chart_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())